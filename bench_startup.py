@@ -0,0 +1,98 @@
+"""Startup benchmark for the CLIs (``python -X importtime``).
+
+Runs the common startup paths several times, reports the median import
+time (excluding what a bare ``python -c pass`` imports anyway) and the
+heaviest imports, and compares them with the startup budget.
+
+使い方:
+  python bench_startup.py            # report, exit 1 when over budget
+  python bench_startup.py --runs 10 --top 8
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (name, arguments after the interpreter, import budget in milliseconds)
+# 主要な起動経路と import 時間の予算 (ミリ秒)
+STARTUP_PATHS = [
+    ("import word2epub", ["-c", "import word2epub"], 10),
+    ("word_html_to_epub --help", [os.path.join(HERE, "word_html_to_epub.py"), "--help"], 40),
+    ("word_html_to_epub (usage error)", [os.path.join(HERE, "word_html_to_epub.py")], 40),
+    ("yaml2epub --help", [os.path.join(HERE, "yaml2epub.py"), "--help"], 120),
+    ("yaml2epub (usage)", [os.path.join(HERE, "yaml2epub.py")], 120),
+]
+
+_EXCEPTION_LINE = re.compile(r"^\w+(Error|Exception)\b")
+
+
+def import_times(args, python=sys.executable):
+    """Run `python -X importtime *args`; return {module: (self_us, cumulative_us, depth)}.
+
+    Raises RuntimeError when the command dies with an exception (e.g. the
+    script does not compile under this interpreter).
+    """
+    proc = subprocess.run(
+        [python, "-X", "importtime", *args],
+        cwd=HERE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    last = proc.stderr.strip().splitlines()[-1:]
+    if last and _EXCEPTION_LINE.match(last[0]):
+        raise RuntimeError(last[0])
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:   self |  cumulative | <indent>module"
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return times
+
+
+def top_level_total(times, baseline=()):
+    """Sum of cumulative times of top-level imports not in `baseline`, in ms."""
+    return sum(cum for name, (_, cum, depth) in times.items() if depth == 0 and name not in baseline) / 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure CLI import time against the startup budget.")
+    parser.add_argument("--runs", type=int, default=5, help="runs per path (median is reported)")
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports to list per path")
+    parser.add_argument("--python", default=sys.executable, help="interpreter to benchmark")
+    args = parser.parse_args(argv)
+
+    baseline = set(import_times(["-c", "pass"], args.python))
+    over = 0
+    for name, cmd, budget in STARTUP_PATHS:
+        try:
+            runs = [import_times(cmd, args.python) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:34s}  failed: {e}")
+            over += 1
+            continue
+        totals = [top_level_total(t, baseline) for t in runs]
+        median = statistics.median(totals)
+        status = "ok" if median <= budget else "OVER BUDGET"
+        over += median > budget
+        print(f"{name:34s} {median:7.1f} ms  (budget {budget} ms)  {status}")
+        last = runs[-1]
+        heavy = sorted(
+            ((cum, mod) for mod, (_, cum, depth) in last.items() if depth == 0 and mod not in baseline),
+            reverse=True,
+        )[: args.top]
+        for cum, mod in heavy:
+            print(f"    {cum / 1000:7.1f} ms  {mod}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
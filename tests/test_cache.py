@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from word2epub.cache import CACHE_DIR_ENV, OutputCache, ParseCache, fingerprint_inputs, open_cache, parse_size
+from word2epub.chapter import Chapter
+
+
+class FingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def write(self, root, name, data):
+        os.makedirs(root, exist_ok=True)
+        path = os.path.join(root, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_follows_content_and_options(self):
+        path = self.write(self.tmp, "book.htm", b"a")
+        key = fingerprint_inputs([path], root=self.tmp, extra={"profile": "default"})
+        self.assertEqual(fingerprint_inputs([path, path], root=self.tmp, extra={"profile": "default"}), key)
+        self.assertNotEqual(fingerprint_inputs([path], root=self.tmp, extra={"profile": "size"}), key)
+        self.write(self.tmp, "book.htm", b"b")
+        self.assertNotEqual(fingerprint_inputs([path], root=self.tmp, extra={"profile": "default"}), key)
+
+    def test_same_for_a_moved_project(self):
+        a = os.path.join(self.tmp, "a")
+        b = os.path.join(self.tmp, "b")
+        key_a = fingerprint_inputs([self.write(a, "book.htm", b"x")], root=a)
+        key_b = fingerprint_inputs([self.write(b, "book.htm", b"x")], root=b)
+        self.assertEqual(key_a, key_b)
+
+    def test_missing_input_differs_from_empty_input(self):
+        path = os.path.join(self.tmp, "book.htm")
+        missing = fingerprint_inputs([path], root=self.tmp)
+        self.write(self.tmp, "book.htm", b"")
+        self.assertNotEqual(fingerprint_inputs([path], root=self.tmp), missing)
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("500M"), 500 * 1024 ** 2)
+        self.assertEqual(parse_size("1.5k"), 1536)
+        self.assertEqual(parse_size("1048576"), 1048576)
+
+
+class OutputCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.cache = OutputCache(os.path.join(self.tmp, "cache"), max_bytes=250)
+
+    def built(self, data, name="built.epub"):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_miss_store_hit(self):
+        out = os.path.join(self.tmp, "out", "book.epub")
+        self.assertFalse(self.cache.fetch("ab" * 32, out))
+        self.cache.store("ab" * 32, self.built(b"epub"))
+        self.assertTrue(self.cache.fetch("ab" * 32, out))
+        with open(out, "rb") as f:
+            self.assertEqual(f.read(), b"epub")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"], stats["bytes"]), (1, 1, 1, 4))
+
+    def test_evicts_least_recently_used_over_the_limit(self):
+        keys = ["aa" * 32, "bb" * 32, "cc" * 32]
+        for i, key in enumerate(keys[:2]):
+            self.cache.store(key, self.built(b"x" * 100))
+            os.utime(self.cache.entry_path(key), (i, i))
+        # a hit makes the first entry the most recently used one
+        self.assertTrue(self.cache.fetch(keys[0], os.path.join(self.tmp, "o.epub")))
+        self.cache.store(keys[2], self.built(b"x" * 100))
+        self.assertTrue(os.path.exists(self.cache.entry_path(keys[0])))
+        self.assertFalse(os.path.exists(self.cache.entry_path(keys[1])))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_open_cache(self):
+        with mock.patch.dict(os.environ, {CACHE_DIR_ENV: ""}):
+            self.assertIsNone(open_cache(None))
+        with mock.patch.dict(os.environ, {CACHE_DIR_ENV: os.path.join(self.tmp, "env")}):
+            cache = open_cache(None, "2M")
+        self.assertEqual((cache.cache_dir, cache.max_bytes), (os.path.join(self.tmp, "env"), 2 * 1024 ** 2))
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.cache = ParseCache(os.path.join(self.tmp, "cache"), max_entries=2)
+        self.project = os.path.join(self.tmp, "projA")
+        os.makedirs(os.path.join(self.project, "book.files"))
+        self.source = self.write("book.htm", b"<p class=CHAPTER>One</p>")
+        self.picture = self.write("book.files/image001.jpg", b"\xff\xd8")
+
+    def write(self, name, data, project=None):
+        path = os.path.join(project or self.project, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def chapters(self):
+        return [Chapter(1, "One", ["<p>one</p>"], [("images/image001.jpg", self.picture)])]
+
+    def test_miss_then_hit(self):
+        key = ParseCache.key(self.source)
+        self.assertIsNone(self.cache.load(key, self.source))
+        self.cache.store(key, self.chapters(), self.source)
+        (chapter,) = self.cache.load(key, self.source)
+        self.assertEqual((chapter.index, chapter.title, chapter.fragments), (1, "One", ["<p>one</p>"]))
+        self.assertEqual(chapter.assets, [("images/image001.jpg", os.path.normpath(self.picture))])
+
+    def test_key_follows_html_and_pictures(self):
+        key = ParseCache.key(self.source)
+        self.write("book.files/image001.jpg", b"\xff\xd8changed")
+        self.assertNotEqual(ParseCache.key(self.source), key)
+        key = ParseCache.key(self.source)
+        self.write("book.htm", b"<p class=CHAPTER>Two</p>")
+        self.assertNotEqual(ParseCache.key(self.source), key)
+
+    def test_moved_project_resolves_pictures_in_new_place(self):
+        key = ParseCache.key(self.source)
+        self.cache.store(key, self.chapters(), self.source)
+        moved = shutil.move(self.project, os.path.join(self.tmp, "projB"))
+        source = os.path.join(moved, "book.htm")
+        self.assertEqual(ParseCache.key(source), key)
+        (chapter,) = self.cache.load(key, source)
+        href, path = chapter.assets[0]
+        self.assertEqual(path, os.path.join(moved, "book.files", "image001.jpg"))
+        self.assertTrue(os.path.isfile(path))
+
+    def test_evicts_least_recently_used(self):
+        keys = ["a" * 64, "b" * 64, "c" * 64]
+        for i, key in enumerate(keys):
+            self.cache.store(key, self.chapters(), self.source)
+            os.utime(self.cache.entry_path(key), (i, i))
+        self.cache.evict()
+        self.assertIsNone(self.cache.load(keys[0], self.source))
+        self.assertIsNotNone(self.cache.load(keys[2], self.source))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from word2epub.chapter_index import (
+    ChapterIndex,
+    index_path,
+    load_chapter_index,
+    load_chapters,
+    parse_chapter,
+    scan_chapter_markers,
+)
+from word2epub.convert import load_and_clean_chapters
+
+
+HTML = """<html><head><style>p.CHAPTER {font-size: 14pt}</style></head>
+<body>
+<p>front matter</p>
+<p class=CHAPTER>One <span lang=EN-US>First</span></p>
+<p>one 日本語</p>
+<p class="MsoNormal CHAPTER">Two</p>
+<p>two</p>
+<P CLASS='CHAPTER'>Three</P>
+<p>three</p>
+</body></html>
+"""
+
+
+class ChapterIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.source = os.path.join(self.tmp, "book.htm")
+        self.write(HTML)
+
+    def write(self, html):
+        with open(self.source, "w", encoding="utf-8") as f:
+            f.write(html)
+
+    def test_scan_skips_head_and_front_matter(self):
+        raw = HTML.encode("utf-8")
+        ranges = scan_chapter_markers(raw)
+        self.assertEqual(len(ranges), 3)
+        self.assertTrue(raw[ranges[0][0]:].startswith(b"<p class=CHAPTER>"))
+        self.assertTrue(raw[:ranges[-1][1]].endswith(b"<p>three</p>\n"))
+        self.assertEqual(scan_chapter_markers(b"<body><p>none</p></body>"), [])
+
+    def test_titles_and_slices(self):
+        index = ChapterIndex.build(self.source)
+        self.assertEqual([e["title"] for e in index], ["First - One", "Two", "Three"])
+        self.assertIn("one 日本語", index.read_html(1))
+        self.assertNotIn("Two", index.read_html(1))
+
+    def test_sidecar_is_reused_and_refreshed(self):
+        load_chapter_index(self.source)
+        with open(index_path(self.source), encoding="utf-8") as f:
+            data = json.load(f)
+        data["chapters"][0]["title"] = "from sidecar"
+        with open(index_path(self.source), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        self.assertEqual(load_chapter_index(self.source).entries[0]["title"], "from sidecar")
+        # same content, new mtime: the hash decides / 内容が同じならサイドカーを使う
+        st = os.stat(self.source)
+        os.utime(self.source, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertEqual(load_chapter_index(self.source).entries[0]["title"], "from sidecar")
+        self.write(HTML.replace("Three", "Drei"))
+        self.assertEqual(load_chapter_index(self.source).entries[2]["title"], "Drei")
+
+    def test_slices_parse_like_the_whole_file(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            whole = load_and_clean_chapters(self.source)
+        sliced = load_chapters(self.source)
+        self.assertEqual([c.fragments for c in sliced], [c.fragments for c in whole])
+        self.assertEqual([c.index for c in load_chapters(self.source, [3, 1])], [3, 1])
+
+    def test_unknown_chapter(self):
+        with self.assertRaises(IndexError):
+            parse_chapter(self.source, 4)
+        with self.assertRaises(IndexError):
+            load_chapters(self.source, [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
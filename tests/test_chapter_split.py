@@ -0,0 +1,92 @@
+import re
+import unittest
+from html.parser import HTMLParser
+
+from word2epub.chapter import Chapter
+from word2epub.chapter_split import VOID_ELEMENTS, pack_blocks, part_name, split_html, top_level_blocks
+from word2epub.xhtml import iter_chapter_xhtml
+
+
+class _Balance(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.ok = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        if not self.stack or self.stack.pop() != tag:
+            self.ok = False
+
+
+def balanced(html):
+    parser = _Balance()
+    parser.feed(html)
+    parser.close()
+    return parser.ok and not parser.stack
+
+
+def body(xhtml):
+    return re.search(r"<body>\n(.*)\n</body>", xhtml, re.S).group(1)
+
+
+NESTED = (
+    "<p>intro</p>\n"
+    + "<div class=\"box\">" + "".join(f"<p>box {i} {'x' * 40}</p>" for i in range(6)) + "</div>\n"
+    + "".join(f"<p>after {i} {'y' * 40}<br/><img src=\"a.jpg\"/></p>\n" for i in range(6))
+)
+
+
+class TopLevelBlocksTest(unittest.TestCase):
+    def test_blocks_join_back(self):
+        blocks = top_level_blocks(NESTED)
+        self.assertEqual("".join(blocks), NESTED)
+        self.assertTrue(blocks[1].startswith('<div class="box">'))
+        self.assertTrue(all(balanced(b) for b in blocks))
+
+    def test_text_stays_with_preceding_block(self):
+        self.assertEqual(top_level_blocks("<p>a</p> tail<p>b</p>"), ["<p>a</p> tail", "<p>b</p>"])
+
+
+class SplitHtmlTest(unittest.TestCase):
+    def test_small_fragment_is_one_part(self):
+        self.assertEqual(split_html(NESTED, 1 << 20), [NESTED])
+        self.assertEqual(split_html(NESTED, 0), [NESTED])
+
+    def test_parts_never_break_inside_an_element(self):
+        parts = split_html(NESTED, 120)
+        self.assertGreater(len(parts), 2)
+        self.assertEqual("".join(parts), NESTED)
+        for part in parts:
+            self.assertTrue(balanced(part), part)
+
+    def test_pack_blocks_budget(self):
+        self.assertEqual(pack_blocks(["aa", "bb", "cc"], 4), ["aabb", "cc"])
+        # a block larger than the budget gets a part of its own
+        self.assertEqual(pack_blocks(["a", "bbbbbb", "c"], 4), ["a", "bbbbbb", "c"])
+
+    def test_part_name(self):
+        self.assertEqual(part_name("content-01", 1), "content-01")
+        self.assertEqual(part_name("content-01", 3), "content-01-03")
+
+
+class WordChapterPartsTest(unittest.TestCase):
+    def test_word_chapters_split_like_yaml_chapters(self):
+        # fragments may hold several top-level elements (e.g. from the parse cache)
+        cut = NESTED.index("<div")
+        chapter = Chapter(1, "One", [NESTED[:cut], NESTED[cut:]])
+        rendered = list(iter_chapter_xhtml([chapter], max_part_bytes=120))
+        self.assertEqual([body(xhtml) for _, (_, xhtml) in rendered], split_html(NESTED, 120))
+        self.assertEqual([key for key, _ in rendered][:2], [1, (1, 2)])
+        self.assertEqual(rendered[1][1][0], "content-01-02.xhtml")
+        for _, (_, xhtml) in rendered:
+            self.assertTrue(balanced(body(xhtml)))
+
+
+if __name__ == "__main__":
+    unittest.main()
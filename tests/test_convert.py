@@ -0,0 +1,79 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from word2epub.cache import ParseCache
+from word2epub.convert import convert_word_html, load_and_clean_chapters
+from word2epub.output import MemoryOutput
+
+
+class LoadAndCleanChaptersTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.source = os.path.join(self.tmp, "book.htm")
+        with open(self.source, "w", encoding="utf-8") as f:
+            f.write('<html><body><p class="CHAPTER">One</p><p>a</p><p class="CHAPTER">Two</p><p>b</p></body></html>')
+
+    def load(self, parse_cache=None):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            chapters = load_and_clean_chapters(self.source, parse_cache)
+        return chapters, out.getvalue()
+
+    def test_chapter_count_is_reported_once(self):
+        cache = ParseCache(os.path.join(self.tmp, "cache"))
+        for hit in (False, True):
+            chapters, log = self.load(cache)
+            self.assertEqual([c["title"] for c in chapters], ["One", "Two"])
+            self.assertEqual(log.count("Found 2 chapters."), 1, log)
+            self.assertEqual("Chapters loaded from parse cache." in log, hit)
+
+
+class ConvertWordHtmlTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.source = os.path.join(self.tmp, "book.htm")
+        with open(self.source, "w", encoding="utf-8") as f:
+            f.write('<html><body><p class="CHAPTER">One</p><p>a</p></body></html>')
+        self.metadata = os.path.join(self.tmp, "metadata.yaml")
+        with open(self.metadata, "w", encoding="utf-8") as f:
+            f.write("title:\n  - type: main\n    text: Book\n")
+
+    def convert(self, output=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return convert_word_html(self.source, output, self.metadata, reproducible=True)
+
+    def test_every_output_kind_gets_the_same_book(self):
+        data = self.convert()
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            self.assertIn("<dc:title>Book</dc:title>", z.read("OEBPS/content.opf").decode("utf-8"))
+
+        path = os.path.join(self.tmp, "book.epub")
+        self.assertIsNone(self.convert(path))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+        stream = io.BytesIO()
+        self.convert(stream)
+        self.assertFalse(stream.closed)
+        self.assertEqual(stream.getvalue(), data)
+
+        out = MemoryOutput(reproducible=True)
+        with out:
+            self.convert(out)
+        with zipfile.ZipFile(io.BytesIO(out.getvalue())) as z, zipfile.ZipFile(io.BytesIO(data)) as expected:
+            self.assertEqual(z.namelist(), expected.namelist())
+
+    def test_rejects_other_outputs(self):
+        with self.assertRaises(TypeError):
+            self.convert(42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from word2epub.convert import convert_word_html
+from word2epub.docx import DocxMedia, docx_chapter_titles, is_docx, iter_docx_chapters, load_docx_chapters
+
+
+NS = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"'
+)
+
+
+def p(text, style=None, rpr=""):
+    ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f"<w:p>{ppr}<w:r>{rpr}<w:t>{text}</w:t></w:r></w:p>"
+
+
+BODY = "".join([
+    p("front matter"),
+    "<w:p><w:pPr><w:pStyle w:val=\"Chap\"/></w:pPr>"
+    "<w:r><w:t>First</w:t></w:r><w:r><w:t>第一章</w:t></w:r></w:p>",
+    p("Section", "Heading2"),
+    "<w:p><w:r><w:rPr><w:b/></w:rPr><w:t>bold</w:t></w:r>"
+    "<w:r><w:rPr><w:i/></w:rPr><w:t>it</w:t></w:r>"
+    "<w:r><w:rPr><w:vertAlign w:val=\"superscript\"/></w:rPr><w:t>2</w:t></w:r>"
+    "<w:r><w:t>a&amp;b</w:t><w:br/><w:t>c</w:t></w:r></w:p>",
+    "<w:p><w:r><w:ruby><w:rt><w:r><w:t>かん</w:t></w:r></w:rt>"
+    "<w:rubyBase><w:r><w:t>漢</w:t></w:r></w:rubyBase></w:ruby></w:r></w:p>",
+    "<w:p><w:r><w:drawing><wp:inline><wp:docPr id=\"1\" name=\"p\" descr=\"a plate\"/>"
+    "<a:graphic><a:graphicData><a:blip r:embed=\"rId1\"/></a:graphicData></a:graphic>"
+    "</wp:inline></w:drawing></w:r></w:p>",
+    "<w:tbl><w:tr><w:tc>" + p("cell") + "</w:tc></w:tr></w:tbl>",
+    p("Second", "CHAPTER"),
+    "<w:p/>",
+])
+
+STYLES = (
+    f"<w:styles {NS}>"
+    '<w:style w:styleId="Chap"><w:name w:val="Chapter"/></w:style>'
+    '<w:style w:styleId="Heading2"><w:name w:val="heading 2"/></w:style>'
+    "</w:styles>"
+)
+
+RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="media/image1.png"/>'
+    "</Relationships>"
+)
+
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x03\x00\x00\x00\x02\x08\x02\x00\x00\x00"
+
+
+class DocxTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, "book.docx")
+        with zipfile.ZipFile(self.path, "w") as zf:
+            zf.writestr("word/document.xml", f"<w:document {NS}><w:body>{BODY}<w:sectPr/></w:body></w:document>")
+            zf.writestr("word/styles.xml", STYLES)
+            zf.writestr("word/_rels/document.xml.rels", RELS)
+            zf.writestr("word/media/image1.png", PNG)
+
+    def test_is_docx(self):
+        self.assertTrue(is_docx("Book.DOCX"))
+        self.assertFalse(is_docx("book.htm"))
+
+    def test_chapters_and_markup(self):
+        first, second = iter_docx_chapters(self.path)
+        self.assertEqual((first.index, first.title), (1, "First - 第一章"))
+        self.assertEqual(first.fragments[0], '<p class="CHAPTER">First第一章</p>')
+        self.assertEqual(first.fragments[1], "<h2>Section</h2>")
+        self.assertEqual(first.fragments[2], "<p><strong>bold</strong><em>it</em><sup>2</sup>a&amp;b<br />c</p>")
+        self.assertEqual(first.fragments[3], "<p><ruby>漢<rt>かん</rt></ruby></p>")
+        self.assertEqual(first.fragments[4], '<p><img src="media/image1.png" alt="a plate" /></p>')
+        self.assertEqual(first.fragments[5], "<table><tr><td><p>cell</p></td></tr></table>")
+        self.assertNotIn("front matter", "".join(first.fragments))
+        self.assertEqual(second.fragments, ['<p class="CHAPTER">Second</p>', "<p>\xa0</p>"])
+
+    def test_media_are_read_from_the_archive(self):
+        first, second = iter_docx_chapters(self.path)
+        ((href, media),) = first.assets
+        self.assertEqual(href, "media/image1.png")
+        self.assertIsInstance(media, DocxMedia)
+        self.assertEqual(media.read(), PNG)
+        self.assertEqual(second.assets, [])
+
+    def test_selected_chapters_and_titles(self):
+        self.assertEqual([c.index for c in iter_docx_chapters(self.path, [2])], [2])
+        self.assertEqual(docx_chapter_titles(self.path), [(1, "First - 第一章"), (2, "Second")])
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            load_docx_chapters(self.path)
+        self.assertIn("Found 2 chapters.", out.getvalue())
+
+    def test_converts_to_epub_with_media(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = convert_word_html(self.path, None, os.path.join(self.tmp, "none.yaml"), reproducible=True)
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            self.assertEqual(z.read("OEBPS/media/image1.png"), PNG)
+            self.assertIn('href="media/image1.png"', z.read("OEBPS/content.opf").decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from word2epub import fonts
+from word2epub.fonts import FontSubsetOutput, font_faces, subset_font, text_codepoints
+from word2epub.output import RecordingOutput
+
+try:
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+    from fontTools.ttLib import TTFont
+except ImportError:
+    FontBuilder = None
+
+
+def build_font(chars):
+    """Return a TrueType font with a square glyph for each of `chars`."""
+    names = [".notdef"] + [f"g{ord(c):04X}" for c in chars]
+    fb = FontBuilder(1000, isTTF=True)
+    fb.setupGlyphOrder(names)
+    fb.setupCharacterMap({ord(c): f"g{ord(c):04X}" for c in chars})
+    pen = TTGlyphPen(None)
+    pen.moveTo((0, 0))
+    pen.lineTo((0, 500))
+    pen.lineTo((500, 500))
+    pen.closePath()
+    glyph = pen.glyph()
+    fb.setupGlyf({name: glyph for name in names})
+    fb.setupHorizontalMetrics({name: (500, 0) for name in names})
+    fb.setupHorizontalHeader(ascent=800, descent=-200)
+    fb.setupNameTable({"familyName": "Test", "styleName": "Regular"})
+    fb.setupOS2()
+    fb.setupPost()
+    buf = io.BytesIO()
+    fb.save(buf)
+    return buf.getvalue()
+
+
+class FontFacesTest(unittest.TestCase):
+    def test_local_font_urls(self):
+        css = """
+        /* @font-face { src: url(commented.otf) } */
+        @font-face { font-family: A; src: url("../fonts/a.woff2") format("woff2"), url('b.ttf?v=1'); }
+        @font-face { src: url(data:font/woff2;base64,AAAA), url(https://example.com/c.otf); }
+        body { background: url(d.otf); }
+        """
+        self.assertEqual(font_faces(css, "style/book.css"), [
+            ("../fonts/a.woff2", "fonts/a.woff2"),
+            ("b.ttf?v=1", "style/b.ttf"),
+        ])
+
+    def test_text_codepoints(self):
+        xhtml = "<html><head><title>zz</title></head><body><p>a&amp;　<b>b</b></p>\n</body></html>"
+        self.assertEqual(text_codepoints(xhtml), {ord(c) for c in "a&　b "})
+
+
+class FontSubsetOutputTest(unittest.TestCase):
+    def pack(self, font):
+        rec = RecordingOutput()
+        out = FontSubsetOutput(rec)
+        out.add("OEBPS/fonts/a.ttf", font)
+        out.add("OEBPS/a.xhtml", "<body><p>ab</p></body>")
+        out.add("OEBPS/style.css", "p {}")
+        out.close()
+        return out, dict((arcname, data) for arcname, data, _ in rec.members)
+
+    def test_fonts_are_written_last(self):
+        with mock.patch.object(fonts, "subset_font", return_value=b"small"):
+            out, members = self.pack(b"original")
+        self.assertEqual(list(members), ["OEBPS/a.xhtml", "OEBPS/style.css", "OEBPS/fonts/a.ttf"])
+        self.assertEqual(members["OEBPS/fonts/a.ttf"], b"small")
+        self.assertEqual(out.sizes, [("OEBPS/fonts/a.ttf", 8, 5)])
+        self.assertEqual(out.codepoints, {ord("a"), ord("b"), 0x20})
+
+    def test_packed_unchanged_without_fonttools(self):
+        with mock.patch.object(fonts, "subset_font", return_value=None):
+            _, members = self.pack(b"original")
+        self.assertEqual(members["OEBPS/fonts/a.ttf"], b"original")
+
+    @unittest.skipIf(FontBuilder is None, "fontTools is not installed")
+    def test_subset_keeps_only_used_glyphs(self):
+        font = build_font("abcxyz")
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, members = self.pack(font)
+        small = members["OEBPS/fonts/a.ttf"]
+        self.assertLess(len(small), len(font))
+        cmap = TTFont(io.BytesIO(small)).getBestCmap()
+        self.assertEqual(set(cmap), {ord("a"), ord("b")})
+        # the second run comes from the in-memory cache / 2 回目はキャッシュから
+        self.assertIs(subset_font(font, {ord("a"), ord("b"), 0x20}), small)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from word2epub.imagesize import add_image_sizes, image_size, size_attributes, viewport_meta
+
+
+def png(width, height):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", width, height) + b"\x08\x02\x00\x00\x00"
+
+
+def jpeg(width, height, orientation=None):
+    data = b"\xff\xd8"
+    # an APP0 segment to skip / 読み飛ばすセグメント
+    data += b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\0" + b"\0" * 9
+    if orientation is not None:
+        tiff = b"MM\x00\x2a" + struct.pack(">I", 8) + struct.pack(">H", 1)
+        tiff += struct.pack(">HHIHH", 0x0112, 3, 1, orientation, 0) + b"\0\0\0\0"
+        payload = b"Exif\0\0" + tiff
+        data += b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+    data += b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return data + b"\xff\xd9"
+
+
+def riff(chunk, body):
+    data = chunk + struct.pack("<I", len(body)) + body
+    return b"RIFF" + struct.pack("<I", len(data) + 4) + b"WEBP" + data
+
+
+IMAGES = {
+    "a.png": png(640, 480),
+    "a.gif": b"GIF89a" + struct.pack("<HH", 32, 16) + b"\0" * 22,
+    "a.jpg": jpeg(300, 200),
+    "rotated.jpg": jpeg(300, 200, orientation=6),
+    "lossy.webp": riff(b"VP8 ", b"\0\0\0\x9d\x01\x2a" + struct.pack("<HH", 120, 90) + b"\0" * 8),
+    "lossless.webp": riff(b"VP8L", b"\x2f" + ((99) | (49 << 14)).to_bytes(4, "little") + b"\0" * 8),
+    "extended.webp": riff(b"VP8X", b"\0" * 4 + (799).to_bytes(3, "little") + (599).to_bytes(3, "little")),
+    "a.svg": b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg" width="100px" height=\'50\'></svg>',
+    "box.svg": b'<svg xmlns="http://www.w3.org/2000/svg" width="100%" viewBox="0,0 60.4 30"></svg>',
+    "broken.png": b"\x89PNG\r\n\x1a\n" + b"\0" * 8 + b"JUNK",
+    "a.txt": b"plain text, not an image",
+}
+
+
+class ImageSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        for name, data in IMAGES.items():
+            with open(self.path(name), "wb") as f:
+                f.write(data)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def test_formats(self):
+        expected = {
+            "a.png": (640, 480),
+            "a.gif": (32, 16),
+            "a.jpg": (300, 200),
+            "rotated.jpg": (200, 300),
+            "lossy.webp": (120, 90),
+            "lossless.webp": (100, 50),
+            "extended.webp": (800, 600),
+            "a.svg": (100, 50),
+            "box.svg": (60, 30),
+            "broken.png": None,
+            "a.txt": None,
+            "missing.png": None,
+        }
+        self.assertEqual({name: image_size(self.path(name)) for name in expected}, expected)
+
+    def test_changed_file_is_read_again(self):
+        self.assertEqual(image_size(self.path("a.png")), (640, 480))
+        with open(self.path("a.png"), "wb") as f:
+            f.write(png(64, 48) + b"longer")
+        self.assertEqual(image_size(self.path("a.png")), (64, 48))
+
+    def test_attributes(self):
+        self.assertEqual(size_attributes((3, 4)), ' width="3" height="4"')
+        self.assertEqual(size_attributes(None), "")
+        self.assertEqual(viewport_meta((3, 4)), '<meta name="viewport" content="width=3, height=4" />')
+
+    def test_add_image_sizes(self):
+        markup = (
+            '<p><img src="a.png" alt="" /><img alt="" src=\'a.gif\'>'
+            '<img src="a.jpg" width="10" /><img src="a.txt" /><img src="remote" /></p>'
+        )
+        resolve = lambda src: None if src == "remote" else self.path(src)
+        self.assertEqual(
+            add_image_sizes(markup, resolve),
+            '<p><img src="a.png" alt="" width="640" height="480" /><img alt="" src=\'a.gif\' width="32" height="16">'
+            '<img src="a.jpg" width="10" /><img src="a.txt" /><img src="remote" /></p>',
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from word2epub.minify import SizeProfileOutput, minify_css, minify_xhtml, strip_unused_css, used_classes
+from word2epub.output import RecordingOutput
+
+
+XHTML = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html>
+  <!-- generated -->
+  <body>
+    <p class="a  b">one   two&#160;　three</p>
+    <div><span></span><p> </p></div>
+    <span id="note"></span>
+  </body>
+</html>
+"""
+
+
+class MinifyXhtmlTest(unittest.TestCase):
+    def test_collapses_whitespace_and_drops_empty_wrappers(self):
+        self.assertEqual(
+            minify_xhtml(XHTML),
+            '<?xml version="1.0" encoding="utf-8"?><!DOCTYPE html><html><body>'
+            '<p class="a b">one two&#160;　three</p><span id="note"></span></body></html>',
+        )
+
+    def test_pre_only_loses_comments(self):
+        text = "<body><!-- x --><pre>a\n  b</pre>\n</body>"
+        self.assertEqual(minify_xhtml(text), "<body><pre>a\n  b</pre>\n</body>")
+
+    def test_used_classes(self):
+        self.assertEqual(used_classes("<p class=\"a  b\"><span class='c'>x</span></p>"), {"a", "b", "c"})
+
+
+class MinifyCssTest(unittest.TestCase):
+    def test_comments_and_whitespace(self):
+        css = "/* c */\np.a  ,  div > span {\n  color: red ;\n  content: \"a  /* b */\";\n}\n"
+        self.assertEqual(minify_css(css), 'p.a,div>span{color:red;content:"a  /* b */"}')
+
+    def test_strip_unused_rules(self):
+        css = minify_css(
+            "p.a, p.gone {x:1} .gone {x:2} p:not(.gone) {x:3} @media print {.gone {x:4} .a {x:5}}"
+            " @media screen {.gone {x:6}} @font-face {font-family:f} @import url(x.css);"
+        )
+        self.assertEqual(
+            strip_unused_css(css, {"a"}),
+            "p.a{x:1}p:not(.gone){x:3}@media print{.a{x:5}}@font-face{font-family:f}@import url(x.css);",
+        )
+
+
+class SizeProfileOutputTest(unittest.TestCase):
+    def test_minifies_members_and_writes_css_last(self):
+        rec = RecordingOutput()
+        out = SizeProfileOutput(rec)
+        out.add("mimetype", "application/epub+zip")
+        out.add("OEBPS/style.css", ".a {x:1}\n.b {x:2}\n")
+        out.add("OEBPS/a.xhtml", '<body>\n  <p class="a">x</p>\n</body>')
+        out.add("OEBPS/image.png", b"\x89PNG")
+        out.close()
+        members = [(arcname, data) for arcname, data, _ in rec.members]
+        self.assertEqual(members, [
+            ("mimetype", b"application/epub+zip"),
+            ("OEBPS/a.xhtml", b'<body><p class="a">x</p></body>'),
+            ("OEBPS/image.png", b"\x89PNG"),
+            ("OEBPS/style.css", b".a{x:1}"),
+        ])
+        self.assertEqual([arcname for arcname, _, _ in out.sizes], ["OEBPS/a.xhtml", "OEBPS/style.css"])
+        self.assertIn("% smaller)", out.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from word2epub.output import (
+    DirectoryOutput,
+    MemoryOutput,
+    RecordingOutput,
+    ZipOutput,
+    is_stream,
+    open_output,
+)
+
+
+class _NoSeek(io.RawIOBase):
+    """A write-only stream without tell/seek, like a socket."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+class ZipOutputTest(unittest.TestCase):
+    def write_book(self, out):
+        with out:
+            out.add("mimetype", "application/epub+zip")
+            out.add("OEBPS/a.xhtml", "<p>a</p>" * 100)
+
+    def test_mimetype_first_and_stored(self):
+        out = MemoryOutput()
+        self.write_book(out)
+        with zipfile.ZipFile(io.BytesIO(out.getvalue())) as z:
+            first = z.infolist()[0]
+            self.assertEqual((first.filename, first.compress_type), ("mimetype", zipfile.ZIP_STORED))
+            self.assertEqual(z.getinfo("OEBPS/a.xhtml").compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_unseekable_stream(self):
+        stream = _NoSeek()
+        self.write_book(ZipOutput(stream))
+        self.assertFalse(stream.closed)
+        with zipfile.ZipFile(io.BytesIO(bytes(stream.data))) as z:
+            self.assertEqual(z.read("OEBPS/a.xhtml"), b"<p>a</p>" * 100)
+
+    def test_reproducible_bytes(self):
+        books = []
+        for _ in range(2):
+            out = MemoryOutput(reproducible=True)
+            self.write_book(out)
+            books.append(out.getvalue())
+        self.assertEqual(books[0], books[1])
+
+    def test_open_output(self):
+        self.assertIsInstance(open_output(None, "memory"), MemoryOutput)
+        self.assertTrue(is_stream(io.BytesIO()))
+        self.assertFalse(is_stream(MemoryOutput()))
+        with self.assertRaises(ValueError):
+            open_output(None, "tar")
+
+
+class RecordingOutputTest(unittest.TestCase):
+    def test_replay_in_order(self):
+        rec = RecordingOutput()
+        rec.add("mimetype", "application/epub+zip")
+        rec.add_file("OEBPS/a.txt", __file__)
+        self.assertEqual([(a, d) for a, d, _ in rec.members], [("mimetype", b"application/epub+zip"), ("OEBPS/a.txt", None)])
+        out = MemoryOutput()
+        with out:
+            rec.replay(out)
+        with zipfile.ZipFile(io.BytesIO(out.getvalue())) as z:
+            self.assertEqual(z.namelist(), ["mimetype", "OEBPS/a.txt"])
+
+
+class DirectoryOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.root = os.path.join(self.tmp, "book")
+
+    def build(self, members):
+        with DirectoryOutput(self.root) as out:
+            for name, data in members.items():
+                out.add(name, data)
+        return out
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(base, fn), self.root).replace(os.sep, "/")
+            for base, _, names in os.walk(self.root)
+            for fn in names
+        )
+
+    def test_rewrites_only_changed_and_removes_stale_members(self):
+        out = self.build({"mimetype": "m", "OEBPS/a.xhtml": "a", "OEBPS/old/b.xhtml": "b"})
+        self.assertEqual(out.summary(), "3 written, 0 unchanged, 0 removed")
+        out = self.build({"mimetype": "m", "OEBPS/a.xhtml": "A"})
+        self.assertEqual(out.summary(), "1 written, 1 unchanged, 1 removed")
+        self.assertEqual(self.files(), [DirectoryOutput.MEMBERS_FILE, "OEBPS/a.xhtml", "mimetype"])
+
+    def test_keeps_files_it_did_not_write(self):
+        self.build({"mimetype": "m"})
+        with open(os.path.join(self.root, "notes.txt"), "w") as f:
+            f.write("mine")
+        self.build({"OEBPS/a.xhtml": "a"})
+        self.assertIn("notes.txt", self.files())
+        self.assertNotIn("mimetype", self.files())
+
+    def test_failed_build_removes_nothing(self):
+        self.build({"mimetype": "m", "OEBPS/a.xhtml": "a"})
+        with self.assertRaises(RuntimeError):
+            with DirectoryOutput(self.root) as out:
+                out.add("OEBPS/b.xhtml", "b")
+                raise RuntimeError("render failed")
+        self.assertEqual(self.files(), [DirectoryOutput.MEMBERS_FILE, "OEBPS/a.xhtml", "OEBPS/b.xhtml", "mimetype"])
+        # the next good build still knows every member / 次の成功時に両方を整理する
+        self.build({"mimetype": "m"})
+        self.assertEqual(self.files(), [DirectoryOutput.MEMBERS_FILE, "mimetype"])
+
+    def test_refuses_foreign_directory(self):
+        os.makedirs(self.root)
+        with open(os.path.join(self.root, "notes.txt"), "w") as f:
+            f.write("mine")
+        with self.assertRaises(FileExistsError):
+            DirectoryOutput(self.root)
+
+    def test_rejects_members_outside_root(self):
+        with DirectoryOutput(self.root) as out:
+            with self.assertRaises(ValueError):
+                out.add("../escape.txt", "x")
+            with self.assertRaises(ValueError):
+                out.add(DirectoryOutput.MEMBERS_FILE, "x")
+
+
+if __name__ == "__main__":
+    unittest.main()
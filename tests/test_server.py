@@ -0,0 +1,141 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import unittest
+import zipfile
+
+from word2epub.server import ConversionServer, HTTPError, convert_upload, parse_multipart
+
+
+WORD_HTML = b"""<html><body>
+<p class="CHAPTER">One</p>
+<p>text</p>
+%s
+</body></html>
+"""
+
+BOUNDARY = "x-boundary"
+
+
+def multipart(**fields):
+    parts = []
+    for name, data in fields.items():
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}"\r\n\r\n'.encode()
+            + data + b"\r\n"
+        )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+class OutsideFileMixin:
+    """A picture-named file next to (outside of) the upload's temporary directory."""
+
+    def setUp(self):
+        fd, self.outside = tempfile.mkstemp(suffix=".jpg", dir=tempfile.gettempdir())
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"\xff\xd8secret")
+        self.addCleanup(os.remove, self.outside)
+
+
+class ConvertUploadTest(OutsideFileMixin, unittest.TestCase):
+    def test_converts_html(self):
+        data = convert_upload(WORD_HTML % b"", b"title: Book\n", reproducible=True)
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            self.assertEqual(z.read("mimetype"), b"application/epub+zip")
+            self.assertIn("OEBPS/content-01.xhtml", z.namelist())
+
+    def test_refuses_absolute_metadata_image(self):
+        meta = f"images:\n  - type: insert_after_toc\n    file: {self.outside}\n".encode()
+        with self.assertRaisesRegex(ValueError, "outside the metadata directory"):
+            convert_upload(WORD_HTML % b"", meta)
+
+    def test_refuses_parent_metadata_image(self):
+        meta = f"images:\n  - type: cover\n    file: ../{os.path.basename(self.outside)}\n".encode()
+        with self.assertRaisesRegex(ValueError, "outside the metadata directory"):
+            convert_upload(WORD_HTML % b"", meta)
+
+    def test_leaves_out_parent_html_image(self):
+        img = f'<p><img src="../{os.path.basename(self.outside)}"></p>'.encode()
+        data = convert_upload(WORD_HTML % img)
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            self.assertFalse([n for n in z.namelist() if n.endswith(".jpg")])
+            self.assertNotIn(b"<img", z.read("OEBPS/content-01.xhtml"))
+
+
+class ParseMultipartTest(unittest.TestCase):
+    def test_fields(self):
+        fields = parse_multipart(f"multipart/form-data; boundary={BOUNDARY}", multipart(html=b"<p>", metadata=b"a: 1"))
+        self.assertEqual(fields, {"html": b"<p>", "metadata": b"a: 1"})
+
+    def test_not_multipart(self):
+        with self.assertRaises(HTTPError):
+            parse_multipart("text/plain", b"hello")
+
+
+class EndpointTest(OutsideFileMixin, unittest.TestCase):
+    def request(self, raw, eof=False):
+        async def run():
+            server = await ConversionServer("127.0.0.1", 0, workers=1, max_queue=1, max_upload=1 << 20).start()
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                writer.write(raw)
+                if eof:
+                    writer.write_eof()
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+                return response
+            finally:
+                await server.close()
+
+        head, _, body = asyncio.run(run()).partition(b"\r\n\r\n")
+        return int(head.split()[1]), head, body
+
+    def post(self, body, length=None, eof=False):
+        length = str(len(body)) if length is None else length
+        return self.request(
+            f"POST /convert HTTP/1.1\r\nContent-Type: multipart/form-data; boundary={BOUNDARY}\r\n"
+            f"Content-Length: {length}\r\n\r\n".encode() + body,
+            eof,
+        )
+
+    def test_healthz(self):
+        status, _, body = self.request(b"GET /healthz HTTP/1.1\r\n\r\n")
+        self.assertEqual((status, json.loads(body)), (200, {"status": "ok"}))
+
+    def test_unknown_endpoint(self):
+        self.assertEqual(self.request(b"GET /nope HTTP/1.1\r\n\r\n")[0], 404)
+
+    def test_convert_needs_post(self):
+        self.assertEqual(self.request(b"GET /convert HTTP/1.1\r\n\r\n")[0], 405)
+
+    def test_invalid_content_length(self):
+        self.assertEqual(self.post(b"", length="abc")[0], 400)
+        self.assertEqual(self.post(b"", length="-1")[0], 400)
+
+    def test_body_shorter_than_content_length(self):
+        self.assertEqual(self.post(b"short", length="100", eof=True)[0], 400)
+
+    def test_upload_too_large(self):
+        self.assertEqual(self.post(b"", length=str(2 << 20))[0], 413)
+
+    def test_missing_html_field(self):
+        self.assertEqual(self.post(multipart(metadata=b"title: x\n"))[0], 400)
+
+    def test_convert(self):
+        status, head, body = self.post(multipart(html=WORD_HTML % b""))
+        self.assertEqual(status, 200)
+        self.assertIn(b"Transfer-Encoding: chunked", head)
+        self.assertIn(b"application/epub+zip", body)
+
+    def test_upload_cannot_pack_server_files(self):
+        meta = f"images:\n  - type: insert_after_toc\n    file: {self.outside}\n".encode()
+        status, _, body = self.post(multipart(html=WORD_HTML % b"", metadata=meta))
+        self.assertEqual(status, 422)
+        self.assertIn("outside the metadata directory", json.loads(body)["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
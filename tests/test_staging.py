@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from word2epub import staging
+from word2epub.staging import (
+    COPY,
+    HARDLINK,
+    SYMLINK,
+    StagingStats,
+    break_link,
+    stage_file,
+    stage_tree,
+    take_stats,
+)
+
+
+def _fail(*args, **kwargs):
+    raise OSError("not supported")
+
+
+class StageFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.src = os.path.join(self.tmp, "src.jpg")
+        with open(self.src, "wb") as f:
+            f.write(b"x" * 100)
+        self.dst = os.path.join(self.tmp, "stage", "OEBPS", "a.jpg")
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_hardlink_on_the_same_filesystem(self):
+        stats = StagingStats()
+        self.assertEqual(stage_file(self.src, self.dst, stats=stats), HARDLINK)
+        self.assertTrue(os.path.samefile(self.src, self.dst))
+        self.assertEqual(stats.summary(), "staged 1 files (1 hardlink), 0 bytes copied")
+
+    def test_symlink_only_for_references(self):
+        with mock.patch.object(os, "link", _fail), mock.patch.object(staging, "_reflink", _fail):
+            self.assertEqual(stage_file(self.src, self.dst, reference=True, stats=StagingStats()), SYMLINK)
+            self.assertEqual(os.readlink(self.dst), self.src)
+            strategy = stage_file(self.src, self.dst, stats=StagingStats())
+        self.assertNotIn(strategy, (HARDLINK, SYMLINK))
+        self.assertFalse(os.path.islink(self.dst))
+        self.assertEqual(self.read(self.dst), b"x" * 100)
+
+    def test_plain_copy_fallback(self):
+        stats = StagingStats()
+        with mock.patch.object(os, "link", _fail), mock.patch.object(staging, "_reflink", _fail), \
+                mock.patch.object(staging, "_kernel_copy", return_value=None):
+            self.assertEqual(stage_file(self.src, self.dst, stats=stats), COPY)
+        self.assertEqual(self.read(self.dst), b"x" * 100)
+        self.assertEqual(stats.copied_bytes, 100)
+
+    def test_break_link_keeps_the_source(self):
+        stage_file(self.src, self.dst, stats=StagingStats())
+        break_link(self.dst)
+        with open(self.dst, "wb") as f:
+            f.write(b"new")
+        self.assertEqual(self.read(self.src), b"x" * 100)
+        break_link(os.path.join(self.tmp, "missing"))
+
+    def test_take_stats_resets_the_counts(self):
+        take_stats()
+        stage_file(self.src, self.dst)
+        self.assertEqual(sum(take_stats().files.values()), 1)
+        self.assertEqual(take_stats().files, {})
+
+
+class StageTreeTest(unittest.TestCase):
+    def test_copies_the_tree(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        src = os.path.join(tmp, "tpl")
+        os.makedirs(os.path.join(src, "META-INF"))
+        for name in ("mimetype", "META-INF/container.xml"):
+            with open(os.path.join(src, name), "w") as f:
+                f.write(name)
+        dst = os.path.join(tmp, "stage")
+        stats = stage_tree(src, dst, stats=StagingStats())
+        with open(os.path.join(dst, "META-INF", "container.xml")) as f:
+            self.assertEqual(f.read(), "META-INF/container.xml")
+        self.assertEqual(sum(stats.files.values()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import pickle
+import unittest
+
+from word2epub.validate import ERROR, WARNING, EPUBValidationError, Issue
+
+
+class EPUBValidationErrorTest(unittest.TestCase):
+    def test_pickles_across_processes(self):
+        # volumes are validated in worker processes and the error is sent back pickled
+        error = EPUBValidationError([
+            Issue(ERROR, "OEBPS/content-01.xhtml", "XML parse error: mismatched tag"),
+            Issue(WARNING, "OEBPS/style.css", "unused"),
+        ])
+        restored = pickle.loads(pickle.dumps(error))
+        self.assertIsInstance(restored, EPUBValidationError)
+        self.assertEqual([str(i) for i in restored.issues], [str(i) for i in error.issues])
+        self.assertEqual(str(restored), str(error))
+        self.assertEqual(
+            str(restored),
+            "1 validation error(s):\nERROR: OEBPS/content-01.xhtml: XML parse error: mismatched tag",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from word2epub.chapter import Chapter
+from word2epub.epub_writer import register_metadata_images
+from word2epub.manifest import AssetRegistry
+from word2epub.volumes import split_volumes, volume_assets, volume_metadata, volume_path
+
+
+def chapter(index, size=10):
+    return Chapter(index, f"Chapter {index}", ["x" * size])
+
+
+class SplitVolumesTest(unittest.TestCase):
+    def test_by_chapter_count(self):
+        volumes = split_volumes([chapter(i) for i in range(1, 6)], max_chapters=2)
+        self.assertEqual([[c.index for c in v] for v in volumes], [[1, 2], [3, 4], [5]])
+
+    def test_by_bytes_never_cuts_a_chapter(self):
+        chapters = [chapter(1, 40), chapter(2, 40), chapter(3, 200), chapter(4, 10)]
+        volumes = split_volumes(chapters, max_bytes=100)
+        self.assertEqual([[c.index for c in v] for v in volumes], [[1, 2], [3], [4]])
+
+    def test_volume_path(self):
+        self.assertEqual(volume_path("book.epub", 1, 1), "book.epub")
+        self.assertEqual(volume_path("book.epub", 2, 3), "book-02.epub")
+
+    def test_volume_metadata(self):
+        vmeta = volume_metadata({"title": "Book", "identifier": "urn:x"}, 2, 3)
+        self.assertEqual(vmeta["series"], {"title": "Book", "position": 2, "total": 3})
+        self.assertEqual(vmeta["identifier"], "urn:x-vol2")
+
+
+class VolumeAssetsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        for name in ("cover.jpg", "toc.jpg", "plate1.jpg", "plate4.jpg", "end.jpg"):
+            with open(os.path.join(self.tmp, name), "wb") as f:
+                f.write(b"\xff\xd8")
+        self.meta = {
+            "_meta_dir": self.tmp,
+            "title": "Book",
+            "images": [
+                {"type": "cover", "file": "cover.jpg"},
+                {"type": "insert_after_toc", "file": "toc.jpg"},
+                {"type": "insert_after_chapter", "chapter": 1, "file": "plate1.jpg"},
+                {"type": "insert_before_chapter", "chapter": 4, "file": "plate4.jpg"},
+                {"type": "insert_at_end", "file": "end.jpg"},
+            ],
+        }
+        self.shared = list(register_metadata_images(self.meta, AssetRegistry()))
+
+    def hrefs(self, number, indexes):
+        vmeta = volume_metadata(self.meta, number, 2)
+        return sorted(item.href for item in volume_assets(self.shared, self.meta, vmeta, [chapter(i) for i in indexes]))
+
+    def test_each_volume_packs_only_its_plates(self):
+        self.assertEqual(self.hrefs(1, [1, 2]), ["cover.jpg", "plate1.jpg", "toc.jpg"])
+        self.assertEqual(self.hrefs(2, [3, 4]), ["cover.jpg", "end.jpg", "plate4.jpg", "toc.jpg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
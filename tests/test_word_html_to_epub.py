@@ -0,0 +1,58 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import word_html_to_epub
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.source = os.path.join(self.tmp, "book.htm")
+        with open(self.source, "w", encoding="utf-8") as f:
+            f.write('<html><body><p class="CHAPTER">One</p><p>a</p></body></html>')
+        self.output = os.path.join(self.tmp, "book.epub")
+        # metadata.yaml is also looked up in the working directory
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        self.addCleanup(os.chdir, cwd)
+
+    def run_main(self, *args):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            word_html_to_epub.main([self.source, self.output, *args])
+        return out.getvalue()
+
+    def test_without_metadata_prints_no_metadata(self):
+        log = self.run_main("--reproducible")
+        self.assertNotIn("Metadata loaded", log)
+        self.assertTrue(zipfile.is_zipfile(self.output))
+
+    def test_prints_only_user_metadata(self):
+        with open(os.path.join(self.tmp, "metadata.yaml"), "w", encoding="utf-8") as f:
+            f.write("title:\n  - type: main\n    text: Book\n")
+        log = self.run_main()
+        line = next(line for line in log.splitlines() if line.startswith("Metadata loaded"))
+        self.assertIn("'title': 'Book'", line)
+        self.assertNotIn("_reproducible", line)
+
+    def test_output_cache_restores_identical_build(self):
+        cache_dir = os.path.join(self.tmp, "cache")
+        self.assertNotIn("restored from cache", self.run_main("--reproducible", "--cache-dir", cache_dir))
+        with open(self.output, "rb") as f:
+            first = f.read()
+        os.remove(self.output)
+        self.assertIn("restored from cache", self.run_main("--reproducible", "--cache-dir", cache_dir))
+        with open(self.output, "rb") as f:
+            self.assertEqual(f.read(), first)
+        # another option is another key / オプションが違えば別のキー
+        self.assertNotIn("restored from cache", self.run_main("--reproducible", "--cache-dir", cache_dir, "--validate"))
+
+
+if __name__ == "__main__":
+    unittest.main()
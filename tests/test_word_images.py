@@ -0,0 +1,96 @@
+import contextlib
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from word2epub.parser import parse_word_html_and_split_chapters
+from word2epub.word_images import companion_dirs, companion_files
+
+
+def png(width, height, tag=b""):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", width, height) + b"\x08\x02\x00\x00\x00" + tag
+
+
+HTML = """<html><body>
+<p class=CHAPTER>One</p>
+<p><!--[if gte vml 1]><v:shape id="_x0000_i1025" style="width:100pt"><v:imagedata src="book.files/image001.png" o:title=""/></v:shape><![endif]--><![if !vml]><img width=100 height=50 src="book.files/image002.jpg" v:shapes="_x0000_i1025"><![endif]></p>
+<p><img src="book.files/image003.png"></p>
+<p class=CHAPTER>Two</p>
+<p><img src="book.files/copy.png"><img src="book.files/missing.png"><img src="../secret.png"><img src="https://example.com/a.png"></p>
+<p><!--[if gte vml 1]><v:shape id="_x0000_i1026"><v:imagedata src="book.files/image004.emz"/></v:shape><![endif]--><![if !vml]><img src="book.files/image005.gif" v:shapes="_x0000_i1026"><![endif]></p>
+</body></html>
+"""
+
+
+class CollectImagesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.base = os.path.join(self.tmp, "doc")
+        files = {
+            "book.files/image001.png": png(400, 200),
+            "book.files/image002.jpg": b"\xff\xd8reduced",
+            "book.files/image003.png": png(30, 20, b"three"),
+            "book.files/copy.png": png(30, 20, b"three"),
+            "book.files/image004.emz": b"emz",
+            "book.files/image005.gif": b"GIF89a\x05\x00\x06\x00",
+            "../secret.png": png(1, 1),
+        }
+        for name, data in files.items():
+            path = os.path.normpath(os.path.join(self.base, name))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+
+    def parse(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            chapters = parse_word_html_and_split_chapters(HTML, self.base)
+        return chapters, out.getvalue()
+
+    def html(self, chapter):
+        return "".join(str(node) for node in chapter["nodes"])
+
+    def test_originals_replace_reduced_copies(self):
+        (one, _), out = self.parse()
+        self.assertIn('src="images/image001.png"', self.html(one))
+        self.assertNotIn("v:", self.html(one))
+        self.assertNotIn("vml", self.html(one))
+        # Word's shown size is kept / Word の表示サイズはそのまま
+        self.assertIn('width="100"', self.html(one))
+        self.assertIn("1 originals", out)
+
+    def test_identical_pictures_are_packed_once(self):
+        (one, two), out = self.parse()
+        self.assertEqual(one["assets"], [
+            ("images/image001.png", os.path.join(self.base, "book.files", "image001.png")),
+            ("images/image003.png", os.path.join(self.base, "book.files", "image003.png")),
+        ])
+        self.assertIn(("images/image003.png", os.path.join(self.base, "book.files", "image003.png")), two["assets"])
+        self.assertIn('<img alt="" height="20" src="images/image003.png" width="30"/>', self.html(two))
+        self.assertIn("1 duplicates", out)
+
+    def test_unusable_originals_keep_the_shown_copy(self):
+        (_, two), _ = self.parse()
+        self.assertIn('src="images/image005.gif"', self.html(two))
+        self.assertNotIn("emz", self.html(two))
+
+    def test_missing_and_outside_pictures_are_dropped(self):
+        (_, two), out = self.parse()
+        html = self.html(two)
+        self.assertNotIn("missing.png", html)
+        self.assertNotIn("secret", html)
+        self.assertIn('src="https://example.com/a.png"', html)
+        self.assertNotIn("secret.png", "".join(path for _, path in two["assets"]))
+        self.assertIn("2 missing", out)
+
+    def test_companion_files(self):
+        self.assertEqual(companion_dirs(os.path.join(self.base, "book.htm")), [os.path.join(self.base, "book.files")])
+        self.assertEqual(len(companion_files(os.path.join(self.base, "book.htm"))), 6)
+        self.assertEqual(companion_files(os.path.join(self.base, "other.htm")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import contextlib
+import io
+import os
+import re
+import shutil
+import struct
+import tempfile
+import unittest
+
+from word2epub.chapter import Chapter
+from word2epub.manifest import AssetRegistry
+from word2epub.xhtml import (
+    build_image_xhtml,
+    build_opf,
+    generate_chapter_filenames,
+    is_fixed_layout_page,
+    iter_chapter_xhtml,
+    metadata_image_hrefs,
+    plan_image_pages,
+)
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", 600, 800) + b"\x08\x02\x00\x00\x00"
+
+
+class ImagePagesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        for name in ("a/plate.png", "b/plate.png", "map.png", "end.png", "cover.png"):
+            path = os.path.join(self.tmp, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(PNG)
+        self.meta = {
+            "_meta_dir": self.tmp,
+            "images": [
+                {"type": "cover", "file": "cover.png"},
+                {"type": "insert_at_end", "file": "end.png"},
+                {"type": "insert_after_chapter", "chapter": 1, "file": "b/plate.png"},
+                {"type": "insert_before_chapter", "chapter": 1, "file": "a/plate.png"},
+                {"type": "insert_after_toc", "file": "map.png", "layout": "fixed"},
+                {"type": "insert_before_chapter", "chapter": 2, "file": "missing.png"},
+            ],
+        }
+        self.chapters = [Chapter(1, "One", ["<p>one</p>"]), Chapter(2, "Two", ["<p>two</p>"])]
+
+    def plan(self, meta=None, chapters=None):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            pages = plan_image_pages(meta or self.meta, chapters or self.chapters)
+        return pages, out.getvalue()
+
+    def test_hrefs_of_same_named_files(self):
+        meta = dict(self.meta, images=self.meta["images"] + [{"type": "insert_at_end", "file": "./a/plate.png"}])
+        hrefs = metadata_image_hrefs(meta)
+        self.assertEqual(hrefs["a/plate.png"], "plate-2.png")
+        self.assertEqual(hrefs["b/plate.png"], "plate.png")
+        self.assertEqual(hrefs["./a/plate.png"], "plate-2.png")
+        self.assertEqual(hrefs["cover.png"], "cover.png")
+
+    def test_pages_keep_metadata_numbering(self):
+        pages, _ = self.plan()
+        self.assertEqual(
+            [(p.filename, p.item_id, p.image_href, p.placement, p.chapter) for p in pages],
+            [
+                ("image-001.xhtml", "imgpage1", "end.png", "insert_at_end", None),
+                ("image-002.xhtml", "imgpage2", "plate.png", "insert_after_chapter", 1),
+                ("image-003.xhtml", "imgpage3", "plate-2.png", "insert_before_chapter", 1),
+                ("image-004.xhtml", "imgpage4", "map.png", "insert_after_toc", None),
+            ],
+        )
+        self.assertEqual(pages[0].size, (600, 800))
+
+    def test_unknown_chapters_and_volumes(self):
+        meta = dict(self.meta, images=[{"type": "insert_after_chapter", "chapter": 9, "file": "map.png"},
+                                       {"type": "insert_before_chapter", "file": "map.png"}])
+        pages, out = self.plan(meta)
+        self.assertEqual(pages, [])
+        self.assertIn("no chapter 9", out)
+        self.assertIn("needs a chapter number", out)
+        # a volume gets neither other volumes' pages nor the end pages / 分冊は自分の章の画像だけ
+        first = dict(self.meta, series={"title": "S", "position": 1, "total": 2})
+        pages, out = self.plan(first, self.chapters[1:])
+        self.assertEqual([p.image_href for p in pages], ["map.png"])
+        self.assertEqual(out, "")
+
+    def test_reading_order(self):
+        pages, _ = self.plan()
+        registry = AssetRegistry()
+        rendered = list(iter_chapter_xhtml(self.chapters, registry, image_pages=pages))
+        self.assertEqual(
+            [key for key, _ in rendered],
+            ["imgpage4", "imgpage3", 1, "imgpage2", 2, "imgpage1"],
+        )
+        opf = build_opf(self.meta, generate_chapter_filenames(self.chapters), pages, registry)
+        spine = re.findall(r'<itemref idref="([^"]+)"( properties="[^"]*")? />', opf)
+        self.assertEqual(
+            spine,
+            [("toc", ""), ("imgpage4", ' properties="rendition:layout-pre-paginated"'), ("imgpage3", ""),
+             ("chap1", ""), ("imgpage2", ""), ("chap2", ""), ("imgpage1", "")],
+        )
+
+    def test_opf_without_registry_lists_metadata_images(self):
+        opf = build_opf(self.meta, generate_chapter_filenames(self.chapters), [])
+        self.assertIn('href="cover.png"', opf)
+        self.assertIn('properties="cover-image"', opf)
+        self.assertIn('href="plate-2.png"', opf)
+
+
+class ImageXhtmlTest(unittest.TestCase):
+    def test_reflowable_and_fixed_pages(self):
+        page = build_image_xhtml("map.png", (600, 800))
+        self.assertIn('<img src="map.png" alt="" width="600" height="800" style="max-width:100%; height:auto;" />', page)
+        self.assertFalse(is_fixed_layout_page(page))
+        fixed = build_image_xhtml("map.png", (600, 800), fixed_layout=True)
+        self.assertIn('<meta name="viewport" content="width=600, height=800" />', fixed)
+        self.assertTrue(is_fixed_layout_page(fixed))
+        # without a size a fixed page falls back to a reflowable one / サイズ不明なら通常ページ
+        self.assertFalse(is_fixed_layout_page(build_image_xhtml("map.png", None, fixed_layout=True)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# yaml2epub.py uses f-string syntax of Python 3.12
+if sys.version_info >= (3, 12):
+    import yaml2epub
+else:
+    yaml2epub = None
+
+
+@unittest.skipIf(yaml2epub is None, "yaml2epub.py needs Python 3.12")
+class CacheKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        meta_path = os.path.join(self.tmp, "metadata.yaml")
+        with open(meta_path, "w", encoding="utf-8") as f:
+            f.write("title: Book\ncreated_at: NOW_YMD\n")
+        self.graph = yaml2epub.DependencyGraph(meta_path)
+        self.graph.add("metadata", meta_path)
+
+    def key_on(self, day, meta):
+        with mock.patch.object(yaml2epub, "_now_ymd", return_value=day):
+            return yaml2epub._cache_key(self.graph, meta)
+
+    def test_now_ymd_date_is_part_of_the_key(self):
+        meta = {"created_at": "NOW_YMD"}
+        self.assertEqual(self.key_on("2026-10-19", meta), self.key_on("2026-10-19", meta))
+        self.assertNotEqual(self.key_on("2026-10-19", meta), self.key_on("2026-10-20", meta))
+        colophon = {"colophon": {"created_at": "NOW_YMD"}}
+        self.assertNotEqual(self.key_on("2026-10-19", colophon), self.key_on("2026-10-20", colophon))
+
+    def test_fixed_date_keeps_the_key(self):
+        meta = {"created_at": "2024-01-01"}
+        self.assertEqual(self.key_on("2026-10-19", meta), self.key_on("2026-10-20", meta))
+
+    def test_validate_is_part_of_the_key(self):
+        self.assertNotEqual(self.key_on("x", {}), self.key_on("x", {"_validate": True}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,34 +1,64 @@
-"""word2epub package exports."""
-from .metadata import load_metadata
-from .encoding import detect_encoding
-from .parser import (
-    load_html_and_split_chapters,
-    remove_duplicate_title_span,
-    remove_orphan_en_spans,
-    clean_word_garbage,
-    clean_span_and_ruby,
-)
-from .xhtml import (
-    generate_all_chapter_xhtml,
-    generate_chapter_filenames,
-    build_toc_xhtml,
-    build_image_xhtml,
-    build_opf,
-)
-from .epub_writer import create_epub
-
-__all__ = [
-    "load_metadata",
-    "detect_encoding",
-    "load_html_and_split_chapters",
-    "remove_duplicate_title_span",
-    "remove_orphan_en_spans",
-    "clean_word_garbage",
-    "clean_span_and_ruby",
-    "generate_all_chapter_xhtml",
-    "generate_chapter_filenames",
-    "build_toc_xhtml",
-    "build_image_xhtml",
-    "build_opf",
-    "create_epub",
-]
+"""word2epub package exports.
+
+Exports are loaded lazily (PEP 562): ``import word2epub`` is cheap, and bs4,
+chardet or yaml are only imported when a name that needs them is first used.
+"""
+import importlib
+
+__version__ = "0.1.0"
+
+# exported name -> submodule that defines it
+_EXPORTS = {
+    "Chapter": "chapter",
+    "compact_chapters": "chapter",
+    "load_metadata": "metadata",
+    "detect_encoding": "encoding",
+    "load_html_and_split_chapters": "parser",
+    "remove_duplicate_title_span": "parser",
+    "remove_orphan_en_spans": "parser",
+    "clean_word_garbage": "parser",
+    "clean_span_and_ruby": "parser",
+    "generate_all_chapter_xhtml": "xhtml",
+    "iter_chapter_xhtml": "xhtml",
+    "generate_chapter_filenames": "xhtml",
+    "build_toc_xhtml": "xhtml",
+    "build_image_xhtml": "xhtml",
+    "ImagePage": "xhtml",
+    "plan_image_pages": "xhtml",
+    "build_opf": "xhtml",
+    "create_epub": "epub_writer",
+    "register_metadata_images": "epub_writer",
+    "AssetRegistry": "manifest",
+    "guess_media_type": "manifest",
+    "ZipOutput": "output",
+    "DirectoryOutput": "output",
+    "MemoryOutput": "output",
+    "RecordingOutput": "output",
+    "open_output": "output",
+    "convert_word_html": "convert",
+    "split_volumes": "volumes",
+    "write_volumes": "volumes",
+    "ChapterIndex": "chapter_index",
+    "load_chapter_index": "chapter_index",
+    "load_chapters": "chapter_index",
+    "load_docx_chapters": "docx",
+    "validate_epub": "validate",
+    "validate_members": "validate",
+    "EPUBValidationError": "validate",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # cache so __getattr__ is not called again for this name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
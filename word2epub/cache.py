@@ -0,0 +1,312 @@
+"""Content-addressed cache of built EPUB files.
+
+Builds are keyed by a fingerprint over every input file (content hashes)
+plus tool/template versions and build options. On a hit the cached EPUB is
+copied to the output path instead of rebuilding. Entries are evicted in
+least-recently-used order once the cache exceeds its size limit.
+
+The same directory also holds the parse cache: the cleaned chapters of a
+Word HTML file, keyed by the file's hash (and its companion picture
+folder) and the cleaner version, so a rebuild after a metadata- or
+style-only change skips parsing and cleaning.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GiB
+
+# environment variable providing a default cache directory
+CACHE_DIR_ENV = "WORD2EPUB_CACHE_DIR"
+
+STATS_FILE = "stats.json"
+ENTRY_SUFFIX = ".epub"
+
+PARSE_DIR = "chapters"
+PARSE_SUFFIX = ".json"
+# bump when the parser or a cleaning pass changes its output
+# パーサやクリーニング処理の出力が変わったら上げる
+CLEANER_VERSION = 5
+DEFAULT_MAX_PARSE_ENTRIES = 64
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_tree(root):
+    """Return a sha256 over all files (relative path + content) below `root`."""
+    h = hashlib.sha256()
+    if not os.path.isdir(root):
+        return h.hexdigest()
+    for base, dirs, files in os.walk(root):
+        dirs.sort()
+        for fn in sorted(files):
+            path = os.path.join(base, fn)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            h.update(rel.encode("utf-8") + b"\0" + hash_file(path).encode("ascii") + b"\n")
+    return h.hexdigest()
+
+
+def fingerprint_inputs(paths, root=None, extra=None):
+    """Compute the build fingerprint.
+
+    Args:
+        paths (iterable[str]): Input files. Missing files are recorded as missing.
+        root (str | None): Paths are recorded relative to this directory so the
+            fingerprint does not change when the project is moved.
+        extra (dict | None): Tool/template versions and build options.
+
+    Returns:
+        str: sha256 hex digest.
+    """
+    entries = []
+    for path in sorted(set(os.path.abspath(p) for p in paths)):
+        rel = os.path.relpath(path, root) if root else path
+        digest = hash_file(path) if os.path.isfile(path) else None
+        entries.append([rel.replace(os.sep, "/"), digest])
+    payload = json.dumps({"inputs": entries, "extra": extra or {}}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def parse_size(text):
+    """Parse a size such as "500M", "2G" or "1048576" into bytes."""
+    text = str(text).strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+class OutputCache:
+    """A directory of EPUB files named by fingerprint, with LRU size eviction.
+
+    The mtime of an entry is bumped on every hit, so eviction removes the
+    entries that were used least recently.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ENTRY_SUFFIX)
+
+    def fetch(self, key, out_path):
+        """Copy the cached EPUB for `key` to `out_path`; return True on a hit."""
+        path = self.entry_path(key)
+        if not os.path.isfile(path):
+            self._record("misses")
+            return False
+        out_dir = os.path.dirname(os.path.abspath(out_path))
+        os.makedirs(out_dir, exist_ok=True)
+        shutil.copyfile(path, out_path)
+        # mark as recently used / 最近使ったエントリとして記録
+        os.utime(path)
+        self._record("hits")
+        return True
+
+    def store(self, key, src_path):
+        """Add a freshly built EPUB to the cache and evict old entries."""
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # copy to a temp name first so readers never see a partial entry
+        # 途中のファイルが読まれないよう一時ファイル経由で置き換える
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(src_path, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def entries(self):
+        """Return [(mtime, size, path)] for all cached EPUBs."""
+        result = []
+        for base, dirs, files in os.walk(self.cache_dir):
+            for fn in files:
+                if not fn.endswith(ENTRY_SUFFIX):
+                    continue
+                path = os.path.join(base, fn)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits `max_bytes`."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        if evicted:
+            self._record("evictions", evicted)
+        return evicted
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current entry count and size."""
+        data = self._load_stats()
+        entries = self.entries()
+        data["entries"] = len(entries)
+        data["bytes"] = sum(size for _, size, _ in entries)
+        return data
+
+    def _load_stats(self):
+        path = os.path.join(self.cache_dir, STATS_FILE)
+        data = {"hits": 0, "misses": 0, "evictions": 0}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        return data
+
+    def _record(self, counter, amount=1):
+        data = self._load_stats()
+        data[counter] = data.get(counter, 0) + amount
+        try:
+            with open(os.path.join(self.cache_dir, STATS_FILE), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        except OSError:
+            pass
+
+
+def open_cache(cache_dir=None, max_size=None):
+    """Return an OutputCache for `cache_dir` (or $WORD2EPUB_CACHE_DIR), or None when disabled."""
+    cache_dir = cache_dir or os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    max_bytes = parse_size(max_size) if max_size else DEFAULT_MAX_BYTES
+    return OutputCache(cache_dir, max_bytes)
+
+
+class ParseCache:
+    """Cleaned chapters of Word HTML sources, stored as JSON under ``<cache_dir>/chapters``.
+
+    Picture paths (``chapter["assets"]``) are stored relative to the folder
+    of the HTML file, so an entry stays valid when the project is moved.
+    At most `max_entries` sources are kept; the least recently used are removed.
+    """
+
+    def __init__(self, cache_dir, max_entries=DEFAULT_MAX_PARSE_ENTRIES):
+        self.root = os.path.join(cache_dir, PARSE_DIR)
+        self.max_entries = max_entries
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(source):
+        """Key of `source`: its content hash, its pictures and the cleaner and tool versions."""
+        from . import __version__
+        from .word_images import companion_dirs
+
+        # which pictures are packed (and deduplicated) depends on the companion folder
+        # 画像の選択と重複排除は .files フォルダの内容で決まる
+        pictures = ",".join(hash_tree(folder) for folder in companion_dirs(source))
+        payload = f"{hash_file(source)}:{pictures}:{CLEANER_VERSION}:{__version__}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key + PARSE_SUFFIX)
+
+    def load(self, key, source):
+        """Return the cached chapters for `key` (of the HTML file `source`) as Chapter objects, or None."""
+        from .chapter import Chapter
+
+        path = self.entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("cleaner_version") != CLEANER_VERSION:
+            return None
+        os.utime(path)
+        base_dir = os.path.dirname(os.path.abspath(source))
+        return [
+            Chapter(
+                c["index"], c["title"], c["fragments"],
+                [(href, os.path.normpath(os.path.join(base_dir, rel))) for href, rel in c.get("assets", ())],
+            )
+            for c in data["chapters"]
+        ]
+
+    def store(self, key, chapters, source):
+        """Store cleaned chapters (Chapter objects holding fragments) of the HTML file `source` for `key`."""
+        # relative to the HTML file, so a moved project still hits
+        # HTML ファイルからの相対パスで保存し、プロジェクトを移動しても使えるようにする
+        base_dir = os.path.dirname(os.path.abspath(source))
+        data = {
+            "cleaner_version": CLEANER_VERSION,
+            "chapters": [
+                {
+                    "index": c.index,
+                    "title": c.title,
+                    "fragments": c.fragments,
+                    "assets": [
+                        (href, os.path.relpath(path, base_dir).replace(os.sep, "/")) for href, path in c.assets
+                    ],
+                }
+                for c in chapters
+            ],
+        }
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.entry_path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for fn in os.listdir(self.root):
+            if fn.endswith(PARSE_SUFFIX):
+                path = os.path.join(self.root, fn)
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    continue
+        entries.sort()
+        for _, path in entries[: max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def open_parse_cache(cache_dir=None):
+    """Return a ParseCache for `cache_dir` (or $WORD2EPUB_CACHE_DIR), or None when disabled."""
+    cache_dir = cache_dir or os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    return ParseCache(cache_dir)
+
+
+def format_stats(stats):
+    return (
+        f"hits={stats['hits']} misses={stats['misses']} evictions={stats.get('evictions', 0)} "
+        f"entries={stats['entries']} size={stats['bytes']}"
+    )
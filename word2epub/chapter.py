@@ -0,0 +1,106 @@
+"""Compact chapter representation.
+
+The parser produces chapters as dicts ``{"index", "title", "nodes"}`` whose
+nodes are live BeautifulSoup objects; every Tag references its parent and
+siblings, so one chapter keeps the whole parse tree alive. Once cleaning is
+done, `compact_chapters` turns them into `Chapter` objects that hold only the
+serialized fragments and releases the parse tree chapter by chapter.
+
+`Chapter` supports ``chapter["index"]``, ``chapter["title"]`` and
+``chapter["nodes"]`` so code written for the dict form keeps working.
+``assets`` lists files the chapter references that must be packed with it,
+as ``(href, source)`` pairs (e.g. images embedded in a .docx).
+"""
+
+
+class Chapter:
+    """A chapter as index, title and serialized HTML fragments."""
+
+    __slots__ = ("index", "title", "fragments", "assets")
+
+    _KEYS = ("index", "title", "nodes", "assets")
+
+    def __init__(self, index, title, fragments=(), assets=()):
+        self.index = index
+        self.title = title
+        self.fragments = list(fragments)
+        self.assets = list(assets)
+
+    @classmethod
+    def from_nodes(cls, chapter):
+        """Build a Chapter from the dict form (or copy another Chapter)."""
+        return cls(
+            chapter["index"], chapter["title"], [str(node) for node in chapter["nodes"]], chapter.get("assets") or ()
+        )
+
+    @property
+    def nodes(self):
+        # rendering only needs str(node), which the fragments already are
+        return self.fragments
+
+    @property
+    def html(self):
+        return "".join(self.fragments)
+
+    @property
+    def size(self):
+        """Size of the serialized body in UTF-8 bytes."""
+        return sum(len(f.encode("utf-8")) for f in self.fragments)
+
+    def parse_nodes(self):
+        """Parse the fragments back into BeautifulSoup nodes (one node per fragment)."""
+        from bs4 import BeautifulSoup
+
+        nodes = []
+        for fragment in self.fragments:
+            soup = BeautifulSoup(fragment, "html.parser")
+            nodes.append(soup.contents[0].extract() if len(soup.contents) == 1 else soup)
+        return nodes
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key == "nodes":
+            self.fragments = [str(node) for node in value]
+        elif key in self._KEYS:
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._KEYS else default
+
+    def __repr__(self):
+        return f"Chapter({self.index!r}, {self.title!r}, {len(self.fragments)} fragments)"
+
+
+def compact_chapters(chapters):
+    """Serialize cleaned dict chapters into Chapter objects, freeing the soup as it goes.
+
+    Each chapter's nodes are decomposed right after it is serialized, except
+    nodes that still contain a later chapter (e.g. a ``WordSection`` div that
+    spans a section break), so memory is released chapter by chapter instead
+    of only when the last chapter is done.
+    """
+    from bs4 import Tag
+
+    result = []
+    for i, chap in enumerate(chapters):
+        if isinstance(chap, Chapter):
+            result.append(chap)
+            continue
+        result.append(Chapter.from_nodes(chap))
+
+        following = chapters[i + 1]["nodes"] if i + 1 < len(chapters) else None
+        keep = set()
+        if following and not isinstance(chapters[i + 1], Chapter) and isinstance(following[0], Tag):
+            keep = {id(parent) for parent in following[0].parents}
+        for node in chap["nodes"]:
+            # children of an already decomposed node are cleared with it
+            if isinstance(node, Tag) and not node.decomposed and id(node) not in keep:
+                node.decompose()
+        chap["nodes"] = []
+    return result
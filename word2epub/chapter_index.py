@@ -0,0 +1,179 @@
+"""Byte-level index of the `CHAPTER` paragraphs in a Word HTML file.
+
+Finding chapters normally means parsing the whole document. The scanner
+here looks for ``<p class=CHAPTER>`` start tags directly in the raw bytes
+(Word HTML is saved in an ASCII-compatible encoding) and records the byte
+range and title of every chapter. The index is cached in a sidecar file
+next to the source (``book.htm.chapters.json``), keyed by size/mtime and
+sha256, so chapter counts, single-chapter previews and parallel workers
+only read and parse the slice of the file they need.
+"""
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+from .cache import hash_file
+from .chapter import compact_chapters
+from .encoding import detect_encoding
+from .parser import chapter_title, parse_word_html_and_split_chapters
+
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".chapters.json"
+
+# <p ... class=CHAPTER ...> (class match is case sensitive, like the parser's)
+_CHAPTER_TAG = re.compile(
+    rb"<(?i:p)\b[^>]*?\b(?i:class)\s*=\s*"
+    rb"(?:\"[^\"]*CHAPTER[^\"]*\"|'[^']*CHAPTER[^']*'|[^\s>\"']*CHAPTER[^\s>]*)[^>]*>"
+)
+_BODY_START = re.compile(rb"<body\b", re.I)
+_BODY_END = re.compile(rb"</body\s*>", re.I)
+_P_END = re.compile(rb"</p\s*>", re.I)
+
+
+def index_path(source):
+    return source + INDEX_SUFFIX
+
+
+def scan_chapter_markers(raw):
+    """Return (start, end) byte offsets of every chapter in `raw`.
+
+    A chapter runs from its ``CHAPTER`` paragraph to the next one; the last
+    chapter ends at ``</body>`` (or the end of the file). The head, and
+    therefore the stylesheet's ``p.CHAPTER`` rules, is skipped.
+    """
+    body = _BODY_START.search(raw)
+    pos = body.start() if body else 0
+    starts = [m.start() for m in _CHAPTER_TAG.finditer(raw, pos)]
+    if not starts:
+        return []
+    end = _BODY_END.search(raw, starts[-1])
+    stop = end.start() if end else len(raw)
+    return list(zip(starts, starts[1:] + [stop]))
+
+
+class ChapterIndex:
+    """Chapter byte ranges and titles of one Word HTML file."""
+
+    def __init__(self, source, encoding, size, mtime_ns, sha256, entries):
+        self.source = source
+        self.encoding = encoding
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.sha256 = sha256
+        # [{"index": 1, "start": ..., "end": ..., "title": ...}, ...]
+        self.entries = entries
+
+    @classmethod
+    def build(cls, source):
+        """Scan `source` and build its index."""
+        encoding, raw = detect_encoding(source)
+        if "<p>".encode(encoding, errors="replace") != b"<p>":
+            raise ValueError(f"cannot index {source}: {encoding} is not ASCII compatible")
+        entries = []
+        for i, (start, end) in enumerate(scan_chapter_markers(raw), start=1):
+            p_end = _P_END.search(raw, start, end)
+            head = raw[start:p_end.end() if p_end else end].decode(encoding, errors="ignore")
+            node = BeautifulSoup(head, "html.parser").find("p")
+            entries.append({"index": i, "start": start, "end": end, "title": chapter_title(node) if node else ""})
+        st = os.stat(source)
+        return cls(source, encoding, st.st_size, st.st_mtime_ns, hash_file(source), entries)
+
+    def to_dict(self):
+        return {
+            "version": INDEX_VERSION,
+            "encoding": self.encoding,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "sha256": self.sha256,
+            "chapters": self.entries,
+        }
+
+    def save(self):
+        """Write the sidecar file; a read-only directory only disables caching."""
+        try:
+            with open(index_path(self.source), "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        except OSError:
+            pass
+
+    def read_html(self, number):
+        """Return the HTML slice of chapter `number` (1-based)."""
+        entry = self.entries[number - 1]
+        with open(self.source, "rb") as f:
+            f.seek(entry["start"])
+            raw = f.read(entry["end"] - entry["start"])
+        return raw.decode(self.encoding, errors="ignore")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
+def load_chapter_index(source, use_cache=True):
+    """Return the ChapterIndex of `source`, from the sidecar file when still valid.
+
+    The sidecar is trusted when size and mtime match; when only the mtime
+    changed (e.g. the file was copied) the sha256 decides.
+    """
+    st = os.stat(source)
+    if use_cache:
+        try:
+            with open(index_path(source), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if data and data.get("version") == INDEX_VERSION and data.get("size") == st.st_size:
+            index = ChapterIndex(source, data["encoding"], data["size"], data["mtime_ns"], data["sha256"], data["chapters"])
+            if data.get("mtime_ns") == st.st_mtime_ns:
+                return index
+            if data.get("sha256") == hash_file(source):
+                index.mtime_ns = st.st_mtime_ns
+                index.save()
+                return index
+    index = ChapterIndex.build(source)
+    if use_cache:
+        index.save()
+    return index
+
+
+def parse_chapter(source, number, index=None):
+    """Parse only chapter `number` (1-based) of `source` into a dict chapter."""
+    index = index or load_chapter_index(source)
+    if not 1 <= number <= len(index):
+        raise IndexError(f"{source} has {len(index)} chapters, no chapter {number}")
+    chapters = parse_word_html_and_split_chapters(index.read_html(number), os.path.dirname(os.path.abspath(source)))
+    chapter = chapters[0]
+    chapter["index"] = number
+    return chapter
+
+
+def _load_one(source, number):
+    from .convert import clean_chapter
+
+    return compact_chapters([clean_chapter(parse_chapter(source, number))])[0]
+
+
+def load_chapters(source, numbers=None, jobs=None):
+    """Parse and clean the chapters `numbers` (default: all) slice by slice.
+
+    Each chapter is parsed from its own byte range, in `jobs` worker
+    processes when more than one is requested.
+
+    Returns:
+        list[Chapter]: Cleaned chapters in the order of `numbers`.
+    """
+    index = load_chapter_index(source)
+    numbers = list(numbers) if numbers else [e["index"] for e in index]
+    for n in numbers:
+        if not 1 <= n <= len(index):
+            raise IndexError(f"{source} has {len(index)} chapters, no chapter {n}")
+    if not jobs or jobs <= 1 or len(numbers) <= 1:
+        return [_load_one(source, n) for n in numbers]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(numbers))) as pool:
+        return list(pool.map(_load_one, [source] * len(numbers), numbers))
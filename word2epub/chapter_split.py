@@ -0,0 +1,102 @@
+"""Split oversized chapters into several XHTML files.
+
+Large XHTML files make e-ink readers slow to paginate and can exceed their
+per-file memory limits. Chapters are cut only between top-level elements
+(paragraph boundaries), and each part stays under a byte budget unless a
+single paragraph is larger on its own. The first part keeps the original
+filename, so TOC links and ``toc-NNN`` anchors keep pointing at it.
+"""
+from html.parser import HTMLParser
+
+
+# per-file budget; some readers struggle with XHTML files above ~300 KB
+DEFAULT_MAX_PART_BYTES = 256 * 1024
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "source", "track", "wbr",
+}
+
+
+class _TopLevelScanner(HTMLParser):
+    """Collect the offsets at which top-level (depth 0) elements start."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.depth = 0
+        self.starts = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.depth == 0:
+            self.starts.append(self.getpos())
+        if tag not in VOID_ELEMENTS:
+            self.depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        if self.depth == 0:
+            self.starts.append(self.getpos())
+
+    def handle_endtag(self, tag):
+        if tag not in VOID_ELEMENTS and self.depth > 0:
+            self.depth -= 1
+
+
+def top_level_blocks(html):
+    """Split an HTML fragment into top-level blocks (joined, they give `html` back).
+
+    Text between elements stays with the preceding block.
+    """
+    scanner = _TopLevelScanner()
+    scanner.feed(html)
+    scanner.close()
+
+    line_offsets = [0]
+    for line in html.splitlines(keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+    cuts = sorted({line_offsets[lineno - 1] + col for lineno, col in scanner.starts} - {0})
+
+    blocks = []
+    prev = 0
+    for cut in cuts:
+        blocks.append(html[prev:cut])
+        prev = cut
+    blocks.append(html[prev:])
+    return [b for b in blocks if b]
+
+
+def pack_blocks(blocks, max_bytes):
+    """Group consecutive blocks into parts of at most `max_bytes` UTF-8 bytes.
+
+    Returns:
+        list[str]: The HTML of each part (a single part when nothing needs cutting).
+    """
+    if not max_bytes:
+        return ["".join(blocks)]
+    parts = []
+    current = []
+    size = 0
+    for block in blocks:
+        n = len(block.encode("utf-8"))
+        if current and size + n > max_bytes:
+            parts.append("".join(current))
+            current = []
+            size = 0
+        current.append(block)
+        size += n
+    if current or not parts:
+        parts.append("".join(current))
+    return parts
+
+
+def split_html(html, max_bytes=DEFAULT_MAX_PART_BYTES):
+    """Split an HTML fragment at top-level element boundaries into parts under `max_bytes`."""
+    if not max_bytes or len(html.encode("utf-8")) <= max_bytes:
+        return [html]
+    return pack_blocks(top_level_blocks(html), max_bytes)
+
+
+def part_name(name, part):
+    """Return the name of part `part` (1-based): "p-001" -> "p-001", "p-001-02", ..."""
+    if part == 1:
+        return name
+    return f"{name}-{part:02d}"
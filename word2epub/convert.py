@@ -0,0 +1,235 @@
+"""Word HTML -> EPUB pipeline as a library API.
+
+    from word2epub.convert import convert_word_html
+
+    data = convert_word_html("book.htm", metadata_path="metadata.yaml")  # bytes
+    convert_word_html("book.htm", "book.epub")                          # file
+    convert_word_html("book.htm", response_stream)                       # stream
+
+Streams do not need to be seekable: the ZIP is written in streaming mode
+and chapters are rendered while the EPUB is being written.
+"""
+import os
+
+from .chapter import compact_chapters
+from .chapter_split import DEFAULT_MAX_PART_BYTES
+from .docx import is_docx, load_docx_chapters
+from .epub_writer import create_epub, register_chapter_assets, register_metadata_images
+from .manifest import AssetRegistry
+from .metadata import load_metadata
+from .output import DirectoryOutput, OutputBackend, is_stream
+from .parser import (
+    load_html_and_split_chapters,
+    remove_duplicate_title_span,
+    remove_orphan_en_spans,
+    clean_word_garbage,
+    clean_span_and_ruby,
+)
+from .reproducible import reproducible_requested
+from .styles import DROP, EM, STRONG, UNWRAP, classify_style, hoist_inline_styles
+from .xhtml import (
+    build_opf,
+    build_toc_xhtml,
+    generate_chapter_filenames,
+    iter_chapter_xhtml,
+    plan_image_pages,
+)
+
+
+STYLE_CSS = """
+@charset "UTF-8";
+body {
+  writing-mode: vertical-rl;
+  -epub-writing-mode: vertical-rl;
+  line-height: 1.8;
+  font-family: "YuMincho", serif;
+}
+p {
+  margin: 0 0 1em 0;
+}
+"""
+
+
+def find_metadata(input_html, metadata_arg=None):
+    """Return the metadata path given on the command line or auto-detected, or None."""
+    # If user provided metadata path, use it. Otherwise auto-detect.
+    if metadata_arg:
+        return metadata_arg
+    # Search candidates: same dir as input, then cwd
+    input_dir = os.path.dirname(os.path.abspath(input_html))
+    candidates = [
+        os.path.join(input_dir, "metadata.yaml"),
+        os.path.join(os.getcwd(), "metadata.yaml"),
+    ]
+    for p in candidates:
+        if os.path.exists(p):
+            return p
+    return None
+
+
+def load_book_metadata(metadata_path, reproducible=False):
+    if metadata_path is None:
+        print("Warning: metadata file not found; proceeding with defaults.")
+        meta = {}
+    else:
+        print("Using metadata:", metadata_path)
+        meta = load_metadata(metadata_path)
+        # remember metadata file directory so image paths in metadata
+        # can be resolved relative to the metadata file
+        meta_dir = os.path.dirname(os.path.abspath(metadata_path))
+        meta["_meta_dir"] = meta_dir
+    meta["_reproducible"] = reproducible
+    return meta
+
+
+def clean_chapter(chap):
+    """Run all cleaning passes on one (dict) chapter, including the title fix-up."""
+    remove_duplicate_title_span(chap)
+    remove_orphan_en_spans(chap)
+    clean_word_garbage(chap)
+    clean_span_and_ruby(chap)
+
+    # 章タイトル内の簡易変換
+    first = chap["nodes"][0]
+    if getattr(first, "name", None) == "p" and "CHAPTER" in first.get("class", []):
+        for span in first.find_all("span"):
+            kind = classify_style(span.get("style", ""))
+            if kind in (DROP, UNWRAP):
+                span.unwrap()
+            elif kind in (EM, STRONG):
+                tag = first.new_tag(kind)
+                tag.string = span.get_text()
+                span.replace_with(tag)
+    return chap
+
+
+def load_and_clean_chapters(input_html, parse_cache=None):
+    """Parse the Word HTML, split it into chapters and run all cleaning passes.
+
+    A .docx is read directly (see docx.py) and needs no cleaning.
+
+    Args:
+        input_html (str): Word HTML (or .docx) file.
+        parse_cache (ParseCache | None): When given, cleaned chapters are
+            reused for an unchanged HTML file and stored after a parse.
+
+    Returns:
+        list[Chapter]: Cleaned chapters holding serialized fragments.
+    """
+    if is_docx(input_html):
+        # chapters come out of the .docx already clean / .docx はそのまま章にできる
+        return load_docx_chapters(input_html)
+
+    key = parse_cache.key(input_html) if parse_cache is not None else None
+    chapters = parse_cache.load(key, input_html) if key else None
+    if chapters is not None:
+        # same HTML and cleaner: skip parsing and cleaning / 解析・クリーニングを省略
+        print("Chapters loaded from parse cache.")
+    else:
+        chapters = load_html_and_split_chapters(input_html)
+
+        for chap in chapters:
+            clean_chapter(chap)
+
+        # keep only serialized fragments; the parse tree is released as we go
+        # 以降はシリアライズ済みの断片だけを保持し、パースツリーを解放する
+        chapters = compact_chapters(chapters)
+        if key:
+            parse_cache.store(key, chapters, input_html)
+
+    if not chapters:
+        print("Warning: No chapters (class='CHAPTER') found.")
+    else:
+        print(f"Found {len(chapters)} chapters.")
+        for chap in chapters:
+            print(chap["index"], chap["title"])
+
+    return chapters
+
+
+def write_book(output, meta, chapters, output_format="zip", registry=None, max_part_bytes=DEFAULT_MAX_PART_BYTES,
+               validate=False, style_classes=False):
+    """Render cleaned chapters plus TOC/OPF and write the EPUB.
+
+    Args:
+        output (str | file | OutputBackend | None): EPUB path, writable binary
+            stream, output backend, or None to get the EPUB as bytes.
+        meta (dict): Metadata (see load_book_metadata).
+        chapters (list[dict]): Cleaned chapters.
+        output_format (str): With "dir", `output` is an unpacked EPUB
+            directory in which only changed files are rewritten.
+        registry (AssetRegistry | None): Registry with the metadata images
+            already registered (shared between volumes, see volumes.py).
+        max_part_bytes (int | None): Chapters larger than this are split
+            into several XHTML files (see chapter_split.py); None/0 disables.
+        validate (bool): Check the book before writing it (see validate.py);
+            raises EPUBValidationError on errors.
+        style_classes (bool): Move inline ``style`` attributes into generated
+            classes in the stylesheet (see styles.hoist_inline_styles).
+
+    Returns:
+        bytes | None: The EPUB when `output` is None.
+    """
+    style_css = STYLE_CSS
+    if style_classes:
+        chapters, css, stats = hoist_inline_styles(chapters)
+        style_css += css
+        print(f"Inline styles: {stats['elements']} elements -> {stats['classes']} classes, "
+              f"{stats['bytes_saved']} bytes saved")
+
+    # every producer registers its output so the manifest needs no rescan
+    shared_assets = registry is not None
+    if not shared_assets:
+        registry = AssetRegistry()
+    # image pages are rendered with the chapters, in reading order, only when
+    # create_epub reaches them / 画像ページも章と同じく書き出し時に読み順で生成する
+    image_pages = plan_image_pages(meta, chapters)
+    chapter_files = iter_chapter_xhtml(chapters, registry, max_part_bytes, image_pages)
+    chapter_filenames = generate_chapter_filenames(chapters)
+
+    toc_xhtml = build_toc_xhtml(chapters, chapter_filenames)
+
+    if not shared_assets:
+        register_metadata_images(meta, registry)
+    register_chapter_assets(chapters, registry)
+    opf_content = build_opf(meta, chapter_filenames, image_pages, registry)
+
+    if output_format == "dir":
+        with DirectoryOutput(output) as out:
+            create_epub(out, chapter_files, toc_xhtml, opf_content, style_css, (), meta, registry, validate)
+        print(f"EPUB directory written: {output} ({out.summary()})")
+        return None
+
+    data = create_epub(output, chapter_files, toc_xhtml, opf_content, style_css, (), meta, registry, validate)
+
+    if isinstance(output, str):
+        print(f"EPUB created: {output}")
+    return data
+
+
+def convert_word_html(input_html, output=None, metadata_path=None, reproducible=False,
+                      max_part_bytes=DEFAULT_MAX_PART_BYTES, style_classes=False, confine_images=False):
+    """Convert a Word HTML file into an EPUB.
+
+    Args:
+        input_html (str): Word HTML file.
+        output (str | file | OutputBackend | None): EPUB path, writable binary
+            stream (need not be seekable), output backend, or None to return
+            the EPUB as bytes.
+        metadata_path (str | None): metadata.yaml; auto-detected when omitted.
+        reproducible (bool): Bit-identical output (also via SOURCE_DATE_EPOCH).
+        max_part_bytes (int | None): Split chapters larger than this; None/0 disables.
+        style_classes (bool): Replace inline styles with generated classes.
+        confine_images (bool): Refuse metadata images outside the metadata
+            directory (ValueError), for untrusted uploads.
+
+    Returns:
+        bytes | None: The EPUB when `output` is None.
+    """
+    if not (output is None or isinstance(output, (str, OutputBackend)) or is_stream(output)):
+        raise TypeError(f"output must be a path, a writable binary stream or an OutputBackend, not {type(output).__name__}")
+    metadata_path = find_metadata(input_html, metadata_path)
+    meta = load_book_metadata(metadata_path, reproducible_requested(reproducible))
+    meta["_confine_images"] = confine_images
+    chapters = load_and_clean_chapters(input_html)
+    return write_book(output, meta, chapters, max_part_bytes=max_part_bytes, style_classes=style_classes)
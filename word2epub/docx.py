@@ -0,0 +1,318 @@
+"""Read chapters straight from a .docx, without Word's "Save as Web Page".
+
+``word/document.xml`` is streamed out of the archive with an incremental
+XML parser (`iterparse`); every top-level paragraph or table is converted
+and then dropped, so memory does not grow with the document. Paragraphs
+with the ``CHAPTER`` style start a new chapter, exactly like
+``<p class=CHAPTER>`` in the Word HTML path, and content before the first
+chapter is skipped. Runs become plain text with ``<strong>``/``<em>``/
+``<sup>``/``<sub>``, ``<ruby>`` and ``<br />``; headings become
+``<h1>``-``<h6>``. The result is the same `Chapter` model the HTML parser
+produces after cleaning, so there is no ``mso-`` styling to remove.
+
+Embedded images are not extracted to disk: each chapter lists the media it
+uses in ``chapter.assets`` as ``(href, DocxMedia)``, and the writer reads
+them from the archive while packing (``media/image1.png`` etc.).
+"""
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
+
+from .chapter import Chapter
+
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+WP = "{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}"
+V = "{urn:schemas-microsoft-com:vml}"
+PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+DOCUMENT_PART = "word/document.xml"
+CHAPTER_STYLE = "CHAPTER"
+MEDIA_DIR = "media"
+
+# paragraph children that carry no text; other containers (w:ins, w:smartTag,
+# w:sdt, w:fldSimple, ...) are searched for runs
+_SKIPPED = {W + "pPr", W + "del", W + "moveFrom", W + "bookmarkStart", W + "bookmarkEnd", W + "proofErr",
+            W + "commentRangeStart", W + "commentRangeEnd", W + "sdtPr"}
+
+
+def is_docx(path):
+    return isinstance(path, str) and path.lower().endswith(".docx")
+
+
+class DocxMedia:
+    """An image inside a .docx; `read()` returns its bytes (used as ManifestItem.source)."""
+
+    __slots__ = ("docx_path", "member")
+
+    def __init__(self, docx_path, member):
+        self.docx_path = docx_path
+        self.member = member
+
+    def read(self):
+        with zipfile.ZipFile(self.docx_path) as zf:
+            return zf.read(self.member)
+
+    def __repr__(self):
+        return f"DocxMedia({self.docx_path!r}, {self.member!r})"
+
+
+def _is_latin(text):
+    """True when `text` has no CJK characters (kana, kanji, full-width forms)."""
+    return all(ord(c) < 0x2E80 for c in text)
+
+
+def _toggle(rpr, name):
+    """Return True when the on/off property `name` (e.g. w:b) is set in `rpr`."""
+    el = rpr.find(W + name) if rpr is not None else None
+    return el is not None and el.get(W + "val", "true") not in ("0", "false", "off")
+
+
+def _read_styles(zf):
+    """Return {styleId: lower-case style name}."""
+    try:
+        root = ET.fromstring(zf.read("word/styles.xml"))
+    except KeyError:
+        return {}
+    styles = {}
+    for style in root.iter(W + "style"):
+        name = style.find(W + "name")
+        styles[style.get(W + "styleId")] = (name.get(W + "val") if name is not None else "").lower()
+    return styles
+
+
+def _read_relationships(zf):
+    """Return {rId: (target, external)} of the main document part."""
+    try:
+        root = ET.fromstring(zf.read("word/_rels/document.xml.rels"))
+    except KeyError:
+        return {}
+    rels = {}
+    for rel in root.iter(PKG_REL + "Relationship"):
+        external = rel.get("TargetMode") == "External"
+        target = rel.get("Target", "")
+        if not external:
+            target = posixpath.normpath(posixpath.join("word", target))
+        rels[rel.get("Id")] = (target, external)
+    return rels
+
+
+class _Converter:
+    """Per-document state: styles, relationships and the media of the current chapter."""
+
+    def __init__(self, path, zf):
+        self.path = path
+        self.styles = _read_styles(zf)
+        self.rels = _read_relationships(zf)
+        self.assets = []
+
+    def image(self, rid, alt=""):
+        target = self.rels.get(rid)
+        if target is None or target[1]:
+            return ""
+        href = f"{MEDIA_DIR}/{posixpath.basename(target[0])}"
+        if all(href != h for h, _ in self.assets):
+            self.assets.append((href, DocxMedia(self.path, target[0])))
+        return f"<img src={quoteattr(href)} alt={quoteattr(alt)} />"
+
+    def run(self, r):
+        rpr = r.find(W + "rPr")
+        parts = []
+        for child in r:
+            tag = child.tag
+            if tag == W + "t":
+                parts.append(escape(child.text or ""))
+            elif tag == W + "tab":
+                parts.append("　")
+            elif tag in (W + "br", W + "cr"):
+                # page/column breaks have no place in reflowable text
+                if child.get(W + "type") in (None, "textWrapping"):
+                    parts.append("<br />")
+            elif tag == W + "noBreakHyphen":
+                parts.append("‑")
+            elif tag == W + "ruby":
+                base = "".join(self.run(x) for x in child.iterfind(f"{W}rubyBase/{W}r"))
+                rt = "".join(self.run(x) for x in child.iterfind(f"{W}rt/{W}r"))
+                parts.append(f"<ruby>{base}<rt>{rt}</rt></ruby>")
+            elif tag == W + "drawing":
+                blip = child.find(f".//{A}blip")
+                doc_pr = child.find(f".//{WP}docPr")
+                if blip is not None:
+                    alt = doc_pr.get("descr", "") if doc_pr is not None else ""
+                    parts.append(self.image(blip.get(R + "embed"), alt))
+            elif tag == W + "pict":
+                data = child.find(f".//{V}imagedata")
+                if data is not None:
+                    parts.append(self.image(data.get(R + "id")))
+        html = "".join(parts)
+        if not html:
+            return ""
+        vert = rpr.find(W + "vertAlign") if rpr is not None else None
+        if vert is not None and vert.get(W + "val") in ("superscript", "subscript"):
+            tag = "sup" if vert.get(W + "val") == "superscript" else "sub"
+            html = f"<{tag}>{html}</{tag}>"
+        if _toggle(rpr, "i"):
+            html = f"<em>{html}</em>"
+        if _toggle(rpr, "b"):
+            html = f"<strong>{html}</strong>"
+        return html
+
+    def inline(self, parent):
+        """Return the HTML of the runs below a paragraph (or hyperlink, ins, ...)."""
+        parts = []
+        for child in parent:
+            tag = child.tag
+            if tag == W + "r":
+                parts.append(self.run(child))
+            elif tag == W + "hyperlink":
+                inner = self.inline(child)
+                rel = self.rels.get(child.get(R + "id"))
+                if rel and rel[1]:
+                    parts.append(f"<a href={quoteattr(rel[0])}>{inner}</a>")
+                else:
+                    parts.append(inner)
+            elif tag not in _SKIPPED:
+                parts.append(self.inline(child))
+        return "".join(parts)
+
+    def style_name(self, p):
+        ps = p.find(f"{W}pPr/{W}pStyle")
+        style_id = ps.get(W + "val") if ps is not None else None
+        return style_id, self.styles.get(style_id, "")
+
+    def is_chapter(self, p):
+        style_id, name = self.style_name(p)
+        return CHAPTER_STYLE in (style_id, name.upper())
+
+    def paragraph(self, p):
+        html = self.inline(p)
+        style_id, name = self.style_name(p)
+        if CHAPTER_STYLE in (style_id, name.upper()):
+            return f'<p class="CHAPTER">{html}</p>'
+        if name.startswith("heading ") and name[8:].isdigit() and 1 <= int(name[8:]) <= 6:
+            level = int(name[8:])
+            return f"<h{level}>{html}</h{level}>"
+        # empty paragraphs keep their line, like Word's <o:p>&nbsp;</o:p>
+        return f"<p>{html or chr(0xA0)}</p>"
+
+    def table(self, tbl):
+        rows = []
+        for tr in tbl.iterfind(W + "tr"):
+            cells = []
+            for tc in tr.iterfind(W + "tc"):
+                cells.append("<td>" + "".join(self.block(x) for x in tc if x.tag in (W + "p", W + "tbl")) + "</td>")
+            rows.append("<tr>" + "".join(cells) + "</tr>")
+        return "<table>" + "".join(rows) + "</table>"
+
+    def block(self, el):
+        if el.tag == W + "p":
+            return self.paragraph(el)
+        if el.tag == W + "tbl":
+            return self.table(el)
+        if el.tag == W + "sdt":
+            content = el.find(W + "sdtContent")
+            return "".join(self.block(x) for x in content) if content is not None else ""
+        return ""
+
+    def title(self, p):
+        """Chapter title in the HTML path's form: "EN - 日本語" (see parser.chapter_title).
+
+        Word exports the Latin-script runs of a Japanese document as
+        ``lang=EN-US`` spans; the first such stretch of runs is taken as the
+        English part.
+        """
+        texts = ["".join(t.text or "" for t in r.iter(W + "t")) for r in p.iter(W + "r")]
+        full = "".join(texts).strip()
+        en = ""
+        for text in texts:
+            if text and _is_latin(text):
+                en += text
+            elif en.strip():
+                break
+        en = en.strip()
+        jp = full.replace(en, "", 1).strip() if en else full
+        if en and jp:
+            return f"{en} - {jp}"
+        return en or jp
+
+
+def _top_level_blocks(source):
+    """Yield the children of ``w:body`` one at a time, freeing each after use."""
+    body = None
+    depth = 0
+    for event, el in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 2 and el.tag == W + "body":
+                body = el
+            continue
+        depth -= 1
+        if depth == 2 and body is not None:
+            yield el
+            # drop the converted element / 変換済みの要素は破棄する
+            body.remove(el)
+
+
+def iter_docx_chapters(path, numbers=None):
+    """Yield the chapters of `path` as `Chapter` objects.
+
+    Args:
+        path (str): .docx file.
+        numbers (iterable[int] | None): Only build these chapters (1-based);
+            the others are skipped without being converted.
+    """
+    wanted = set(numbers) if numbers else None
+    with zipfile.ZipFile(path) as zf:
+        conv = _Converter(path, zf)
+        current = None
+        index = 0
+        with zf.open(DOCUMENT_PART) as source:
+            for el in _top_level_blocks(source):
+                if el.tag == W + "p" and conv.is_chapter(el):
+                    if current is not None:
+                        yield current
+                    index += 1
+                    current = None
+                    if wanted is None or index in wanted:
+                        current = Chapter(index, conv.title(el))
+                        # media found from here on belong to this chapter
+                        conv.assets = current.assets
+                        current.fragments.append(conv.paragraph(el))
+                    continue
+                if current is not None:
+                    html = conv.block(el)
+                    if html:
+                        current.fragments.append(html)
+        if current is not None:
+            yield current
+
+
+def docx_chapter_titles(path):
+    """Return [(index, title)] of `path` without converting the chapter bodies."""
+    with zipfile.ZipFile(path) as zf:
+        conv = _Converter(path, zf)
+        titles = []
+        with zf.open(DOCUMENT_PART) as source:
+            for el in _top_level_blocks(source):
+                if el.tag == W + "p" and conv.is_chapter(el):
+                    titles.append((len(titles) + 1, conv.title(el)))
+        return titles
+
+
+def load_docx_chapters(path, numbers=None):
+    """Load the chapters of a .docx (all, or `numbers`), in document order.
+
+    Returns:
+        list[Chapter]: Chapters ready for xhtml.build_chapter_xhtml.
+    """
+    chapters = list(iter_docx_chapters(path, numbers))
+    if not chapters:
+        print("Warning: No chapters (style 'CHAPTER') found.")
+    else:
+        print(f"Found {len(chapters)} chapters.")
+        for chap in chapters:
+            print(chap.index, chap.title)
+    return chapters
@@ -1,10 +1,11 @@
-import chardet
-
-
 def detect_encoding(path):
     """
     Detect encoding of a Word HTML file and return (encoding, raw_bytes).
     """
+    # imported here: chardet is slow to import and not needed for --help etc.
+    # 起動を速くするため必要になったときに import する
+    import chardet
+
     with open(path, "rb") as f:
         raw = f.read()
     detected = chardet.detect(raw)
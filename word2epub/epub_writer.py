@@ -1,14 +1,129 @@
 import os
 import zipfile
 
+from .output import MemoryOutput, OutputBackend, RecordingOutput, ZipOutput
+from .xhtml import metadata_image_hrefs, register_metadata_image
 
-def create_epub(output_path, chapter_files, toc_xhtml, opf_content, style_css, image_pages, meta):
-    with zipfile.ZipFile(output_path, "w") as zf:
-        zinfo = zipfile.ZipInfo("mimetype")
-        zinfo.compress_type = zipfile.ZIP_STORED
-        zf.writestr(zinfo, "application/epub+zip")
 
-        container_xml = '''<?xml version="1.0" encoding="utf-8"?>
+def resolve_metadata_image_path(meta, img_rel):
+    """Resolve an image path relative to the metadata directory when provided.
+
+    With ``meta["_confine_images"]`` (metadata from an untrusted upload, see
+    server.py) absolute paths and paths leading out of the metadata
+    directory raise ValueError instead of packing a file from elsewhere.
+    """
+    meta_dir = meta.get("_meta_dir")
+    if meta_dir:
+        path = os.path.normpath(os.path.join(meta_dir, img_rel))
+    else:
+        path = os.path.normpath(img_rel)
+    if meta.get("_confine_images"):
+        root = os.path.abspath(meta_dir or os.curdir)
+        if os.path.isabs(img_rel) or os.path.commonpath([root, os.path.abspath(path)]) != root:
+            raise ValueError(f"image path outside the metadata directory: {img_rel}")
+    return path
+
+
+def register_metadata_images(meta, registry):
+    """Resolve `images` from metadata once and register the existing files.
+
+    Missing files are skipped with a warning, so the manifest only lists
+    images that `create_epub` will actually pack. Images are registered
+    under the unique hrefs of xhtml.metadata_image_hrefs.
+    """
+    hrefs = metadata_image_hrefs(meta)
+    for img in meta.get("images", []):
+        img_rel = img.get("file")
+        if not img_rel:
+            continue
+        img_path = resolve_metadata_image_path(meta, img_rel)
+        if not os.path.exists(img_path):
+            print("Warning: image file not found, skipping:", img_rel)
+            continue
+        register_metadata_image(registry, img, img_path, hrefs[img_rel])
+    return registry
+
+
+def register_chapter_assets(chapters, registry):
+    """Register the files chapters reference (``chapter["assets"]``, e.g. .docx images)."""
+    for chap in chapters:
+        for href, source in chap.get("assets") or ():
+            registry.register(href, role="image", source=source)
+    return registry
+
+
+def create_epub(output_path, chapter_files, toc_xhtml, opf_content, style_css, image_pages, meta, registry=None,
+                validate=False):
+    """Write the book to `output_path`.
+
+    `output_path` is one of:
+
+    - an .epub path
+    - a writable binary stream (file, socket, HTTP response writer); streams
+      that cannot seek get a streaming ZIP with data descriptors, and the
+      stream is left open
+    - an OutputBackend (see output.py), e.g. a DirectoryOutput for an
+      unpacked preview; backends passed in are left open for the caller
+    - None, in which case the EPUB is returned as bytes
+
+    `chapter_files` is a dict {idx: (filename, xhtml)} or an iterable of such
+    pairs (see xhtml.iter_chapter_xhtml); chapters are written after the
+    package documents, so a lazy iterable renders each chapter while the
+    beginning of the EPUB is already being sent. Image pages planned with
+    xhtml.plan_image_pages are rendered as part of `chapter_files`;
+    `image_pages` takes further ``(filename, xhtml)`` pages written before
+    the chapters.
+
+    With `validate`, the members are first collected and checked (see
+    validate.py); EPUBValidationError is raised before anything is written.
+
+    With ``meta["_profile"] == "size"`` XHTML and CSS are minified on the
+    way out and the ZIP is compressed (see minify.py).
+    """
+    if validate:
+        from .validate import check_book
+
+        book = RecordingOutput()
+        _write_members(book, chapter_files, toc_xhtml, opf_content, style_css, image_pages, meta, registry)
+        check_book(book.members)
+        write = book.replay
+    else:
+        def write(out):
+            _write_members(out, chapter_files, toc_xhtml, opf_content, style_css, image_pages, meta, registry)
+
+    compression = zipfile.ZIP_STORED
+    if meta.get("_profile") == "size":
+        from .minify import SizeProfileOutput
+
+        compression = zipfile.ZIP_DEFLATED
+        write_members = write
+
+        def write(out):
+            with SizeProfileOutput(out) as small:
+                write_members(small)
+            print(small.report())
+
+    if isinstance(output_path, OutputBackend):
+        write(output_path)
+        return None
+
+    # fixed timestamps/permissions when meta["_reproducible"] is set
+    # 再現可能モードでは ZIP のタイムスタンプと権限を固定する
+    reproducible = bool(meta.get("_reproducible"))
+    if output_path is None:
+        out = MemoryOutput(reproducible, compression=compression)
+        write(out)
+        return out.getvalue()
+
+    with ZipOutput(output_path, reproducible, compression=compression) as out:
+        write(out)
+    return None
+
+
+def _write_members(out, chapter_files, toc_xhtml, opf_content, style_css, image_pages, meta, registry):
+    out.add("mimetype", "application/epub+zip")
+
+    container_xml = '''<?xml version="1.0" encoding="utf-8"?>
 <container version="1.0"
            xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
   <rootfiles>
@@ -17,29 +132,44 @@ def create_epub(output_path, chapter_files, toc_xhtml, opf_content, style_css, i
   </rootfiles>
 </container>
 '''
-        zf.writestr("META-INF/container.xml", container_xml)
+    out.add("META-INF/container.xml", container_xml)
+
+    out.add("OEBPS/toc.xhtml", toc_xhtml)
+    out.add("OEBPS/content.opf", opf_content)
+    out.add("OEBPS/style.css", style_css)
 
-        for idx, (filename, xhtml) in chapter_files.items():
-            zf.writestr(f"OEBPS/{filename}", xhtml)
+    for fname, xhtml in image_pages:
+        out.add(f"OEBPS/{fname}", xhtml)
 
-        zf.writestr("OEBPS/toc.xhtml", toc_xhtml)
-        zf.writestr("OEBPS/content.opf", opf_content)
-        zf.writestr("OEBPS/style.css", style_css)
+    # chapters may be rendered lazily while they are written
+    # 章は書き出しながら順に生成してよい
+    items = chapter_files.items() if hasattr(chapter_files, "items") else chapter_files
+    for idx, (filename, xhtml) in items:
+        out.add(f"OEBPS/{filename}", xhtml)
 
-        for fname, xhtml in image_pages:
-            zf.writestr(f"OEBPS/{fname}", xhtml)
+    if registry is not None:
+        # assets were resolved when they were registered
+        # 登録済みアセットはパス解決済みなのでそのまま格納する
+        for item in registry:
+            if isinstance(item.source, str):
+                out.add_file(f"OEBPS/{item.href}", item.source)
+            elif item.source is not None:
+                # e.g. an image read straight from a .docx (docx.DocxMedia)
+                out.add(f"OEBPS/{item.href}", item.source.read())
+        return
 
-        meta_dir = meta.get("_meta_dir")
-        for img in meta.get("images", []):
-            # Resolve image path relative to metadata directory when provided
-            img_rel = img.get("file")
-            if meta_dir:
-                img_path = os.path.normpath(os.path.join(meta_dir, img_rel))
-            else:
-                img_path = os.path.normpath(img_rel)
+    hrefs = metadata_image_hrefs(meta)
+    packed = set()
+    for img in meta.get("images", []):
+        # Resolve image path relative to metadata directory when provided
+        img_rel = img.get("file")
+        if not img_rel or hrefs[img_rel] in packed:
+            continue
+        img_path = resolve_metadata_image_path(meta, img_rel)
 
-            if not os.path.exists(img_path):
-                print("Warning: image file not found, skipping:", img_rel)
-                continue
+        if not os.path.exists(img_path):
+            print("Warning: image file not found, skipping:", img_rel)
+            continue
 
-            zf.write(img_path, f"OEBPS/{os.path.basename(img_path)}")
+        packed.add(hrefs[img_rel])
+        out.add_file(f"OEBPS/{hrefs[img_rel]}", img_path)
@@ -0,0 +1,178 @@
+"""Embedded fonts: find them in stylesheets and subset them to the text of the book.
+
+`font_faces` reads the ``url(...)`` sources of every ``@font-face`` rule in
+a stylesheet, so the fonts can be copied into the book and registered in
+the manifest like any other asset.
+
+`FontSubsetOutput` wraps an output backend while the book is packed: the
+code points of every XHTML member are collected as it passes through (no
+second pass over the documents), font members are held back, and on
+`close()` each font is cut down to the glyphs the book uses (fontTools, with
+all layout features kept so ``vert``/``vrt2`` still work in vertical text).
+Subsets are cached in memory and, with `configure_subset_cache`, on disk
+keyed by (font hash, code point set hash). Without fontTools the fonts are
+packed unchanged.
+"""
+import hashlib
+import html
+import io
+import os
+import posixpath
+import re
+
+from .output import OutputBackend
+
+
+FONT_EXTENSIONS = (".otf", ".ttf", ".woff", ".woff2")
+
+_FONT_FACE = re.compile(r"@font-face\s*\{([^}]*)\}", re.I)
+_URL = re.compile(r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^)\s]*))\s*\)""", re.I)
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_TAG = re.compile(r"<[^>]*>")
+_NON_TEXT = re.compile(r"<(head|script|style)\b.*?</\1\s*>", re.S | re.I)
+
+_subset_dir = None
+_subsets = {}  # (font hash, code point hash) -> subset bytes
+_warned = False
+
+
+def configure_subset_cache(directory):
+    """Keep font subsets in `directory` (None keeps them in memory only)."""
+    global _subset_dir
+    _subset_dir = directory
+
+
+def font_faces(css, css_href):
+    """Return the font files referenced by ``@font-face`` rules of `css`.
+
+    Args:
+        css (str): Stylesheet text.
+        css_href (str): Location of the stylesheet relative to the OPF
+            (e.g. ``style/book.css``); font URLs are resolved against it.
+
+    Returns:
+        list[tuple[str, str]]: (url as written, href relative to the OPF)
+        for local fonts; ``data:`` and remote URLs are skipped.
+    """
+    faces = []
+    for rule in _FONT_FACE.finditer(_CSS_COMMENT.sub("", css)):
+        for m in _URL.finditer(rule.group(1)):
+            url = (m.group(1) or m.group(2) or m.group(3) or "").strip()
+            path = url.split("#", 1)[0].split("?", 1)[0]
+            if not path or ":" in path or not path.lower().endswith(FONT_EXTENSIONS):
+                continue
+            href = posixpath.normpath(posixpath.join(posixpath.dirname(css_href), path))
+            faces.append((url, href))
+    return faces
+
+
+def text_codepoints(xhtml):
+    """Return the code points of the text of an XHTML document (without markup and head)."""
+    text = html.unescape(_TAG.sub("", _NON_TEXT.sub("", xhtml)))
+    # full-width spaces are glyphs of the font / 全角スペースもフォントの字形として残す
+    return {ord(c) for c in text if c not in "\t\n\r\f"} | {0x20}
+
+
+def _codepoint_hash(codepoints):
+    return hashlib.sha256(",".join(map(str, sorted(codepoints))).encode("ascii")).hexdigest()
+
+
+def subset_font(data, codepoints):
+    """Return `data` (font bytes) cut down to `codepoints`, or None without fontTools.
+
+    The font format (OpenType/TrueType, WOFF, WOFF2) is kept.
+    """
+    global _warned
+    try:
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+    except ImportError:
+        if not _warned:
+            print("fontTools is not installed; fonts are embedded without subsetting (pip install fonttools)")
+            _warned = True
+        return None
+
+    key = (hashlib.sha256(data).hexdigest(), _codepoint_hash(codepoints))
+    if key in _subsets:
+        return _subsets[key]
+    cache_path = None
+    if _subset_dir:
+        cache_path = os.path.join(_subset_dir, f"{key[0]}-{key[1]}")
+        try:
+            with open(cache_path, "rb") as f:
+                _subsets[key] = f.read()
+            return _subsets[key]
+        except OSError:
+            pass
+
+    options = subset.Options()
+    # keep vertical alternates, ruby and other layout features / 縦書き用の字形 (vert 等) を残す
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.name_languages = ["*"]
+    options.notdef_outline = True
+    font = TTFont(io.BytesIO(data), lazy=False)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    buf = io.BytesIO()
+    # saved in the font's own flavor (None, "woff" or "woff2")
+    font.save(buf)
+    result = _subsets[key] = buf.getvalue()
+
+    if cache_path:
+        try:
+            os.makedirs(_subset_dir, exist_ok=True)
+            tmp = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(result)
+            os.replace(tmp, cache_path)
+        except OSError:
+            pass
+    return result
+
+
+class FontSubsetOutput(OutputBackend):
+    """Subset font members to the code points of the XHTML members (see module doc).
+
+    `out` is not closed by `close()`, which writes the held-back fonts.
+    `sizes` records (arcname, before, after) for every font.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.codepoints = set()
+        self.sizes = []
+        self._fonts = []
+
+    def add(self, arcname, data):
+        lower = arcname.lower()
+        if lower.endswith(FONT_EXTENSIONS):
+            self._fonts.append((arcname, data.encode("utf-8") if isinstance(data, str) else data))
+            return
+        if lower.endswith((".xhtml", ".html", ".htm")):
+            self.codepoints |= text_codepoints(data.decode("utf-8") if isinstance(data, bytes) else data)
+        self.out.add(arcname, data)
+
+    def add_file(self, arcname, path):
+        if arcname.lower().endswith(FONT_EXTENSIONS + (".xhtml", ".html", ".htm")):
+            with open(path, "rb") as f:
+                self.add(arcname, f.read())
+        else:
+            self.out.add_file(arcname, path)
+
+    def close(self):
+        for arcname, data in self._fonts:
+            small = subset_font(data, self.codepoints) if self.codepoints else None
+            if small is None:
+                small = data
+            self.sizes.append((arcname, len(data), len(small)))
+            self.out.add(arcname, small)
+        self._fonts = []
+
+    def report(self):
+        """Return one line per font: size before and after subsetting."""
+        return "\n".join(
+            f"font {arcname}: {before} -> {after} bytes ({len(self.codepoints)} code points)"
+            for arcname, before, after in self.sizes
+        )
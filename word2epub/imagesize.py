@@ -0,0 +1,202 @@
+"""Image dimensions read from file headers, without decoding the image.
+
+Reading systems can lay out a page before an image is decoded when the
+``<img>`` carries its intrinsic ``width``/``height``, which matters on slow
+e-ink devices. `image_size` reads only the header of the file:
+
+- PNG: the ``IHDR`` chunk
+- GIF: the logical screen size
+- JPEG: the first ``SOFn`` segment (other segments are skipped with
+  ``seek``; an EXIF orientation of 5-8 swaps width and height)
+- WebP: the ``VP8``/``VP8L``/``VP8X`` header
+- SVG: ``width``/``height`` of the root element, else its ``viewBox``
+
+Results are cached per (path, mtime, size), so images used on several
+pages and unchanged images in watch mode are read once.
+"""
+import os
+import re
+import struct
+
+
+SVG_HEAD_BYTES = 4096
+
+_sizes = {}  # (path, mtime_ns, size) -> (width, height) or None
+
+_SVG_ROOT = re.compile(rb"<svg\b[^>]*>", re.S)
+_SVG_ATTRIBUTE = re.compile(rb"""\s([-\w:]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_SVG_LENGTH = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*(px)?\s*$")
+_IMG = re.compile(r"<img\b[^>]*>", re.I)
+_IMG_SRC = re.compile(r"""\ssrc\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.I)
+_IMG_SIZED = re.compile(r"\s(?:width|height)\s*=", re.I)
+# SOF0-SOF15 without DHT (C4), JPG (C8) and DAC (CC)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _png_size(f, head):
+    if head[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", head[16:24])
+
+
+def _gif_size(f, head):
+    return struct.unpack("<HH", head[6:10])
+
+
+def _exif_orientation(data):
+    """Return the EXIF orientation (1-8) of an APP1 payload, or None."""
+    if not data.startswith(b"Exif\0\0") or len(data) < 14:
+        return None
+    tiff = data[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None:
+        return None
+    offset = struct.unpack(endian + "I", tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return None
+    count = struct.unpack(endian + "H", tiff[offset:offset + 2])[0]
+    for i in range(count):
+        entry = tiff[offset + 2 + 12 * i:offset + 14 + 12 * i]
+        if len(entry) < 12:
+            break
+        if struct.unpack(endian + "H", entry[:2])[0] == 0x0112:
+            return struct.unpack(endian + "H", entry[8:10])[0]
+    return None
+
+
+def _jpeg_size(f, head):
+    f.seek(2)
+    orientation = None
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # markers without a length / 長さを持たないマーカー
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack(">xHH", f.read(5))
+            if orientation in (5, 6, 7, 8):
+                # shown rotated by 90 degrees / 90 度回転して表示される
+                width, height = height, width
+            return width, height
+        if marker == 0xE1 and orientation is None:
+            # IFD0 is at the start of the segment; a few hundred bytes are enough
+            data = f.read(min(length - 2, 512))
+            orientation = _exif_orientation(data)
+            f.seek(length - 2 - len(data), 1)
+        else:
+            f.seek(length - 2, 1)
+
+
+def _webp_size(f, head):
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and head[20:21] == b"\x2f":
+        b0, b1, b2, b3 = head[21:25]
+        return 1 + (((b1 & 0x3F) << 8) | b0), 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+    if chunk == b"VP8X":
+        return 1 + int.from_bytes(head[24:27], "little"), 1 + int.from_bytes(head[27:30], "little")
+    return None
+
+
+def _svg_size(f, head):
+    m = _SVG_ROOT.search(head + f.read(SVG_HEAD_BYTES - len(head)))
+    if not m:
+        return None
+    attrs = {
+        name.decode("ascii", "replace"): (double or single).decode("utf-8", "replace")
+        for name, double, single in _SVG_ATTRIBUTE.findall(m.group(0))
+    }
+    width = _SVG_LENGTH.match(attrs.get("width", ""))
+    height = _SVG_LENGTH.match(attrs.get("height", ""))
+    if width and height:
+        return round(float(width.group(1))), round(float(height.group(1)))
+    # percentages and em/cm lengths: use the viewBox / 単位付きの場合は viewBox を使う
+    box = attrs.get("viewBox", "").replace(",", " ").split()
+    if len(box) == 4:
+        try:
+            return round(float(box[2])), round(float(box[3]))
+        except ValueError:
+            return None
+    return None
+
+
+def _probe(path):
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            probe = _png_size
+        elif head[:6] in (b"GIF87a", b"GIF89a"):
+            probe = _gif_size
+        elif head.startswith(b"\xff\xd8"):
+            probe = _jpeg_size
+        elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            probe = _webp_size
+        elif path.lower().endswith(".svg") or b"<svg" in head or head.lstrip().startswith(b"<"):
+            probe = _svg_size
+        else:
+            return None
+        try:
+            size = probe(f, head)
+        except (struct.error, ValueError):
+            return None
+    if not size or size[0] <= 0 or size[1] <= 0:
+        return None
+    return size
+
+
+def image_size(path):
+    """Return the (width, height) in pixels of the image file `path`, or None when unknown."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if key not in _sizes:
+        try:
+            _sizes[key] = _probe(path)
+        except OSError:
+            return None
+    return _sizes[key]
+
+
+def size_attributes(size):
+    """Return `` width="W" height="H"`` for a (width, height) pair, or "" for None."""
+    if not size:
+        return ""
+    return f' width="{size[0]}" height="{size[1]}"'
+
+
+def viewport_meta(size):
+    """Return the viewport ``<meta>`` of a fixed-layout page showing an image of `size`."""
+    return f'<meta name="viewport" content="width={size[0]}, height={size[1]}" />'
+
+
+def add_image_sizes(markup, resolve):
+    """Add ``width``/``height`` to every ``<img>`` in `markup` that has neither.
+
+    `resolve(src)` returns the file path of an image source (or None to
+    leave the tag alone).
+    """
+    def add(m):
+        tag = m.group(0)
+        src = _IMG_SRC.search(tag)
+        if not src or _IMG_SIZED.search(tag):
+            return tag
+        path = resolve(src.group(1) if src.group(1) is not None else src.group(2))
+        attrs = size_attributes(image_size(path)) if path else ""
+        if not attrs:
+            return tag
+        body = tag[:-2 if tag.endswith("/>") else -1].rstrip()
+        return body + attrs + tag[len(body):]
+
+    return _IMG.sub(add, markup)
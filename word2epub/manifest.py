@@ -0,0 +1,149 @@
+"""Asset registry used to build OPF manifests while assets are produced.
+
+Producers register every file they write (chapters, image pages, images,
+stylesheets) together with its real media type, role and properties, so the
+manifest can be emitted directly from the registry without re-scanning the
+output directory or guessing from filenames.
+"""
+import os
+import re
+
+
+MEDIA_TYPES = {
+    ".xhtml": "application/xhtml+xml",
+    ".html": "application/xhtml+xml",
+    ".css": "text/css",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+    ".webp": "image/webp",
+    ".otf": "font/otf",
+    ".ttf": "font/ttf",
+    ".woff": "font/woff",
+    ".woff2": "font/woff2",
+    ".js": "application/javascript",
+    ".ncx": "application/x-dtbncx+xml",
+}
+
+
+def guess_media_type(filename):
+    """Return the EPUB media type for `filename` based on its extension."""
+    ext = os.path.splitext(filename)[1].lower()
+    return MEDIA_TYPES.get(ext, "application/octet-stream")
+
+
+def make_item_id(name, prefix="item"):
+    """Turn a filename into a valid manifest id (XML NCName)."""
+    base = os.path.splitext(os.path.basename(name))[0]
+    item_id = re.sub("[^0-9A-Za-z_-]", "-", base)
+    # ids must not start with a digit, "-" or be empty
+    # id は数字・ハイフン始まりや空文字にできない
+    if not item_id or not (item_id[0].isalpha() or item_id[0] == "_"):
+        item_id = f"{prefix}-{item_id}" if item_id else prefix
+    return item_id
+
+
+class ManifestItem:
+    """One manifest entry: href inside the package plus its attributes.
+
+    `source` is the file the asset was produced from (when it is copied
+    verbatim), so writers can pack it without resolving paths again.
+    """
+
+    __slots__ = ("item_id", "href", "media_type", "properties", "role", "source")
+
+    def __init__(self, item_id, href, media_type, properties=None, role=None, source=None):
+        self.item_id = item_id
+        self.href = href
+        self.media_type = media_type
+        self.properties = properties
+        self.role = role
+        self.source = source
+
+    def to_xml(self):
+        props = f' properties="{self.properties}"' if self.properties else ""
+        return f'<item id="{self.item_id}" href="{self.href}" media-type="{self.media_type}"{props} />'
+
+    def __repr__(self):
+        return f"ManifestItem({self.item_id!r}, {self.href!r}, {self.media_type!r})"
+
+
+class AssetRegistry:
+    """Ordered registry of manifest items keyed by href.
+
+    Registering the same href twice returns the existing item (updating its
+    properties/role when given), which makes producers idempotent when the
+    same image is referenced from several documents.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._ids = set()
+
+    def register(self, href, media_type=None, item_id=None, properties=None, role=None, source=None):
+        """Register an asset and return its ManifestItem.
+
+        Args:
+            href (str): Path relative to the OPF file (e.g. "image/cover.png").
+            media_type (str | None): Media type; guessed from the extension when omitted.
+            item_id (str | None): Preferred manifest id; made unique if already used.
+            properties (str | None): OPF item properties (e.g. "cover-image", "nav").
+            role (str | None): Producer-defined role (e.g. "cover", "style", "chapter").
+            source (str | None): Source file path the asset was copied from.
+
+        Returns:
+            ManifestItem: The registered (or already existing) item.
+        """
+        item = self._items.get(href)
+        if item is not None:
+            if properties:
+                item.properties = properties
+            if role:
+                item.role = role
+            if source:
+                item.source = source
+            return item
+
+        base_id = item_id or make_item_id(href)
+        unique_id = base_id
+        i = 1
+        while unique_id in self._ids:
+            unique_id = f"{base_id}-{i}"
+            i += 1
+        self._ids.add(unique_id)
+
+        item = ManifestItem(
+            unique_id,
+            href,
+            media_type or guess_media_type(href),
+            properties,
+            role,
+            source,
+        )
+        self._items[href] = item
+        return item
+
+    def get(self, href):
+        return self._items.get(href)
+
+    def by_role(self, *roles):
+        """Return items whose role is one of `roles`, in registration order."""
+        return [it for it in self._items.values() if it.role in roles]
+
+    def by_media_type(self, prefix):
+        """Return items whose media type starts with `prefix` (e.g. "image/")."""
+        return [it for it in self._items.values() if it.media_type.startswith(prefix)]
+
+    def manifest_lines(self, indent="    "):
+        return [indent + it.to_xml() for it in self._items.values()]
+
+    def __contains__(self, href):
+        return href in self._items
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __len__(self):
+        return len(self._items)
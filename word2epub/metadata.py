@@ -1,16 +1,19 @@
 import os
-import yaml
 
 
 def load_metadata(metadata_path):
     """Load metadata from a YAML file.
 
     Returns a dict with keys: title, author, ppd (page-progression-direction), images
+    and, when given, identifier.
     """
     if not os.path.isfile(metadata_path):
         print(f"Warning: metadata file '{metadata_path}' not found. Using defaults.")
         return {}
 
+    # imported lazily to keep CLI startup fast / 起動時間短縮のため遅延 import
+    import yaml
+
     with open(metadata_path, "r", encoding="utf-8") as f:
         data = yaml.safe_load(f)
 
@@ -35,4 +38,10 @@ def load_metadata(metadata_path):
     # images
     meta["images"] = data.get("images", [])
 
+    # identifier (optional; generated by build_opf when missing)
+    if isinstance(data.get("identifier"), list) and data["identifier"]:
+        meta["identifier"] = str(data["identifier"][0].get("text", "")).strip()
+    elif isinstance(data.get("identifier"), str):
+        meta["identifier"] = data["identifier"].strip()
+
     return meta
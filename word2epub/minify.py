@@ -0,0 +1,247 @@
+"""Size-optimized output (``--profile size``).
+
+`SizeProfileOutput` wraps another output backend and shrinks members as
+they pass through:
+
+- XHTML: comments removed, runs of spaces/newlines collapsed, whitespace
+  next to block-level tags dropped, empty ``span``/``p``/``div`` elements
+  (without an ``id``) removed. Non-breaking and full-width spaces are text
+  and are kept; documents containing ``<pre>`` only lose their comments.
+- CSS: comments and insignificant whitespace removed, and rules whose
+  selectors need a class no XHTML document uses are dropped.
+
+Stylesheets are held back until `close()`, after every document has been
+seen, so unused rules can be found; only ``mimetype`` has to come first, so
+the member order change is harmless. `sizes` records (arcname, before,
+after) for every rewritten member and `report()` formats it.
+"""
+import re
+
+from .output import OutputBackend
+
+
+PROFILES = ("default", "size")
+
+XHTML_EXTENSIONS = (".xhtml", ".html", ".htm")
+CSS_EXTENSIONS = (".css",)
+
+_BLOCK_TAGS = (
+    "html|head|title|meta|link|style|body|div|p|h[1-6]|ul|ol|li|nav|section|header|footer|aside"
+    "|table|thead|tbody|tr|td|th|blockquote|figure|figcaption|hr"
+)
+# only ASCII whitespace is insignificant; U+00A0 and U+3000 are content
+# NBSP や全角スペースは本文なので残す
+_SPACE = re.compile(r"[ \t\r\n\f]+")
+_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_BLOCK_SPACE = re.compile(r" ?(</?(?:%s)(?:[ /][^>]*)?>) ?" % _BLOCK_TAGS)
+_PROLOG_SPACE = re.compile(r"(\?>|<!DOCTYPE[^>]*>) ")
+_EMPTY_ELEMENT = re.compile(r"<(span|p|div)((?: [^>]*)?)></\1>")
+_CLASS_ATTRIBUTE = re.compile(r"""\sclass=(?:"([^"]*)"|'([^']*)')""")
+
+_CSS_STRING_OR_COMMENT = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/""", re.S)
+_CSS_PUNCTUATION = re.compile(r" ?([{};,>]) ?")
+_SELECTOR_CLASS = re.compile(r"\.(-?[_a-zA-Z][-\w]*)")
+_SELECTOR_ARGUMENTS = re.compile(r"\([^()]*\)|\[[^\]]*\]")
+
+
+def minify_xhtml(text):
+    """Return `text` (an XHTML document) without insignificant whitespace and empty wrappers."""
+    text = _COMMENT.sub("", text)
+    if "<pre" in text:
+        return text
+    text = _SPACE.sub(" ", text)
+    text = _BLOCK_SPACE.sub(r"\1", text)
+    text = _PROLOG_SPACE.sub(r"\1", text)
+
+    def drop_empty(m):
+        # empty elements with an id may be link targets / id 付きはリンク先になり得る
+        return m.group(0) if " id=" in m.group(2) else ""
+
+    while True:
+        shorter = _EMPTY_ELEMENT.sub(drop_empty, text)
+        if shorter == text:
+            return text.strip()
+        text = shorter
+
+
+def used_classes(text):
+    """Return the class names used in an XHTML document."""
+    classes = set()
+    for m in _CLASS_ATTRIBUTE.finditer(text):
+        classes.update((m.group(1) or m.group(2) or "").split())
+    return classes
+
+
+def _css_segments(css):
+    """Split `css` into (is_string, text) segments with comments removed."""
+    segments = []
+    pos = 0
+    for m in _CSS_STRING_OR_COMMENT.finditer(css):
+        segments.append((False, css[pos:m.start()]))
+        if m.group(1):
+            segments.append((True, m.group(1)))
+        else:
+            segments.append((False, " "))
+        pos = m.end()
+    segments.append((False, css[pos:]))
+    return segments
+
+
+def minify_css(css):
+    """Return `css` without comments and insignificant whitespace."""
+    out = []
+    code = []
+    # squeeze the code between strings as one piece, so removed comments
+    # cannot leave stray spaces / コメント除去後のコード部分をまとめて圧縮する
+    for is_string, text in _css_segments(css) + [(True, "")]:
+        if not is_string:
+            code.append(text)
+            continue
+        squeezed = _SPACE.sub(" ", "".join(code))
+        squeezed = _CSS_PUNCTUATION.sub(r"\1", squeezed).replace(": ", ":").replace(";}", "}")
+        out.append(squeezed)
+        out.append(text)
+        code = []
+    return "".join(out).strip()
+
+
+def _blocks(css):
+    """Split minified `css` into top-level (prelude, body) pairs; body is None for statements."""
+    blocks = []
+    pos = 0
+    n = len(css)
+    while pos < n:
+        i = pos
+        quote = None
+        while i < n and (quote or css[i] not in "{;"):
+            if quote:
+                if css[i] == "\\":
+                    i += 1
+                elif css[i] == quote:
+                    quote = None
+            elif css[i] in "\"'":
+                quote = css[i]
+            i += 1
+        if i >= n:
+            blocks.append((css[pos:], None))
+            break
+        if css[i] == ";":
+            blocks.append((css[pos:i + 1], None))
+            pos = i + 1
+            continue
+        depth = 0
+        j = i
+        while j < n:
+            c = css[j]
+            if quote:
+                if c == "\\":
+                    j += 1
+                elif c == quote:
+                    quote = None
+            elif c in "\"'":
+                quote = c
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+            j += 1
+        blocks.append((css[pos:i], css[i + 1:j]))
+        pos = j + 1
+    return blocks
+
+
+def _split_selectors(prelude):
+    selectors = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(prelude):
+        if c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == "," and depth == 0:
+            selectors.append(prelude[start:i])
+            start = i + 1
+    selectors.append(prelude[start:])
+    return selectors
+
+
+def strip_unused_css(css, classes):
+    """Drop selectors of minified `css` that need a class not in `classes`.
+
+    Classes inside ``:not(...)`` or attribute selectors are not considered,
+    and at-rules other than ``@media``/``@supports`` are kept as they are.
+    """
+    out = []
+    for prelude, body in _blocks(css):
+        if body is None:
+            out.append(prelude)
+        elif prelude.startswith(("@media", "@supports")):
+            inner = strip_unused_css(body, classes)
+            if inner:
+                out.append(f"{prelude}{{{inner}}}")
+        elif prelude.startswith("@"):
+            out.append(f"{prelude}{{{body}}}")
+        else:
+            kept = [
+                s for s in _split_selectors(prelude)
+                if set(_SELECTOR_CLASS.findall(_SELECTOR_ARGUMENTS.sub("", s))) <= classes
+            ]
+            if kept:
+                out.append(f"{','.join(kept)}{{{body}}}")
+    return "".join(out)
+
+
+class SizeProfileOutput(OutputBackend):
+    """Minify XHTML and CSS members on their way to `out` (see module doc).
+
+    `out` is not closed by `close()`, which only writes the held-back stylesheets.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.classes = set()
+        self.sizes = []
+        self._stylesheets = []
+
+    def add(self, arcname, data):
+        lower = arcname.lower()
+        if not lower.endswith(XHTML_EXTENSIONS + CSS_EXTENSIONS):
+            self.out.add(arcname, data)
+            return
+        text = data.decode("utf-8") if isinstance(data, bytes) else data
+        if lower.endswith(CSS_EXTENSIONS):
+            self._stylesheets.append((arcname, text))
+            return
+        small = minify_xhtml(text)
+        self.classes |= used_classes(small)
+        self._record(arcname, text, small)
+        self.out.add(arcname, small)
+
+    def add_file(self, arcname, path):
+        if arcname.lower().endswith(XHTML_EXTENSIONS + CSS_EXTENSIONS):
+            with open(path, "rb") as f:
+                self.add(arcname, f.read())
+        else:
+            self.out.add_file(arcname, path)
+
+    def close(self):
+        for arcname, text in self._stylesheets:
+            small = strip_unused_css(minify_css(text), self.classes)
+            self._record(arcname, text, small)
+            self.out.add(arcname, small)
+        self._stylesheets = []
+
+    def _record(self, arcname, before, after):
+        self.sizes.append((arcname, len(before.encode("utf-8")), len(after.encode("utf-8"))))
+
+    def report(self):
+        """Return the per-member sizes and the total as text."""
+        lines = [f"  {arcname}: {before} -> {after} bytes" for arcname, before, after in self.sizes]
+        before = sum(s[1] for s in self.sizes)
+        after = sum(s[2] for s in self.sizes)
+        saved = 100.0 * (before - after) / before if before else 0.0
+        lines.append(f"size profile: {before} -> {after} bytes ({saved:.1f}% smaller)")
+        return "\n".join(lines)
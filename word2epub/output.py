@@ -0,0 +1,240 @@
+"""Output targets for a finished book.
+
+Writers hand every package member to an output backend instead of opening
+a ZIP file themselves:
+
+- ``ZipOutput``: the usual .epub file (the ``mimetype`` member is stored first)
+- ``DirectoryOutput``: an unpacked (exploded) EPUB directory that only
+  rewrites files whose content changed, for preview loops and diffing
+- ``MemoryOutput``: EPUB bytes kept in memory
+- ``RecordingOutput``: the member list itself, for checks before packing
+
+``ZipOutput`` also writes to any writable binary stream (an open file, a
+socket ``makefile`` or an HTTP response writer). Streams that cannot seek are
+written in streaming mode: every member is followed by a ZIP data descriptor,
+so bytes can be sent while later members are still being produced.
+"""
+import io
+import os
+import zipfile
+
+from .reproducible import write_zip_member
+
+
+OUTPUT_FORMATS = ("zip", "dir", "memory")
+
+MIMETYPE = "mimetype"
+
+
+class OutputBackend:
+    """Base class: collects package members by archive name."""
+
+    def add(self, arcname, data):
+        """Add a member from str/bytes."""
+        raise NotImplementedError
+
+    def add_file(self, arcname, path):
+        """Add a member from a file on disk."""
+        with open(path, "rb") as f:
+            self.add(arcname, f.read())
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ZipOutput(OutputBackend):
+    """Write an EPUB (ZIP) to a path or a binary file object.
+
+    Args:
+        target (str | file): Output path or writable binary file object. The
+            object needs ``write`` and ``flush``; ``tell``/``seek`` are optional
+            (without them zipfile writes data descriptors instead of seeking
+            back to fill in sizes). Streams are not closed by ``close()``.
+        reproducible (bool): Fixed timestamps/permissions (see reproducible.py).
+        compression (int): Compression for members other than ``mimetype``.
+    """
+
+    def __init__(self, target, reproducible=False, compression=zipfile.ZIP_DEFLATED):
+        self.target = target
+        self.reproducible = reproducible
+        self.compression = compression
+        self._zf = zipfile.ZipFile(target, "w", compression=compression)
+
+    def add(self, arcname, data):
+        # mimetype must be stored (uncompressed) / mimetype は無圧縮で格納する
+        compress_type = zipfile.ZIP_STORED if arcname == MIMETYPE else self.compression
+        write_zip_member(self._zf, arcname, data, reproducible=self.reproducible, compress_type=compress_type)
+
+    def add_file(self, arcname, path):
+        compress_type = zipfile.ZIP_STORED if arcname == MIMETYPE else self.compression
+        write_zip_member(self._zf, arcname, path=path, reproducible=self.reproducible, compress_type=compress_type)
+
+    def close(self):
+        if self._zf is not None:
+            self._zf.close()
+            self._zf = None
+
+
+class MemoryOutput(ZipOutput):
+    """Build the EPUB in memory; `getvalue()` returns its bytes after close()."""
+
+    def __init__(self, reproducible=False, compression=zipfile.ZIP_DEFLATED):
+        self._buffer = io.BytesIO()
+        super().__init__(self._buffer, reproducible, compression)
+
+    def getvalue(self):
+        self.close()
+        return self._buffer.getvalue()
+
+
+class DirectoryOutput(OutputBackend):
+    """Write an unpacked EPUB into `root`, touching only files whose content changed.
+
+    The members written are listed in `MEMBERS_FILE` inside `root`. On a
+    successful close, members of the previous build that were not written
+    again are removed, so the directory mirrors the book; files the list
+    does not name are never touched. After an error nothing is removed (the
+    list keeps the old and the new members for the next build). A
+    non-empty directory without the list is refused (FileExistsError).
+    `written`, `unchanged` and `removed` count what happened.
+    """
+
+    MEMBERS_FILE = ".word2epub-members"
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._members_path = os.path.join(self.root, self.MEMBERS_FILE)
+        self._previous = self._read_members()
+        self._seen = set()
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def _read_members(self):
+        try:
+            with open(self._members_path, "r", encoding="utf-8") as f:
+                return {line for line in f.read().splitlines() if line}
+        except FileNotFoundError:
+            pass
+        if os.listdir(self.root):
+            # never clean up a folder this backend did not create
+            # 自分で作っていないフォルダは上書き・削除しない
+            raise FileExistsError(
+                f"{self.root} is not empty and was not written by --output-format dir; choose an empty directory"
+            )
+        return set()
+
+    def _path(self, arcname):
+        path = os.path.normpath(os.path.join(self.root, arcname))
+        if os.path.relpath(path, self.root).startswith(".."):
+            raise ValueError(f"member outside output directory: {arcname}")
+        if path == self._members_path:
+            raise ValueError(f"reserved member name: {arcname}")
+        return path
+
+    def add(self, arcname, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        path = self._path(arcname)
+        self._seen.add(os.path.relpath(path, self.root).replace(os.sep, "/"))
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, "rb") as f:
+                    if f.read() == data:
+                        self.unchanged += 1
+                        return
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.written += 1
+
+    def _write_members(self, members):
+        tmp = f"{self._members_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(f"{m}\n" for m in sorted(members)))
+        os.replace(tmp, self._members_path)
+
+    def close(self):
+        # drop members of the previous build that no longer exist
+        # 前回のビルドにあって今回無いファイルだけを削除する
+        for member in sorted(self._previous - self._seen):
+            path = self._path(member)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.removed += 1
+            parent = os.path.dirname(path)
+            while parent != self.root and not os.listdir(parent):
+                os.rmdir(parent)
+                parent = os.path.dirname(parent)
+        self._write_members(self._seen)
+        self._previous = set(self._seen)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # keep the previous preview; remember both builds' members
+            # 失敗時は何も削除せず、両方のメンバーを記録しておく
+            self._write_members(self._previous | self._seen)
+            return False
+        self.close()
+        return False
+
+    def summary(self):
+        return f"{self.written} written, {self.unchanged} unchanged, {self.removed} removed"
+
+
+class RecordingOutput(OutputBackend):
+    """Keep the members in order without packing them, e.g. to validate a book first.
+
+    ``members`` holds ``(arcname, data, path)``: `data` for members added from
+    str/bytes, `path` for members added from a file (not read here).
+    `replay` then writes the same members to another backend.
+    """
+
+    def __init__(self):
+        self.members = []
+
+    def add(self, arcname, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.members.append((arcname, data, None))
+
+    def add_file(self, arcname, path):
+        self.members.append((arcname, None, path))
+
+    def replay(self, out):
+        for arcname, data, path in self.members:
+            if path is not None:
+                out.add_file(arcname, path)
+            else:
+                out.add(arcname, data)
+
+
+def is_stream(target):
+    """Return True for a writable binary file object (not a path, not a backend)."""
+    return hasattr(target, "write") and not isinstance(target, OutputBackend)
+
+
+def open_output(target, output_format="zip", reproducible=False, compression=zipfile.ZIP_DEFLATED):
+    """Return the backend for `output_format` ("zip", "dir" or "memory").
+
+    For "zip", `target` may be a path or a writable binary stream.
+    """
+    if output_format == "zip":
+        return ZipOutput(target, reproducible, compression)
+    if output_format == "dir":
+        return DirectoryOutput(target)
+    if output_format == "memory":
+        return MemoryOutput(reproducible, compression)
+    raise ValueError(f"unknown output format: {output_format}")
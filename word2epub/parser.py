@@ -1,17 +1,59 @@
+import functools
+import os
 import re
 from bs4 import BeautifulSoup, NavigableString, Tag
+from .chapter import Chapter
 from .encoding import detect_encoding
+from .styles import DROP, EM, STRONG, UNWRAP, classify_style, is_spacerun, is_word_style
+from .word_images import collect_images
+
+
+def accepts_chapter(clean):
+    """Let a cleaning pass written for dict chapters also take a `Chapter`.
+
+    The Chapter's fragments are parsed back into nodes, cleaned and
+    serialized again (transition helper; the usual pipeline cleans dict
+    chapters before compacting them).
+    """
+    @functools.wraps(clean)
+    def wrapper(chapter):
+        if not isinstance(chapter, Chapter):
+            return clean(chapter)
+        tmp = {"index": chapter.index, "title": chapter.title, "nodes": chapter.parse_nodes()}
+        clean(tmp)
+        chapter["nodes"] = tmp["nodes"]
+        return chapter
+    return wrapper
+
+
+def chapter_title(node):
+    """Return the title of a `CHAPTER` paragraph: "EN - 日本語", or whichever part exists."""
+    en_span = node.find("span", attrs={"lang": "EN-US"})
+    en_text = en_span.get_text(strip=True) if en_span else ""
+
+    jp_text = node.get_text(strip=True)
+    if en_text:
+        jp_text = jp_text.replace(en_text, "", 1).strip()
+
+    if en_text and jp_text:
+        return f"{en_text} - {jp_text}"
+    return en_text or jp_text
+
 
+def parse_word_html_and_split_chapters(html_content, base_dir=None):
+    """Parse Word HTML and split it into dict chapters at ``class=CHAPTER`` paragraphs.
 
-def parse_word_html_and_split_chapters(html_content):
+    With `base_dir` (the directory of the HTML file), pictures referenced by
+    the chapters are collected into ``chapter["assets"]`` (see word_images.py).
+    """
     soup = BeautifulSoup(html_content, "html.parser")
 
-    # 軽微な属性削除
+    # 軽微な属性削除 (style is classified once per distinct string, see styles.py)
     for tag in soup.find_all(True):
-        attrs = dict(tag.attrs)
-        for attr in list(attrs.keys()):
-            if attr.startswith("mso-") or (
-                attr in ["lang", "class", "style"] and "mso-" in str(attrs[attr])
+        for attr in list(tag.attrs):
+            value = tag.attrs[attr]
+            if attr.startswith("mso-") or (attr == "style" and is_word_style(value)) or (
+                attr in ("lang", "class") and "mso-" in (" ".join(value) if isinstance(value, list) else value)
             ):
                 del tag.attrs[attr]
         tag.name = tag.name.lower()
@@ -32,19 +74,7 @@ def parse_word_html_and_split_chapters(html_content):
             if current_chapter is not None:
                 chapters.append(current_chapter)
 
-            en_span = node.find("span", attrs={"lang": "EN-US"})
-            en_text = en_span.get_text(strip=True) if en_span else ""
-
-            jp_text = node.get_text(strip=True)
-            if en_text:
-                jp_text = jp_text.replace(en_text, "", 1).strip()
-
-            if en_text and jp_text:
-                title_text = f"{en_text} - {jp_text}"
-            else:
-                title_text = en_text or jp_text
-
-            current_chapter = {"index": len(chapters) + 1, "title": title_text, "nodes": [node]}
+            current_chapter = {"index": len(chapters) + 1, "title": chapter_title(node), "nodes": [node]}
         else:
             if current_chapter is not None:
                 current_chapter["nodes"].append(node)
@@ -52,9 +82,19 @@ def parse_word_html_and_split_chapters(html_content):
     if current_chapter is not None:
         chapters.append(current_chapter)
 
+    # Word の .files フォルダにある画像を取り込む
+    if base_dir is not None:
+        stats = collect_images(soup, chapters, base_dir)
+        if stats["images"]:
+            print(
+                f"Images: {stats['images']} referenced, {stats['files']} files packed "
+                f"({stats['duplicates']} duplicates, {stats['originals']} originals, {stats['missing']} missing)"
+            )
+
     return chapters
 
 
+@accepts_chapter
 def remove_orphan_en_spans(chapter):
     cleaned = []
     for node in chapter["nodes"]:
@@ -78,6 +118,7 @@ def remove_orphan_en_spans(chapter):
     return chapter
 
 
+@accepts_chapter
 def clean_word_garbage(chapter):
     cleaned = []
 
@@ -88,7 +129,7 @@ def clean_word_garbage(chapter):
         if (
             node.name == "span"
             and node.get("style")
-            and "mso-spacerun:yes" in node.get("style")
+            and is_spacerun(node.get("style"))
         ):
             continue
 
@@ -101,6 +142,7 @@ def clean_word_garbage(chapter):
     return chapter
 
 
+@accepts_chapter
 def remove_duplicate_title_span(chapter):
     if not chapter["nodes"]:
         return chapter
@@ -139,6 +181,7 @@ def remove_duplicate_title_span(chapter):
     return chapter
 
 
+@accepts_chapter
 def clean_span_and_ruby(chapter):
     cleaned = []
 
@@ -150,21 +193,21 @@ def clean_span_and_ruby(chapter):
             if text.strip() == "":
                 continue
 
-            style = node.get("style", "")
-            if "mso-" in style:
+            kind = classify_style(node.get("style", ""))
+            if kind == DROP:
                 continue
 
-            if any(x in style for x in ["font-size", "font-family"]):
+            if kind == UNWRAP:
                 cleaned.append(NavigableString(text))
                 continue
 
-            if "italic" in style:
+            if kind == EM:
                 em = Tag(name="em")
                 em.string = text
                 cleaned.append(em)
                 continue
 
-            if "bold" in style:
+            if kind == STRONG:
                 strong = Tag(name="strong")
                 strong.string = text
                 cleaned.append(strong)
@@ -202,11 +245,6 @@ def load_html_and_split_chapters(input_html_path):
     print(f"Detected encoding: {encoding}")
     html_content = raw.decode(encoding, errors="ignore")
 
-    chapters = parse_word_html_and_split_chapters(html_content)
-
-    if not chapters:
-        print("Warning: No chapters (class='CHAPTER') found.")
-    else:
-        print(f"Found {len(chapters)} chapters.")
-
-    return chapters
+    # the chapter count is reported by the caller (also for parse-cache hits)
+    # 章数は呼び出し側で一度だけ表示する（解析キャッシュ利用時も含む）
+    return parse_word_html_and_split_chapters(html_content, os.path.dirname(os.path.abspath(input_html_path)))
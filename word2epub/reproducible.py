@@ -0,0 +1,106 @@
+"""Helpers for reproducible (bit-identical) EPUB output.
+
+In reproducible mode the book identifier is derived from the metadata, all
+timestamps come from ``SOURCE_DATE_EPOCH`` and ZIP members get fixed
+timestamps and permissions, so unchanged inputs produce identical files.
+"""
+import json
+import os
+import uuid
+import zipfile
+from datetime import datetime, timezone
+
+
+# 1980-01-01T00:00:00Z, the earliest timestamp a ZIP entry can hold
+# ZIP が表現できる最も古い日時
+DEFAULT_EPOCH = 315532800
+
+# regular file, rw-r--r--
+ZIP_FILE_MODE = 0o100644
+
+# namespace for identifiers derived from metadata (uuid5)
+IDENTIFIER_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://github.com/yosimax/word2epub")
+
+
+def reproducible_requested(flag=False):
+    """Return True when reproducible mode is requested by flag or SOURCE_DATE_EPOCH."""
+    return bool(flag) or "SOURCE_DATE_EPOCH" in os.environ
+
+
+def source_date_epoch():
+    """Return SOURCE_DATE_EPOCH as int, or None when unset or invalid."""
+    value = os.environ.get("SOURCE_DATE_EPOCH")
+    if not value:
+        return None
+    try:
+        return max(int(value), DEFAULT_EPOCH)
+    except ValueError:
+        print(f"Warning: ignoring invalid SOURCE_DATE_EPOCH={value!r}")
+        return None
+
+
+def build_datetime(reproducible=False):
+    """Return the (UTC) build time used for dates written into the book."""
+    if reproducible:
+        epoch = source_date_epoch() or DEFAULT_EPOCH
+        return datetime.fromtimestamp(epoch, timezone.utc)
+    return datetime.now(timezone.utc)
+
+
+def _public_metadata(meta):
+    """Drop private keys (e.g. `_meta_dir`) that depend on the build machine."""
+    if isinstance(meta, dict):
+        return {str(k): _public_metadata(v) for k, v in meta.items() if not str(k).startswith("_")}
+    if isinstance(meta, (list, tuple)):
+        return [_public_metadata(v) for v in meta]
+    return meta
+
+
+def book_identifier(meta, reproducible=False):
+    """Return the dc:identifier for a book.
+
+    An explicit `identifier` in the metadata always wins. In reproducible
+    mode the identifier is a uuid5 over the canonical JSON of the metadata,
+    otherwise a fresh uuid4.
+    """
+    supplied = meta.get("identifier") if isinstance(meta, dict) else None
+    if isinstance(supplied, str) and supplied.strip():
+        return supplied.strip()
+    if reproducible:
+        canonical = json.dumps(_public_metadata(meta), sort_keys=True, ensure_ascii=False, default=str)
+        return f"urn:uuid:{uuid.uuid5(IDENTIFIER_NAMESPACE, canonical)}"
+    return f"urn:uuid:{uuid.uuid4()}"
+
+
+def zip_info(arcname, reproducible=False, compress_type=zipfile.ZIP_STORED):
+    """Return a ZipInfo for `arcname`.
+
+    In reproducible mode the timestamp, permissions and creating system are
+    fixed; otherwise the current local time is used (as ZipFile.writestr does).
+    """
+    if reproducible:
+        date_time = build_datetime(True).timetuple()[:6]
+    else:
+        date_time = datetime.now().timetuple()[:6]
+    zinfo = zipfile.ZipInfo(arcname, date_time=date_time)
+    zinfo.compress_type = compress_type
+    if reproducible:
+        zinfo.create_system = 3
+        zinfo.external_attr = ZIP_FILE_MODE << 16
+    else:
+        zinfo.external_attr = 0o600 << 16
+    return zinfo
+
+
+def write_zip_member(zf, arcname, data=None, path=None, reproducible=False, compress_type=zipfile.ZIP_STORED):
+    """Write `data` (str/bytes) or the file at `path` into `zf` as `arcname`.
+
+    Outside reproducible mode files keep their own mtime (like ZipFile.write).
+    """
+    if path is not None and not reproducible:
+        zf.write(path, arcname, compress_type=compress_type)
+        return
+    if path is not None:
+        with open(path, "rb") as f:
+            data = f.read()
+    zf.writestr(zip_info(arcname, reproducible, compress_type), data)
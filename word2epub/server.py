@@ -0,0 +1,344 @@
+"""Asyncio HTTP conversion server (standard library only).
+
+    python -m word2epub.server --port 8080 --workers 4
+
+Endpoints:
+
+- ``POST /convert``: multipart/form-data with a ``html`` file (Word HTML or .docx) and
+  an optional ``metadata`` file (metadata.yaml); add ``?reproducible=1`` for
+  bit-identical output. Responds with the EPUB (chunked transfer encoding).
+- ``GET /healthz``: liveness, ``{"status": "ok"}``.
+- ``GET /metrics``: queue depth, in-flight jobs, counters and latency (JSON).
+
+The CPU-heavy parse/clean/render stages run in a process pool whose workers
+stay warm between requests. At most ``workers + max_queue`` conversions are
+admitted; further requests get ``503`` instead of piling up.
+
+    curl -F html=@book.htm -F metadata=@metadata.yaml -o book.epub http://127.0.0.1:8080/convert
+"""
+import argparse
+import asyncio
+import contextlib
+import email.parser
+import email.policy
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_MAX_UPLOAD = 64 * 1024 * 1024  # 64 MiB
+CHUNK_SIZE = 64 * 1024
+
+# number of recent conversions kept for latency percentiles
+LATENCY_WINDOW = 1000
+
+EPUB_MEDIA_TYPE = "application/epub+zip"
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    415: "Unsupported Media Type",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def convert_upload(html_bytes, metadata_bytes=None, reproducible=False):
+    """Convert an uploaded Word HTML or .docx (plus optional metadata.yaml) into EPUB bytes.
+
+    Runs in a pool worker. The inputs are written to a private temporary
+    directory because the pipeline reads files (encoding detection, paths
+    relative to metadata.yaml); console output of the pipeline is discarded.
+    """
+    from .convert import convert_word_html
+
+    with tempfile.TemporaryDirectory(prefix="word2epub-") as tmp:
+        # a .docx is a ZIP archive; anything else is taken as Word HTML
+        name = "input.docx" if html_bytes[:4] == b"PK\x03\x04" else "input.htm"
+        html_path = os.path.join(tmp, name)
+        with open(html_path, "wb") as f:
+            f.write(html_bytes)
+        # always pass a metadata file: it keeps find_metadata from picking up
+        # ./metadata.yaml, and an empty mapping gives the default title/author
+        metadata_path = os.path.join(tmp, "metadata.yaml")
+        with open(metadata_path, "wb") as f:
+            f.write(metadata_bytes or b"{}\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            # metadata and pictures may only name files of the upload
+            # アップロード外のファイル（/etc/passwd など）を詰めさせない
+            return convert_word_html(html_path, None, metadata_path, reproducible, confine_images=True)
+
+
+def parse_multipart(content_type, body):
+    """Return {field name: bytes} for a multipart/form-data body."""
+    parser = email.parser.BytesParser(policy=email.policy.HTTP)
+    msg = parser.parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    if not msg.is_multipart():
+        raise HTTPError(400, "malformed multipart body")
+    fields = {}
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if name:
+            fields[name] = part.get_payload(decode=True) or b""
+    return fields
+
+
+class Metrics:
+    """Counters and a sliding window of conversion latencies."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self):
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))], 4) if lat else None
+
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "latency_seconds": {
+                "count": len(lat),
+                "avg": round(sum(lat) / len(lat), 4) if lat else None,
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "max": round(lat[-1], 4) if lat else None,
+            },
+        }
+
+
+class ConversionServer:
+    """HTTP/1.1 server; one request per connection is enough for upload/convert clients."""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_queue=DEFAULT_MAX_QUEUE,
+                 max_upload=DEFAULT_MAX_UPLOAD):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_upload = max_upload
+        self.metrics = Metrics()
+        self._pool = None
+        self._slots = None
+        self._workers_free = None
+        self._server = None
+
+    async def start(self):
+        # forked workers would inherit the sockets of open connections, so a
+        # closed connection would never send FIN; forkserver starts clean ones
+        # 接続中のソケットを子プロセスに継承させないため forkserver を使う
+        context = None
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        # workers busy + requests waiting for a worker
+        self._slots = asyncio.Semaphore(self.workers + self.max_queue)
+        self._workers_free = asyncio.Semaphore(self.workers)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port 0 picks a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                method, target, headers = await self._read_head(reader)
+                await self._dispatch(method, target, headers, reader, writer)
+            except HTTPError as e:
+                await self._send_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _read_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(400, "request header too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    async def _dispatch(self, method, target, headers, reader, writer):
+        url = urlsplit(target)
+        if url.path == "/healthz":
+            await self._send_json(writer, 200, {"status": "ok"})
+        elif url.path == "/metrics":
+            await self._send_json(writer, 200, self.metrics.snapshot())
+        elif url.path == "/convert":
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            await self._convert(parse_qs(url.query), headers, reader, writer)
+        else:
+            raise HTTPError(404, f"no such endpoint: {url.path}")
+
+    async def _convert(self, query, headers, reader, writer):
+        content_type = headers.get("content-type", "")
+        if not content_type.startswith("multipart/form-data"):
+            raise HTTPError(415, "expected multipart/form-data with 'html' and optional 'metadata'")
+        if "content-length" not in headers:
+            raise HTTPError(411, "Content-Length required")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HTTPError(400, "invalid Content-Length")
+        if length < 0:
+            raise HTTPError(400, "invalid Content-Length")
+        if length > self.max_upload:
+            raise HTTPError(413, f"upload larger than {self.max_upload} bytes")
+        if self._slots.locked():
+            self.metrics.rejected += 1
+            raise HTTPError(503, "conversion queue is full")
+
+        async with self._slots:
+            try:
+                body = await reader.readexactly(length)
+            except asyncio.IncompleteReadError:
+                raise HTTPError(400, "request body shorter than Content-Length")
+            # parsing a large upload would stall every other connection
+            # 大きなアップロードの解析でイベントループを止めないようスレッドで行う
+            loop = asyncio.get_running_loop()
+            fields = await loop.run_in_executor(None, parse_multipart, content_type, body)
+            if not fields.get("html"):
+                raise HTTPError(400, "missing 'html' field")
+            reproducible = query.get("reproducible", ["0"])[0] not in ("0", "", "false")
+
+            start = time.perf_counter()
+            self.metrics.queued += 1
+            try:
+                await self._workers_free.acquire()
+            finally:
+                self.metrics.queued -= 1
+            self.metrics.in_flight += 1
+            try:
+                data = await loop.run_in_executor(
+                    self._pool, convert_upload, fields["html"], fields.get("metadata"), reproducible
+                )
+            except BrokenProcessPool as e:
+                self.metrics.failed += 1
+                raise HTTPError(500, f"conversion worker died: {e}") from e
+            except Exception as e:
+                self.metrics.failed += 1
+                raise HTTPError(422, f"conversion failed: {e}") from e
+            finally:
+                self.metrics.in_flight -= 1
+                self._workers_free.release()
+            self.metrics.completed += 1
+            self.metrics.latencies.append(time.perf_counter() - start)
+
+        await self._send_stream(writer, 200, EPUB_MEDIA_TYPE, data)
+
+    async def _send_head(self, writer, status, headers):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        lines += [f"{k}: {v}" for k, v in headers]
+        lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send_json(self, writer, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self._send_head(writer, status, [
+            ("Content-Type", "application/json; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+        ])
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_stream(self, writer, status, media_type, data):
+        """Send `data` with chunked transfer encoding, honouring back-pressure."""
+        await self._send_head(writer, status, [
+            ("Content-Type", media_type),
+            ("Content-Disposition", 'attachment; filename="book.epub"'),
+            ("Transfer-Encoding", "chunked"),
+        ])
+        view = memoryview(data)
+        for offset in range(0, len(view), CHUNK_SIZE):
+            chunk = view[offset:offset + CHUNK_SIZE]
+            writer.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None, max_queue=DEFAULT_MAX_QUEUE,
+                max_upload=DEFAULT_MAX_UPLOAD):
+    server = await ConversionServer(host, port, workers, max_queue, max_upload).start()
+    print(f"word2epub server listening on http://{server.host}:{server.port} "
+          f"({server.workers} workers, queue {server.max_queue})")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m word2epub.server", description="HTTP Word HTML -> EPUB conversion server.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="conversion processes (default: CPU count)")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="requests allowed to wait for a worker before answering 503")
+    parser.add_argument("--max-upload", type=int, default=DEFAULT_MAX_UPLOAD, help="upload limit in bytes")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_queue, args.max_upload))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
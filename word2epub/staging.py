@@ -0,0 +1,168 @@
+"""Staging files for packing without copying their bytes when possible.
+
+A staged book is zipped and deleted right away, so the staging directory
+only needs to make each file readable under its package path. For each
+file the cheapest available strategy is used:
+
+- ``hardlink``: same filesystem (no data is copied)
+- ``reflink``: copy-on-write clone (``FICLONE``; Btrfs, XFS, ...)
+- ``symlink``: for read-only assets on another filesystem; the packer then
+  reads them straight from their source
+- ``copy_file_range`` / ``sendfile``: in-kernel copies
+- ``copy``: plain user-space copy
+
+Staged files may share their inode with (or be a link to) the source, so
+code that changes a staged file must replace it instead of writing into it
+(call `break_link` first). The strategies used are counted in a
+`StagingStats`; `take_stats` returns the counts since the last call.
+"""
+import os
+import shutil
+
+
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+SYMLINK = "symlink"
+COPY_FILE_RANGE = "copy_file_range"
+SENDFILE = "sendfile"
+COPY = "copy"
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+_CHUNK = 1 << 30
+
+
+class StagingStats:
+    """Files and bytes staged per strategy; bytes are counted only for real copies."""
+
+    def __init__(self):
+        self.files = {}
+        self.copied_bytes = 0
+
+    def add(self, strategy, size):
+        self.files[strategy] = self.files.get(strategy, 0) + 1
+        if strategy in (COPY_FILE_RANGE, SENDFILE, COPY):
+            self.copied_bytes += size
+
+    def summary(self):
+        parts = ", ".join(f"{n} {strategy}" for strategy, n in sorted(self.files.items()))
+        return f"staged {sum(self.files.values())} files ({parts or 'none'}), {self.copied_bytes} bytes copied"
+
+
+_stats = StagingStats()
+
+
+def take_stats():
+    """Return the StagingStats collected so far and start new ones."""
+    global _stats
+    stats, _stats = _stats, StagingStats()
+    return stats
+
+
+def break_link(path):
+    """Remove `path`, so the next write creates a new file instead of writing into a shared inode."""
+    # a staged file may be a link to a source; never write through it
+    # 既存のファイルはソースへのリンクの可能性があるので、上書きせず削除する
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+
+
+def _kernel_copy(src, dst):
+    """Copy with copy_file_range or sendfile; return the strategy, or None when neither works."""
+    size = os.path.getsize(src)
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        for strategy, copy in ((COPY_FILE_RANGE, getattr(os, "copy_file_range", None)),
+                               (SENDFILE, getattr(os, "sendfile", None))):
+            if copy is None:
+                continue
+            offset = 0
+            try:
+                while offset < size:
+                    if strategy == COPY_FILE_RANGE:
+                        n = copy(fsrc.fileno(), fdst.fileno(), min(_CHUNK, size - offset), offset, offset)
+                    else:
+                        n = copy(fdst.fileno(), fsrc.fileno(), offset, min(_CHUNK, size - offset))
+                    if n == 0:
+                        break
+                    offset += n
+            except OSError:
+                if offset:
+                    raise
+                continue
+            if offset == size:
+                return strategy
+            fdst.seek(0)
+            fdst.truncate()
+    return None
+
+
+def stage_file(src, dst, reference=False, stats=None):
+    """Make `src` available as `dst` and return the strategy used (see module doc).
+
+    Args:
+        src (str): Source file.
+        dst (str): Path in the staging directory (replaced if it exists).
+        reference (bool): `src` is a read-only input that outlives the
+            build, so a symlink to it is acceptable.
+        stats (StagingStats | None): Counts the strategy (default: the
+            counts returned by `take_stats`).
+    """
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    break_link(dst)
+    size = os.path.getsize(src)
+    strategy = None
+    try:
+        os.link(src, dst)
+        strategy = HARDLINK
+    except OSError:
+        pass
+    if strategy is None:
+        try:
+            _reflink(src, dst)
+            strategy = REFLINK
+        except (OSError, ImportError):
+            pass
+    if strategy is None and reference:
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            strategy = SYMLINK
+        except (OSError, NotImplementedError):
+            pass
+    if strategy is None:
+        try:
+            strategy = _kernel_copy(src, dst)
+        except OSError:
+            strategy = None
+        if strategy is None:
+            shutil.copyfile(src, dst)
+            strategy = COPY
+        shutil.copystat(src, dst)
+    (stats or _stats).add(strategy, size)
+    return strategy
+
+
+def stage_tree(src_dir, dst_dir, stats=None):
+    """Stage every file below `src_dir` into `dst_dir` (like copytree, see stage_file)."""
+    for base, dirs, files in os.walk(src_dir):
+        dirs.sort()
+        target = os.path.join(dst_dir, os.path.relpath(base, src_dir))
+        os.makedirs(target, exist_ok=True)
+        for fn in sorted(files):
+            stage_file(os.path.join(base, fn), os.path.join(target, fn), stats=stats)
+    return stats
+
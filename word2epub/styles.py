@@ -0,0 +1,163 @@
+"""Classification of Word's inline ``style`` attributes.
+
+Word HTML repeats a small set of identical style strings thousands of
+times, so each distinct string is parsed into CSS declarations once and its
+classification is kept in a bounded LRU cache shared by all cleaning passes
+(the parser's attribute stripper, `clean_word_garbage` and
+`clean_span_and_ruby`).
+
+A span is classified as one of:
+
+- ``DROP``: Word-only styling (``mso-*`` properties or values)
+- ``UNWRAP``: font size/family only; the text is kept without the span
+- ``EM`` / ``STRONG``: italic / bold text
+- ``KEEP``: nothing style-specific; the span is handled by its other attributes
+"""
+import functools
+import re
+
+
+DROP = "drop"
+UNWRAP = "unwrap"
+EM = "em"
+STRONG = "strong"
+KEEP = "keep"
+
+STYLE_CACHE_SIZE = 1024
+
+_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+# property: value, where the value may contain quoted strings (font names)
+_DECLARATION = re.compile(r"""([-\w]+)\s*:\s*((?:"[^"]*"|'[^']*'|[^;"'])*)""")
+
+
+@functools.lru_cache(maxsize=STYLE_CACHE_SIZE)
+def parse_style(style):
+    """Return the declarations of `style` as a tuple of (property, value).
+
+    Property names are lower-cased; values are stripped of surrounding space.
+    """
+    if not style:
+        return ()
+    style = _COMMENT.sub("", style)
+    return tuple((prop.lower(), value.strip()) for prop, value in _DECLARATION.findall(style))
+
+
+def _is_bold(value):
+    value = value.lower()
+    if any(word in ("bold", "bolder") for word in value.split()):
+        return True
+    return value.isdigit() and int(value) >= 600
+
+
+@functools.lru_cache(maxsize=STYLE_CACHE_SIZE)
+def is_word_style(style):
+    """True when `style` carries Word-only (``mso-``) properties or values."""
+    return any(prop.startswith("mso-") or "mso-" in value for prop, value in parse_style(style))
+
+
+@functools.lru_cache(maxsize=STYLE_CACHE_SIZE)
+def is_spacerun(style):
+    """True for Word's ``mso-spacerun:yes`` spans (runs of spaces)."""
+    return any(prop == "mso-spacerun" and value.lower() == "yes" for prop, value in parse_style(style))
+
+
+@functools.lru_cache(maxsize=STYLE_CACHE_SIZE)
+def classify_style(style):
+    """Return DROP, UNWRAP, EM, STRONG or KEEP for a span's `style` (see module doc)."""
+    declarations = parse_style(style)
+    if is_word_style(style):
+        return DROP
+    props = {prop for prop, _ in declarations}
+    if "font-size" in props or "font-family" in props:
+        return UNWRAP
+    for prop, value in declarations:
+        if prop in ("font-style", "font") and "italic" in value.lower():
+            return EM
+    for prop, value in declarations:
+        if prop in ("font-weight", "font") and _is_bold(value):
+            return STRONG
+    return KEEP
+
+
+def style_cache_info():
+    """Return the lru_cache statistics of the classifier (hits/misses per function)."""
+    return {f.__name__: f.cache_info() for f in (parse_style, is_word_style, is_spacerun, classify_style)}
+
+
+# Inline styles -> generated classes / インライン style をクラスへ置き換える
+
+STYLE_CLASS_PREFIX = "ws"
+
+# start tags with a style attribute, as serialized by BeautifulSoup (double-quoted values)
+_STYLED_TAG = re.compile(r"""<([A-Za-z][^\s/>]*)((?:\s+[^\s=/>]+(?:="[^"]*")?)*?\s+style="[^"]*"(?:\s+[^\s=/>]+(?:="[^"]*")?)*)\s*(/?)>""")
+_ATTRIBUTE = re.compile(r"""\s+([^\s=/>]+)(?:="([^"]*)")?""")
+
+
+def normalize_style(style):
+    """Return `style` as ``prop:value;prop:value`` (the key shared by identical styles)."""
+    return ";".join(f"{prop}:{value}" for prop, value in parse_style(style))
+
+
+def hoist_inline_styles(chapters, prefix=STYLE_CLASS_PREFIX):
+    """Replace inline ``style`` attributes with generated classes.
+
+    Every distinct (normalized) style used in `chapters` gets a class
+    ``ws1``, ``ws2``, ... in order of first use; elements keep their other
+    attributes and an existing ``class`` is extended.
+
+    Returns:
+        tuple: (chapters, css, stats) with new `Chapter` objects, the CSS
+        rules to append to the stylesheet and ``{"classes", "elements",
+        "bytes_saved"}`` (chapter bytes saved minus the added CSS).
+    """
+    from html import unescape
+
+    from .chapter import Chapter
+
+    classes = {}  # normalized style -> (class name, declarations)
+    counts = {"elements": 0, "before": 0, "after": 0}
+
+    def replace(m):
+        name, attrs, slash = m.groups()
+        attributes = _ATTRIBUTE.findall(attrs)
+        style = unescape(next((v for a, v in attributes if a == "style"), ""))
+        key = normalize_style(style)
+        class_name = None
+        if key:
+            if key not in classes:
+                classes[key] = (f"{prefix}{len(classes) + 1}", parse_style(style))
+            class_name = classes[key][0]
+            counts["elements"] += 1
+        has_class = any(a == "class" for a, _ in attributes)
+        parts = []
+        for attr, value in attributes:
+            if attr == "style":
+                # the class takes the place of the style attribute / style の位置に class を置く
+                if class_name and not has_class:
+                    parts.append(f' class="{class_name}"')
+                continue
+            if attr == "class" and class_name:
+                value = f"{value} {class_name}".strip()
+            parts.append(f' {attr}="{value}"')
+        return f"<{name}{''.join(parts)}{' /' if slash else ''}>"
+
+    result = []
+    for chap in chapters:
+        fragments = []
+        for fragment in (str(node) for node in chap["nodes"]):
+            counts["before"] += len(fragment.encode("utf-8"))
+            fragment = _STYLED_TAG.sub(replace, fragment)
+            counts["after"] += len(fragment.encode("utf-8"))
+            fragments.append(fragment)
+        result.append(Chapter(chap["index"], chap["title"], fragments, chap.get("assets") or ()))
+
+    css = "".join(
+        f".{name} {{ {' '.join(f'{prop}: {value};' for prop, value in declarations)} }}\n"
+        for name, declarations in classes.values()
+    )
+    stats = {
+        "classes": len(classes),
+        "elements": counts["elements"],
+        "bytes_saved": counts["before"] - counts["after"] - len(css.encode("utf-8")),
+    }
+    return result, css, stats
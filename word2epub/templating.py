@@ -0,0 +1,94 @@
+"""Rendering of metadata templates such as ``colophon.yaml``.
+
+One Jinja2 environment is shared by the whole process. Templates are
+registered under the sha256 of their source, so books that use the same
+``colophon.yaml`` share one compiled template (the environment's template
+cache), and with `configure_bytecode_cache` the compiled code is also kept
+on disk for the next process. Without Jinja2 (or when a template does not
+compile) ``{{ key }}`` placeholders are substituted in a single regex pass.
+"""
+import hashlib
+import os
+import re
+
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+_environment = None
+_sources = {}  # sha256 -> template source
+_broken = set()  # sha256 of sources Jinja2 could not compile
+_bytecode_dir = None
+
+
+def configure_bytecode_cache(directory):
+    """Keep compiled templates in `directory` (None disables the disk cache)."""
+    global _bytecode_dir
+    _bytecode_dir = directory
+    if _environment is not None:
+        _environment.bytecode_cache = _make_bytecode_cache()
+
+
+def _make_bytecode_cache():
+    if not _bytecode_dir:
+        return None
+    from jinja2 import FileSystemBytecodeCache
+
+    try:
+        os.makedirs(_bytecode_dir, exist_ok=True)
+    except OSError:
+        return None
+    return FileSystemBytecodeCache(_bytecode_dir)
+
+
+def _jinja_environment():
+    """Return the shared Environment, or None when Jinja2 is not installed."""
+    global _environment
+    if _environment is None:
+        try:
+            from jinja2 import BaseLoader, Environment, TemplateNotFound
+        except ImportError:
+            return None
+
+        class _SourceLoader(BaseLoader):
+            # template names are the sha256 of their source, so they never go stale
+            def get_source(self, environment, name):
+                if name not in _sources:
+                    raise TemplateNotFound(name)
+                return _sources[name], None, lambda: True
+
+        _environment = Environment(loader=_SourceLoader(), bytecode_cache=_make_bytecode_cache(), auto_reload=False)
+    return _environment
+
+
+def render_placeholders(raw, context):
+    """Replace ``{{ key }}`` with ``context[key]`` in one pass; unknown keys are kept."""
+
+    def replace(m):
+        key = m.group(1)
+        return str(context[key]) if key in context else m.group(0)
+
+    return _PLACEHOLDER.sub(replace, raw)
+
+
+def render_template(raw, context):
+    """Render template source `raw` with `context` (Jinja2 when available).
+
+    Returns:
+        str: The rendered text.
+    """
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    env = _jinja_environment()
+    if env is not None and digest not in _broken:
+        _sources.setdefault(digest, raw)
+        try:
+            template = env.get_template(digest)
+        except Exception:
+            # do not try to compile the same broken source again
+            # コンパイルできないテンプレートは次回から置換のみで処理する
+            _broken.add(digest)
+        else:
+            try:
+                return template.render(context)
+            except Exception:
+                pass
+    return render_placeholders(raw, context)
@@ -0,0 +1,328 @@
+"""Fast structural checks of a finished book, run in-process before packing.
+
+This is not a replacement for epubcheck; it catches the mistakes our
+writers can actually make, cheaply enough to run on every build:
+
+- ``mimetype`` missing, not first, or with the wrong content
+- ``META-INF/container.xml`` not pointing at an existing package document
+- XHTML/OPF/NCX documents that are not well-formed XML (e.g. a raw ``&`` or
+  ``<`` in a title)
+- duplicate manifest ids or hrefs, manifest items without a file, spine
+  itemrefs pointing at unknown ids, no ``nav`` document
+- links, images and stylesheets referencing files missing from the book,
+  and files that are packed but not listed in the manifest
+
+The checks work on the member list of a `RecordingOutput` (or an .epub
+file, an unpacked directory). Content documents are checked independently,
+in worker processes when `jobs` > 1.
+"""
+import io
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+from .output import MIMETYPE, RecordingOutput
+
+
+ERROR = "ERROR"
+WARNING = "WARNING"
+
+NS_OPF = "http://www.idpf.org/2007/opf"
+NS_DC = "http://purl.org/dc/elements/1.1/"
+NS_CONTAINER = "urn:oasis:names:tc:opendocument:xmlns:container"
+NS_XLINK = "http://www.w3.org/1999/xlink"
+
+CONTAINER_PATH = "META-INF/container.xml"
+XML_EXTENSIONS = (".xhtml", ".html", ".htm", ".opf", ".ncx", ".xml", ".svg")
+CONTENT_MEDIA_TYPES = ("application/xhtml+xml", "image/svg+xml")
+
+# attributes whose value is a reference to another resource
+_REF_ATTRIBUTES = ("src", "href", "{%s}href" % NS_XLINK, "poster", "data")
+_SCHEME = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:")
+
+
+class Issue:
+    """One finding: severity (ERROR/WARNING), member path and message."""
+
+    __slots__ = ("severity", "path", "message")
+
+    def __init__(self, severity, path, message):
+        self.severity = severity
+        self.path = path
+        self.message = message
+
+    def __str__(self):
+        return f"{self.severity}: {self.path}: {self.message}"
+
+    def __repr__(self):
+        return f"Issue({self.severity!r}, {self.path!r}, {self.message!r})"
+
+
+class EPUBValidationError(ValueError):
+    """Raised when a book has errors; `issues` lists every finding."""
+
+    def __init__(self, issues):
+        # `issues` is the only argument, so the error pickles back from a
+        # volume worker / 引数を issues だけにして子プロセスから pickle で返せるようにする
+        super().__init__(issues)
+        self.issues = issues
+
+    def __str__(self):
+        errors = [i for i in self.issues if i.severity == ERROR]
+        return f"{len(errors)} validation error(s):\n" + "\n".join(str(i) for i in errors)
+
+
+def _read(member):
+    arcname, data, path = member
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    return data
+
+
+def _parse_xml(data):
+    """Parse `data` and return (root, None), or (None, message) when it is not well-formed."""
+    try:
+        return ET.fromstring(data), None
+    except ET.ParseError as e:
+        return None, f"XML parse error: {e}"
+
+
+def _resolve(base_dir, ref):
+    """Resolve a relative reference to a member name; None for external references."""
+    if not ref or ref.startswith("#") or _SCHEME.match(ref):
+        return None
+    path = unquote(urlsplit(ref).path)
+    if not path:
+        return None
+    return posixpath.normpath(posixpath.join(base_dir, path))
+
+
+def check_document(arcname, data, names, manifest_hrefs):
+    """Check one content document: well-formedness and the files it references.
+
+    Returns:
+        list[tuple]: (severity, path, message) tuples (picklable for worker processes).
+    """
+    root, error = _parse_xml(data)
+    if root is None:
+        return [(ERROR, arcname, error)]
+    issues = []
+    base_dir = posixpath.dirname(arcname)
+    for el in root.iter():
+        for attr in _REF_ATTRIBUTES:
+            target = _resolve(base_dir, el.get(attr))
+            if target is None:
+                continue
+            if target not in names:
+                issues.append((ERROR, arcname, f"references missing file {el.get(attr)!r}"))
+            elif target not in manifest_hrefs:
+                issues.append((WARNING, arcname, f"references {el.get(attr)!r}, which is not in the manifest"))
+    return issues
+
+
+def _check_documents(batch):
+    return [issue for args in batch for issue in check_document(*args)]
+
+
+def _check_package(opf_name, root, names):
+    """Check the OPF; return (issues, {member name: media type}) for its manifest."""
+    issues = []
+    base_dir = posixpath.dirname(opf_name)
+
+    def add(severity, message):
+        issues.append(Issue(severity, opf_name, message))
+
+    metadata = root.find(f"{{{NS_OPF}}}metadata")
+    unique_id = root.get("unique-identifier")
+    identifiers = metadata.findall(f"{{{NS_DC}}}identifier") if metadata is not None else []
+    if not identifiers:
+        add(ERROR, "no dc:identifier")
+    elif unique_id and not any(el.get("id") == unique_id for el in identifiers):
+        add(ERROR, f"unique-identifier {unique_id!r} does not match any dc:identifier")
+    for tag in ("title", "language"):
+        el = metadata.find(f"{{{NS_DC}}}{tag}") if metadata is not None else None
+        if el is None or not (el.text or "").strip():
+            add(ERROR, f"missing or empty dc:{tag}")
+
+    ids = set()
+    media_types = {}
+    has_nav = False
+    for item in root.iterfind(f"{{{NS_OPF}}}manifest/{{{NS_OPF}}}item"):
+        item_id, href = item.get("id"), item.get("href")
+        if item_id in ids:
+            add(ERROR, f"duplicate manifest id {item_id!r}")
+        ids.add(item_id)
+        if not href:
+            add(ERROR, f"manifest item {item_id!r} has no href")
+            continue
+        target = _resolve(base_dir, href)
+        if target is None:
+            continue
+        if target in media_types:
+            add(ERROR, f"duplicate manifest href {href!r}")
+        media_types[target] = item.get("media-type") or ""
+        if target not in names:
+            add(ERROR, f"manifest item {item_id!r} refers to missing file {href!r}")
+        if "nav" in (item.get("properties") or "").split():
+            has_nav = True
+    if not has_nav:
+        add(ERROR, "no manifest item with the 'nav' property")
+
+    spine = root.find(f"{{{NS_OPF}}}spine")
+    idrefs = [ref.get("idref") for ref in spine.iterfind(f"{{{NS_OPF}}}itemref")] if spine is not None else []
+    if not idrefs:
+        add(ERROR, "spine is empty")
+    seen = set()
+    for idref in idrefs:
+        if idref not in ids:
+            add(ERROR, f"spine itemref {idref!r} does not match any manifest id")
+        elif idref in seen:
+            add(WARNING, f"spine itemref {idref!r} is listed more than once")
+        seen.add(idref)
+    return issues, media_types
+
+
+def validate_members(members, jobs=None):
+    """Validate a book given as ordered ``(arcname, data, path)`` members.
+
+    Args:
+        members (list[tuple]): As in `RecordingOutput.members`; `data` is
+            bytes/str or None when the member is read from `path`.
+        jobs (int | None): Worker processes for the content documents.
+
+    Returns:
+        list[Issue]: Findings, errors and warnings in member order.
+    """
+    members = [(a, d.encode("utf-8") if isinstance(d, str) else d, p) for a, d, p in members]
+    by_name = {m[0]: m for m in members}
+    names = set(by_name)
+    issues = []
+
+    if not members or members[0][0] != MIMETYPE:
+        issues.append(Issue(ERROR, MIMETYPE, "must be the first member"))
+    if MIMETYPE in by_name and _read(by_name[MIMETYPE]) != b"application/epub+zip":
+        issues.append(Issue(ERROR, MIMETYPE, "content must be 'application/epub+zip'"))
+
+    if CONTAINER_PATH not in by_name:
+        issues.append(Issue(ERROR, CONTAINER_PATH, "missing"))
+        return issues
+    container, error = _parse_xml(_read(by_name[CONTAINER_PATH]))
+    if container is None:
+        issues.append(Issue(ERROR, CONTAINER_PATH, error))
+        return issues
+    rootfile = container.find(f".//{{{NS_CONTAINER}}}rootfile")
+    opf_name = rootfile.get("full-path") if rootfile is not None else None
+    if opf_name not in by_name:
+        issues.append(Issue(ERROR, CONTAINER_PATH, f"package document {opf_name!r} not found"))
+        return issues
+    package, error = _parse_xml(_read(by_name[opf_name]))
+    if package is None:
+        issues.append(Issue(ERROR, opf_name, error))
+        return issues
+    package_issues, media_types = _check_package(opf_name, package, names)
+    issues.extend(package_issues)
+
+    for arcname in by_name:
+        if arcname in (MIMETYPE, opf_name) or arcname.startswith("META-INF/") or arcname in media_types:
+            continue
+        issues.append(Issue(WARNING, arcname, "packed but not listed in the manifest"))
+
+    # content documents are independent of each other / 各文書は独立に検査できる
+    manifest_hrefs = frozenset(media_types)
+    documents = [
+        (arcname, _read(member), names, manifest_hrefs)
+        for arcname, member in by_name.items()
+        if media_types.get(arcname) in CONTENT_MEDIA_TYPES
+        or (arcname not in media_types and arcname.lower().endswith(XML_EXTENSIONS) and arcname != opf_name)
+    ]
+    if jobs and jobs > 1 and len(documents) > 1:
+        batches = [documents[i::jobs] for i in range(min(jobs, len(documents)))]
+        with ProcessPoolExecutor(max_workers=len(batches)) as pool:
+            found = [issue for result in pool.map(_check_documents, batches) for issue in result]
+        order = {arcname: i for i, (arcname, *_) in enumerate(documents)}
+        found.sort(key=lambda issue: order[issue[1]])
+    else:
+        found = _check_documents(documents)
+    issues.extend(Issue(*issue) for issue in found)
+    return issues
+
+
+def validate_epub(source, jobs=None):
+    """Validate an .epub file (path or bytes) or an unpacked EPUB directory.
+
+    Returns:
+        list[Issue]: See `validate_members`.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        book = RecordingOutput()
+        paths = []
+        for base, dirs, files in os.walk(source):
+            dirs.sort()
+            for fn in sorted(files):
+                path = os.path.join(base, fn)
+                paths.append((os.path.relpath(path, source).replace(os.sep, "/"), path))
+        # a directory has no member order; mimetype is expected first
+        paths.sort(key=lambda p: p[0] != MIMETYPE)
+        for arcname, path in paths:
+            book.add_file(arcname, path)
+        return validate_members(book.members, jobs)
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with zipfile.ZipFile(source) as zf:
+        members = [(info.filename, zf.read(info), None) for info in zf.infolist() if not info.is_dir()]
+        issues = []
+        first = zf.infolist()[0] if zf.infolist() else None
+        if first is not None and first.filename == MIMETYPE and first.compress_type != zipfile.ZIP_STORED:
+            issues.append(Issue(ERROR, MIMETYPE, "must be stored without compression"))
+    return issues + validate_members(members, jobs)
+
+
+def has_errors(issues):
+    return any(issue.severity == ERROR for issue in issues)
+
+
+def check_book(members, jobs=None):
+    """Validate `members`, print warnings and raise EPUBValidationError on errors.
+
+    Returns:
+        list[Issue]: The warnings when there are no errors.
+    """
+    issues = validate_members(members, jobs)
+    if has_errors(issues):
+        raise EPUBValidationError(issues)
+    for issue in issues:
+        print(issue)
+    return issues
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m word2epub.validate", description="Structural checks of EPUB files or unpacked EPUB directories."
+    )
+    parser.add_argument("books", nargs="+", help=".epub files or unpacked EPUB directories")
+    parser.add_argument("--jobs", type=int, default=None, help="processes used to check content documents")
+    args = parser.parse_args(argv)
+    failed = False
+    for book in args.books:
+        try:
+            issues = validate_epub(book, args.jobs)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"{book}: cannot read: {e}")
+            failed = True
+            continue
+        for issue in issues:
+            print(f"{book}: {issue}")
+        failed = failed or has_errors(issues)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,160 @@
+"""Split a very large manuscript into several volume EPUBs.
+
+Volumes are cut at chapter boundaries, by chapter count and/or by a budget
+on the serialized chapter bytes. Chapters are serialized once in the parent
+process (as `Chapter` objects); the volume EPUBs (each with its own TOC and
+OPF carrying series metadata) are then written in parallel worker processes. Metadata images
+and the stylesheet are resolved once; a volume packs the cover, the other
+unplaced images and the images of the image pages that land in it.
+"""
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .chapter import Chapter
+from .chapter_split import DEFAULT_MAX_PART_BYTES
+from .epub_writer import register_metadata_images
+from .manifest import AssetRegistry
+from .xhtml import AFTER_CHAPTER, AT_END, BEFORE_CHAPTER, metadata_image_hrefs, plan_image_pages
+
+
+def chapter_size(chapter):
+    """Return the size of a chapter's serialized body in UTF-8 bytes."""
+    return sum(len(str(node).encode("utf-8")) for node in chapter["nodes"])
+
+
+def split_volumes(chapters, max_chapters=None, max_bytes=None):
+    """Group `chapters` into volumes.
+
+    A new volume starts when adding the next chapter would exceed
+    `max_chapters` or `max_bytes`. A single chapter larger than `max_bytes`
+    becomes a volume of its own (chapters are never cut).
+
+    Returns:
+        list[list[dict]]: Chapters per volume, in order.
+    """
+    volumes = []
+    current = []
+    current_bytes = 0
+    for chap in chapters:
+        size = chapter_size(chap) if max_bytes else 0
+        full = (
+            (max_chapters and len(current) >= max_chapters)
+            or (max_bytes and current and current_bytes + size > max_bytes)
+        )
+        if full:
+            volumes.append(current)
+            current = []
+            current_bytes = 0
+        current.append(chap)
+        current_bytes += size
+    if current:
+        volumes.append(current)
+    return volumes
+
+
+def volume_path(output, number, total):
+    """Return the output path of volume `number`: book.epub -> book-01.epub."""
+    if total == 1:
+        return output
+    root, ext = os.path.splitext(output)
+    width = max(2, len(str(total)))
+    return f"{root}-{number:0{width}d}{ext}"
+
+
+def volume_metadata(meta, number, total):
+    """Return metadata for volume `number` of `total` with series information.
+
+    The title gets a volume suffix, the series (belongs-to-collection) is the
+    original title, and the identifier differs per volume: an explicit
+    identifier gets a ``-volN`` suffix and a derived one changes with the
+    volume number.
+    """
+    vmeta = copy.deepcopy(meta)
+    title = meta.get("title", "タイトル未設定")
+    vmeta["title"] = f"{title} 第{number}巻"
+    vmeta["volume"] = number
+    vmeta["series"] = {"title": title, "position": number, "total": total}
+    if isinstance(meta.get("identifier"), str) and meta["identifier"].strip():
+        vmeta["identifier"] = f"{meta['identifier'].strip()}-vol{number}"
+    return vmeta
+
+
+def volume_assets(shared_assets, meta, vmeta, chapters):
+    """Return the metadata images of `shared_assets` that the volume of `chapters` uses.
+
+    Images of ``insert_before_chapter`` / ``insert_after_chapter`` /
+    ``insert_at_end`` pages are only packed where their page lands (see
+    xhtml.plan_image_pages); every other image (cover, ``insert_after_toc``)
+    is packed in each volume.
+    """
+    hrefs = metadata_image_hrefs(meta)
+    everywhere = {
+        hrefs[img["file"]]
+        for img in meta.get("images", [])
+        if img.get("file") and img.get("type") not in (BEFORE_CHAPTER, AFTER_CHAPTER, AT_END)
+    }
+    used = everywhere | {page.image_href for page in plan_image_pages(vmeta, chapters)}
+    return [item for item in shared_assets if item.href in used]
+
+
+def _build_volume(output, meta, chapters, output_format, shared_assets, max_part_bytes, validate, style_classes):
+    from .convert import write_book
+
+    registry = AssetRegistry()
+    for item in shared_assets:
+        registry.register(item.href, item.media_type, item.item_id, item.properties, item.role, item.source)
+    write_book(output, meta, chapters, output_format, registry, max_part_bytes, validate, style_classes)
+    return output
+
+
+def write_volumes(output, meta, chapters, max_chapters=None, max_bytes=None, output_format="zip", jobs=None,
+                  max_part_bytes=DEFAULT_MAX_PART_BYTES, validate=False, style_classes=False):
+    """Split `chapters` into volumes and write one EPUB per volume.
+
+    Args:
+        output (str): Output path; volumes are written as ``<name>-01.epub`` etc.
+        meta (dict): Book metadata.
+        chapters (list[dict]): Cleaned chapters.
+        max_chapters (int | None): Chapter limit per volume.
+        max_bytes (int | None): Serialized XHTML budget per volume.
+        output_format (str): "zip" or "dir".
+        jobs (int | None): Worker processes (default: CPU count; 1 builds serially).
+        max_part_bytes (int | None): Split chapters larger than this (see chapter_split.py).
+        validate (bool): Check every volume before writing it (see validate.py).
+        style_classes (bool): Replace inline styles with generated classes
+            (each volume gets the classes its chapters use).
+
+    Returns:
+        list[str]: Paths of the written volumes.
+    """
+    # Chapter objects hold strings only, so they are cheap to pickle
+    serialized = [Chapter.from_nodes(chap) for chap in chapters]
+    volumes = split_volumes(serialized, max_chapters, max_bytes)
+    total = len(volumes)
+    print(f"Splitting {len(chapters)} chapters into {total} volume(s).")
+
+    # images from metadata are resolved once and shared by every volume
+    # 画像の解決は一度だけ行い全巻で共有する
+    shared_assets = list(register_metadata_images(meta, AssetRegistry()))
+
+    tasks = []
+    for number, vol_chapters in enumerate(volumes, start=1):
+        vmeta = volume_metadata(meta, number, total) if total > 1 else meta
+        tasks.append((
+            volume_path(output, number, total),
+            vmeta,
+            vol_chapters,
+            output_format,
+            volume_assets(shared_assets, meta, vmeta, vol_chapters) if total > 1 else shared_assets,
+            max_part_bytes,
+            validate,
+            style_classes,
+        ))
+
+    jobs = min(jobs or os.cpu_count() or 1, total)
+    if jobs <= 1:
+        return [_build_volume(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_build_volume, *task) for task in tasks]
+        return [f.result() for f in futures]
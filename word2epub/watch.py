@@ -0,0 +1,190 @@
+"""File watching for ``--watch`` rebuild loops.
+
+Uses Linux inotify through ctypes when available (no extra dependency) and
+falls back to polling file mtimes elsewhere. Events are debounced so a burst
+of saves from an editor triggers a single rebuild.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+
+DEFAULT_DEBOUNCE = 0.15
+DEFAULT_POLL_INTERVAL = 0.5
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Detects changes by comparing (mtime, size) of the watched files."""
+
+    def __init__(self, paths, interval=DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+        self.set_paths(paths)
+
+    def set_paths(self, paths):
+        self._state = {os.path.abspath(p): self._stat(p) for p in paths}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def wait(self, timeout=None):
+        """Block until a change is seen (or `timeout` expires); return changed paths."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path, old in self._state.items():
+                new = self._stat(path)
+                if new != old:
+                    self._state[path] = new
+                    changed.add(path)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Watches the parent directories of the files via Linux inotify.
+
+    Directories are watched (not the files) so that editors which save by
+    writing a new file and renaming it over the old one are detected too.
+    """
+
+    def __init__(self, paths):
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}  # directory -> wd
+        self._wd_dirs = {}  # wd -> directory
+        self.set_paths(paths)
+
+    def set_paths(self, paths):
+        self._paths = {os.path.abspath(p) for p in paths}
+        for d in {os.path.dirname(p) for p in self._paths}:
+            if d in self._dirs or not os.path.isdir(d):
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), WATCH_MASK)
+            if wd < 0:
+                continue
+            self._dirs[d] = wd
+            self._wd_dirs[wd] = d
+
+    def _read_events(self):
+        changed = set()
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                d = self._wd_dirs.get(wd)
+                if d is None or not name:
+                    continue
+                path = os.path.join(d, os.fsdecode(name))
+                if path in self._paths:
+                    changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        """Block until a watched file changes (or `timeout` expires); return changed paths."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if ready:
+                changed = self._read_events()
+                if changed:
+                    return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(paths, poll_interval=DEFAULT_POLL_INTERVAL, force_polling=False):
+    """Return an inotify watcher on Linux, or a polling watcher as fallback."""
+    if not force_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(paths, poll_interval)
+
+
+def watch(paths, rebuild, debounce=DEFAULT_DEBOUNCE, poll_interval=DEFAULT_POLL_INTERVAL, force_polling=False):
+    """Call `rebuild(changed_paths)` whenever one of `paths` changes.
+
+    `rebuild` returns the new set of paths to watch (the dependency set may
+    change, e.g. when a chapter is added to metadata.yaml) or None to keep
+    the current one. Runs until interrupted with Ctrl-C.
+
+    Args:
+        paths (iterable[str]): Files to watch.
+        rebuild (callable): Called with a set of changed absolute paths.
+        debounce (float): Seconds without further events before rebuilding.
+        poll_interval (float): Poll interval for the polling fallback.
+        force_polling (bool): Do not use inotify.
+    """
+    watcher = create_watcher(paths, poll_interval, force_polling)
+    print(f"Watching {len(set(paths))} files ({type(watcher).__name__}); press Ctrl-C to stop.")
+    try:
+        while True:
+            changed = watcher.wait()
+            # debounce: collect follow-up events until the files are quiet
+            # デバウンス: 連続した保存イベントをまとめる
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+            start = time.perf_counter()
+            try:
+                new_paths = rebuild(changed)
+            except Exception as e:  # keep watching after a failed build
+                print(f"Rebuild failed: {e}")
+                new_paths = None
+            print(f"Rebuilt in {time.perf_counter() - start:.3f}s ({len(changed)} changed)")
+            if new_paths is not None:
+                watcher.set_paths(new_paths)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        watcher.close()
@@ -0,0 +1,193 @@
+"""Inline pictures of Word HTML, packed from the folder Word saves next to it.
+
+"Save as Web Page" writes the pictures of ``book.htm`` into ``book.files/``
+(``book_files/`` in older versions) and the body refers to them as
+``<img src="book.files/image002.jpg">``. When a picture is shown scaled
+down, that file is a reduced copy; the VML markup in the preceding
+``<!--[if gte vml 1]>`` comment points at the original
+(``<v:imagedata src="book.files/image001.png">``) and the ``<img>`` names
+the VML shape in ``v:shapes``.
+
+`collect_images` runs on the parse tree, before the chapters are cleaned:
+
+- every local ``<img>`` is switched to the original when there is one that
+  reading systems can show (not for ``.emz``/``.wmf`` originals)
+- files are hashed in a thread pool and identical pictures are packed once
+- ``src`` is rewritten to ``images/<name>`` (pictures without a size get
+  ``width``/``height`` from the file header) and the files are listed in
+  ``chapter["assets"]``, so the writer packs them and the OPF lists them
+  like the media of a .docx
+- the VML comments, the ``<![if !vml]>`` markers and prefixed attributes
+  (not well-formed in XHTML) are removed, and so are pictures whose file is
+  missing, not an EPUB image type or outside the folder of the HTML file
+"""
+import os
+import posixpath
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from .cache import hash_file
+from .imagesize import image_size
+
+
+COMPANION_SUFFIXES = (".files", "_files")
+IMAGE_DIR = "images"
+# pictures reading systems can show (core media types) / EPUB で表示できる画像形式
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp")
+
+_VML_SHAPE = re.compile(r"<v:shape\b([^>]*)>(.*?)</v:shape>", re.S | re.I)
+_VML_IMAGEDATA = re.compile(r"<v:imagedata\b[^>]*\bsrc=\"([^\"]+)\"", re.I)
+_ID = re.compile(r"\bid=\"([^\"]+)\"")
+
+
+def companion_dirs(source):
+    """Return the existing companion folders of the Word HTML file `source`."""
+    stem = os.path.splitext(os.path.abspath(source))[0]
+    return [stem + suffix for suffix in COMPANION_SUFFIXES if os.path.isdir(stem + suffix)]
+
+
+def companion_files(source):
+    """Return every file in the companion folders of `source` (sorted)."""
+    files = []
+    for folder in companion_dirs(source):
+        for base, dirs, names in os.walk(folder):
+            dirs.sort()
+            files.extend(os.path.join(base, name) for name in sorted(names))
+    return files
+
+
+def _local_path(src, base_dir):
+    """Return the file `src` refers to, or None for remote, data: and absolute URLs."""
+    src = (src or "").split("#", 1)[0].split("?", 1)[0].strip()
+    if not src or ":" in src or src.startswith(("/", "\\")):
+        return None
+    return os.path.normpath(os.path.join(base_dir, unquote(src).replace("\\", "/")))
+
+
+def _inside(path, base_dir):
+    """True when `path` is in `base_dir` (Word keeps its pictures next to the HTML)."""
+    root = os.path.abspath(base_dir)
+    return os.path.commonpath([root, os.path.abspath(path)]) == root
+
+
+def _vml_originals(soup, base_dir):
+    """Return {VML shape id: original picture path} from Word's VML comments."""
+    from bs4 import Comment
+
+    originals = {}
+    for comment in soup.find_all(string=lambda s: isinstance(s, Comment) and "vml" in s):
+        for m in _VML_SHAPE.finditer(comment):
+            sid = _ID.search(m.group(1))
+            data = _VML_IMAGEDATA.search(m.group(2))
+            if sid and data:
+                path = _local_path(data.group(1), base_dir)
+                if path:
+                    originals[sid.group(1)] = path
+    return originals
+
+
+def _remove_vml_markup(soup):
+    """Drop the VML comments and the ``<![if !vml]>``/``<![endif]>`` markers."""
+    from bs4 import Comment, Declaration
+
+    for node in soup.find_all(string=True):
+        if isinstance(node, Comment) and "[if gte vml" in node:
+            node.extract()
+        elif isinstance(node, Declaration) and node.strip().lower() in ("if !vml", "endif"):
+            node.extract()
+
+
+def _usable(path, base_dir):
+    # "../" must not pack files from outside the document folder / 文書フォルダ外は詰めない
+    return (
+        bool(path) and path.lower().endswith(IMAGE_EXTENSIONS) and _inside(path, base_dir)
+        and os.path.isfile(path)
+    )
+
+
+def collect_images(soup, chapters, base_dir, jobs=None):
+    """Pack the local pictures of `chapters` and point their ``<img>`` at the package copies.
+
+    Args:
+        soup (BeautifulSoup): The parse tree the chapters were split from.
+        chapters (list[dict]): Dict chapters; ``src`` attributes are rewritten
+            in place and ``chapter["assets"]`` gets ``(href, path)`` pairs.
+        base_dir (str): Directory of the Word HTML file (``src`` is relative to it).
+        jobs (int | None): Threads used to hash the pictures.
+
+    Returns:
+        dict: ``{"images", "files", "duplicates", "originals", "missing"}``.
+    """
+    originals = _vml_originals(soup, base_dir)
+    _remove_vml_markup(soup)
+    stats = {"images": 0, "files": 0, "duplicates": 0, "originals": 0, "missing": 0}
+
+    found = []  # (chapter, img, path)
+    for chap in chapters:
+        in_chapter = {id(node) for node in chap["nodes"]}
+        kept = []
+        for node in chap["nodes"]:
+            if getattr(node, "name", None) != "img":
+                kept.append(node)
+                continue
+            path = _local_path(node.get("src"), base_dir)
+            original = originals.get(node.get("v:shapes", ""))
+            if path and _usable(original, base_dir) and original != path:
+                path = original
+                stats["originals"] += 1
+            for attr in [a for a in node.attrs if ":" in a]:
+                del node.attrs[attr]
+            node.attrs.setdefault("alt", "")
+            if path is not None:
+                stats["images"] += 1
+                if not _usable(path, base_dir):
+                    # a broken picture would make the book invalid / 壊れた参照は残さない
+                    stats["missing"] += 1
+                    print("Warning: image file not found, not supported or outside the document folder, skipping:",
+                          node.get("src"))
+                    node.decompose()
+                    continue
+                found.append((chap, node, path))
+            # pictures inside a paragraph are written with it; listing them on
+            # their own too would show them twice / 段落内の画像は段落と一緒に出力される
+            if not any(id(parent) in in_chapter for parent in node.parents):
+                kept.append(node)
+        chap["nodes"] = kept
+
+    # hash every distinct file once, in parallel / 画像ごとに一度だけ並列でハッシュ
+    paths = list(dict.fromkeys(path for _, _, path in found))
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        digests = dict(zip(paths, pool.map(hash_file, paths)))
+
+    hrefs = {}  # digest -> href
+    sources = {}  # href -> first file with that content
+    names = set()
+    for path in paths:
+        digest = digests[path]
+        if digest in hrefs:
+            stats["duplicates"] += 1
+            continue
+        stem, ext = os.path.splitext(os.path.basename(path))
+        name = f"{stem}{ext.lower()}"
+        n = 1
+        while name in names:
+            n += 1
+            name = f"{stem}-{n}{ext.lower()}"
+        names.add(name)
+        hrefs[digest] = posixpath.join(IMAGE_DIR, name)
+        sources[hrefs[digest]] = path
+    stats["files"] = len(hrefs)
+
+    for chap, img, path in found:
+        href = hrefs[digests[path]]
+        img["src"] = href
+        # Word writes the shown size; pictures without one get their own
+        # Word の表示サイズが無い画像には画像自体のサイズを付ける
+        size = None if img.get("width") or img.get("height") else image_size(path)
+        if size:
+            img["width"], img["height"] = str(size[0]), str(size[1])
+        assets = chap.setdefault("assets", [])
+        if all(h != href for h, _ in assets):
+            assets.append((href, sources[href]))
+    return stats
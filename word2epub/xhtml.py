@@ -1,6 +1,11 @@
 import os
-import uuid
-from datetime import datetime
+from xml.sax.saxutils import escape
+
+from .chapter import Chapter
+from .chapter_split import part_name, split_html
+from .imagesize import image_size, size_attributes, viewport_meta
+from .manifest import AssetRegistry
+from .reproducible import book_identifier, build_datetime
 
 
 def build_chapter_xhtml(chapter, css_filename="style.css"):
@@ -11,7 +16,7 @@ def build_chapter_xhtml(chapter, css_filename="style.css"):
 <html xmlns="http://www.w3.org/1999/xhtml" lang="ja" xml:lang="ja">
 <head>
   <meta charset="utf-8" />
-  <title>{chapter["title"]}</title>
+  <title>{escape(chapter["title"])}</title>
   <link rel="stylesheet" type="text/css" href="{css_filename}" />
 </head>
 <body>
@@ -30,24 +35,75 @@ def generate_chapter_filenames(chapters):
     return filenames
 
 
-def generate_all_chapter_xhtml(chapters):
-    filenames = generate_chapter_filenames(chapters)
-    result = {}
+def _chapter_parts(chapter, filename, max_part_bytes=None):
+    """Return [(filename, chapter)] with one entry per part of `chapter`.
+
+    Without a budget the chapter is kept whole (and not serialized here).
+    The body is cut by chapter_split.split_html, at the same top-level
+    boundaries as the chapters of yaml2epub.
+    """
+    if not max_part_bytes:
+        return [(filename, chapter)]
+    parts = split_html("".join(str(node) for node in chapter["nodes"]), max_part_bytes)
+    base, ext = os.path.splitext(filename)
+    return [
+        (part_name(base, n) + ext, Chapter(chapter["index"], chapter["title"], [html]))
+        for n, html in enumerate(parts, start=1)
+    ]
+
 
+def iter_chapter_xhtml(chapters, registry=None, max_part_bytes=None, image_pages=()):
+    """Return an iterator of (key, (filename, xhtml)) that renders each chapter on demand.
+
+    Filenames are registered right away, so the OPF can be built (and the
+    EPUB streamed) before the chapters themselves are rendered.
+
+    With `max_part_bytes`, chapters larger than the budget are split at
+    paragraph boundaries (see chapter_split.py). The first part keeps the
+    chapter's filename and key `idx`; further parts are keyed `(idx, n)`,
+    named ``content-01-02.xhtml`` etc. and registered right after it so the
+    spine stays in reading order. Splitting needs the serialized size, so
+    chapters are then serialized up front.
+
+    `image_pages` (see `plan_image_pages`) are rendered in the same pass at
+    their place in the reading order, keyed by their manifest id.
+    """
+    filenames = generate_chapter_filenames(chapters)
+    parts = []
     for chap in chapters:
         idx = chap["index"]
-        filename = filenames[idx]
-        xhtml = build_chapter_xhtml(chap)
-        result[idx] = (filename, xhtml)
+        for n, (filename, part) in enumerate(_chapter_parts(chap, filenames[idx], max_part_bytes), start=1):
+            parts.append((idx, (n, filename, part)))
 
-    return result
+    plan = []
+    for idx, entry in _with_image_pages(parts, image_pages):
+        if idx is None:
+            plan.append((entry.item_id, entry.filename, entry))
+            if registry is not None:
+                registry.register(entry.filename, "application/xhtml+xml", entry.item_id, role="image-page")
+            continue
+        n, filename, part = entry
+        plan.append((idx if n == 1 else (idx, n), filename, part))
+        if registry is not None:
+            item_id = f"chap{idx}" if n == 1 else f"chap{idx}-{n}"
+            registry.register(filename, "application/xhtml+xml", item_id, role="chapter")
+
+    return (
+        (key, (filename, part.xhtml if isinstance(part, ImagePage) else build_chapter_xhtml(part)))
+        for key, filename, part in plan
+    )
+
+
+def generate_all_chapter_xhtml(chapters, registry=None, max_part_bytes=None):
+    return dict(iter_chapter_xhtml(chapters, registry, max_part_bytes))
 
 
 def build_toc_xhtml(chapters, chapter_filenames):
     items = []
     for chap in chapters:
         idx = chap["index"]
-        title = chap["title"]
+        # titles are plain text; escape &, < and > for XHTML
+        title = escape(chap["title"])
         href = chapter_filenames[idx]
         items.append(f'      <li><a href="{href}">{title}</a></li>')
 
@@ -74,11 +130,37 @@ def build_toc_xhtml(chapters, chapter_filenames):
     return toc
 
 
-def build_image_xhtml(image_filename):
-        img_src = os.path.basename(image_filename)
+def build_image_xhtml(image_href, size=None, fixed_layout=False):
+    """Return the XHTML page showing the image packed at `image_href`.
+
+    `image_href` is the manifest href of the image (see
+    metadata_image_hrefs), relative to the page.
+    `size` (width, height) is written to the ``<img>`` so reading systems
+    can lay out the page before decoding the image (see imagesize.py). A
+    `fixed_layout` page (needs `size`) gets a viewport of the image's size
+    and shows the image at full size.
+    """
+    img_src = image_href
+    if fixed_layout and size:
         return f'''<?xml version="1.0" encoding="utf-8"?>
 <!DOCTYPE html>
 <html xmlns="http://www.w3.org/1999/xhtml" lang="ja" xml:lang="ja">
+<head>
+  <meta charset="utf-8" />
+  {viewport_meta(size)}
+  <title>Image</title>
+  <link rel="stylesheet" type="text/css" href="style.css" />
+</head>
+<body style="margin:0; padding:0;">
+  <div style="width:{size[0]}px; height:{size[1]}px;">
+        <img src="{img_src}" alt=""{size_attributes(size)} />
+  </div>
+</body>
+</html>
+'''
+    return f'''<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" lang="ja" xml:lang="ja">
 <head>
   <meta charset="utf-8" />
   <title>Image</title>
@@ -86,68 +168,259 @@ def build_image_xhtml(image_filename):
 </head>
 <body>
   <div style="text-align:center;">
-        <img src="{img_src}" alt="" style="max-width:100%; height:auto;" />
+        <img src="{img_src}" alt=""{size_attributes(size)} style="max-width:100%; height:auto;" />
   </div>
 </body>
 </html>
 '''
 
 
-def build_opf(meta, chapter_filenames, image_pages):
-    title = meta["title"]
-    author = meta["author"]
-    ppd = meta["ppd"]
+def is_fixed_layout_page(xhtml):
+    """True for pages built with a viewport (fixed-layout image pages)."""
+    return '<meta name="viewport"' in xhtml
 
-    unique_id = f"urn:uuid:{uuid.uuid4()}"
-    now = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    manifest_items = []
+# Image pages placed in the reading order / 読み順の中に置く画像ページ
 
-    for idx, filename in chapter_filenames.items():
-        item_id = f"chap{idx}"
-        manifest_items.append(
-            f'    <item id="{item_id}" href="{filename}" media-type="application/xhtml+xml" />'
-        )
+AFTER_TOC = "insert_after_toc"
+BEFORE_CHAPTER = "insert_before_chapter"
+AFTER_CHAPTER = "insert_after_chapter"
+AT_END = "insert_at_end"
+IMAGE_PAGE_TYPES = (AFTER_TOC, BEFORE_CHAPTER, AFTER_CHAPTER, AT_END)
 
-    manifest_items.append(
-        '    <item id="toc" href="toc.xhtml" media-type="application/xhtml+xml" properties="nav" />'
-    )
 
-    for i, (fname, _) in enumerate(image_pages):
-        manifest_items.append(
-            f'    <item id="imgpage{i}" href="{fname}" media-type="application/xhtml+xml" />'
-        )
+class ImagePage:
+    """A page showing one image, with its own file name, manifest id and place in the book.
 
-    # 画像ファイル (metadata の images セクション)
+    Unpacks as ``(filename, xhtml)`` like the image page tuples used before;
+    the XHTML is rendered when `xhtml` is read.
+    """
+
+    __slots__ = ("filename", "item_id", "image_href", "placement", "chapter", "size", "fixed", "_xhtml")
+
+    def __init__(self, filename, item_id, image_href=None, placement=AFTER_TOC, chapter=None, size=None,
+                 fixed=False, xhtml=None):
+        self.filename = filename
+        self.item_id = item_id
+        self.image_href = image_href
+        self.placement = placement
+        self.chapter = chapter
+        self.size = size
+        self.fixed = fixed
+        self._xhtml = xhtml
+
+    @classmethod
+    def from_xhtml(cls, filename, xhtml, item_id):
+        """Wrap an already rendered ``(filename, xhtml)`` page (shown after the TOC)."""
+        return cls(filename, item_id, fixed=is_fixed_layout_page(xhtml), xhtml=xhtml)
+
+    @property
+    def xhtml(self):
+        if self._xhtml is not None:
+            return self._xhtml
+        return build_image_xhtml(self.image_href, self.size, self.fixed)
+
+    def __iter__(self):
+        return iter((self.filename, self.xhtml))
+
+    def __repr__(self):
+        return f"ImagePage({self.filename!r}, {self.placement!r}, {self.chapter!r})"
+
+
+def plan_image_pages(meta, chapters):
+    """Return the image pages of metadata ``images`` that belong in a book of `chapters`.
+
+    Placements (the ``type`` of an entry): ``insert_after_toc``,
+    ``insert_before_chapter`` / ``insert_after_chapter`` with ``chapter: N``
+    (the chapter index) and ``insert_at_end``. Pages are numbered in the
+    order of the metadata (``image-001.xhtml``, id ``imgpage1``, ...), so a
+    page keeps its name in whichever volume it lands; a volume only gets
+    the pages of its own chapters, and ``insert_at_end`` pages go to the
+    last volume. Missing image files are skipped (register_metadata_images
+    warns about them).
+    """
+    from .epub_writer import resolve_metadata_image_path
+
+    hrefs = metadata_image_hrefs(meta)
+    series = meta.get("series")
+    last_volume = not series or series.get("position") == series.get("total")
+    indexes = {chap["index"] for chap in chapters}
+    pages = []
+    number = 0
     for img in meta.get("images", []):
-        img_file = os.path.basename(img.get("file", ""))
-        # 拡張子から簡易的に MIME を判定
-        ext = os.path.splitext(img_file)[1].lower()
-        if ext in (".jpg", ".jpeg"):
-            mime = "image/jpeg"
-        elif ext == ".png":
-            mime = "image/png"
-        elif ext == ".gif":
-            mime = "image/gif"
-        else:
-            mime = "application/octet-stream"
+        placement = img.get("type")
+        if placement not in IMAGE_PAGE_TYPES or not img.get("file"):
+            continue
+        number += 1
+        chapter = None
+        if placement in (BEFORE_CHAPTER, AFTER_CHAPTER):
+            try:
+                chapter = int(img.get("chapter"))
+            except (TypeError, ValueError):
+                print(f"Warning: {placement} needs a chapter number, skipping:", img["file"])
+                continue
+            if chapter not in indexes:
+                if not series:
+                    print(f"Warning: no chapter {chapter} for image page, skipping:", img["file"])
+                continue
+        if placement == AT_END and not last_volume:
+            continue
+        path = resolve_metadata_image_path(meta, img["file"])
+        if not os.path.exists(path):
+            continue
+        # header-only probe; no decoding / ヘッダだけを読んで画像サイズを得る
+        size = image_size(path)
+        pages.append(ImagePage(
+            f"image-{number:03d}.xhtml", f"imgpage{number}", hrefs[img["file"]], placement, chapter, size,
+            img.get("layout") == "fixed",
+        ))
+    return pages
 
-        # id はファイル名を安全な形式で使う
-        item_id = f"imgfile_{os.path.splitext(img_file)[0]}"
-        manifest_items.append(
-            f'    <item id="{item_id}" href="{img_file}" media-type="{mime}" />'
-        )
 
-    manifest_items.append(
-        '    <item id="style" href="style.css" media-type="text/css" />'
+def _with_image_pages(entries, pages):
+    """Yield `entries` ((chapter index, value) in reading order) with `pages` placed among them.
+
+    Pages are yielded as ``(None, page)``; pages of chapters missing from
+    `entries` are left out.
+    """
+    before = {}
+    after = {}
+    for page in pages:
+        if page.placement == BEFORE_CHAPTER:
+            before.setdefault(page.chapter, []).append(page)
+        elif page.placement == AFTER_CHAPTER:
+            after.setdefault(page.chapter, []).append(page)
+    for page in pages:
+        if page.placement == AFTER_TOC:
+            yield None, page
+    previous = None
+    for idx, value in entries:
+        if idx != previous:
+            # after the last part of the previous chapter / 前の章の最後のパートの後
+            for page in after.get(previous, ()):
+                yield None, page
+            for page in before.get(idx, ()):
+                yield None, page
+            previous = idx
+        yield idx, value
+    for page in after.get(previous, ()):
+        yield None, page
+    for page in pages:
+        if page.placement == AT_END:
+            yield None, page
+
+
+def metadata_image_hrefs(meta):
+    """Return {``file`` of a metadata ``images`` entry: href of the packed image}.
+
+    Images are packed next to the OPF under their file name. Different files
+    with the same name (``a/plate.jpg``, ``b/plate.jpg``) get ``plate-2.jpg``,
+    ``plate-3.jpg``, ... in metadata order, like word_images.collect_images,
+    so every volume of a split book names them the same way. Entries naming
+    the same file share one href.
+    """
+    from .epub_writer import resolve_metadata_image_path
+
+    hrefs = {}
+    by_path = {}
+    names = set()
+    for img in meta.get("images", []):
+        img_rel = img.get("file")
+        if not img_rel or img_rel in hrefs:
+            continue
+        path = resolve_metadata_image_path(meta, img_rel)
+        if path not in by_path:
+            stem, ext = os.path.splitext(os.path.basename(path))
+            name = stem + ext
+            n = 1
+            while name in names:
+                n += 1
+                name = f"{stem}-{n}{ext}"
+            names.add(name)
+            by_path[path] = name
+        hrefs[img_rel] = by_path[path]
+    return hrefs
+
+
+def register_metadata_image(registry, img, source, href=None):
+    """Register one `images` entry from metadata.yaml and return its ManifestItem.
+
+    `href` comes from metadata_image_hrefs (the file name when omitted).
+    `type: cover` entries get the `cover-image` property.
+    """
+    img_file = href or os.path.basename(img.get("file", ""))
+    return registry.register(
+        img_file,
+        item_id=f"imgfile_{os.path.splitext(img_file)[0]}",
+        properties="cover-image" if img.get("type") == "cover" else None,
+        role="image",
+        source=source,
     )
 
+
+def build_opf(meta, chapter_filenames, image_pages, registry=None):
+    # same defaults as load_metadata, so a book without metadata.yaml still builds
+    # metadata.yaml が無い場合も load_metadata と同じ既定値で組み立てる
+    title = escape(meta.get("title") or "タイトル未設定")
+    author = escape(meta.get("author") or "著者未設定")
+    ppd = meta.get("ppd", "rtl")
+
+    # identifier/date are stable in reproducible mode (see reproducible.py)
+    reproducible = bool(meta.get("_reproducible"))
+    unique_id = book_identifier(meta, reproducible)
+    now = build_datetime(reproducible).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    # Producers register their assets while writing them; without a registry
+    # fall back to deriving image entries from the metadata
+    # registry が無い場合は従来どおり metadata の images から画像エントリを作る
+    own_registry = registry is None
+    if own_registry:
+        registry = AssetRegistry()
+
+    # (filename, xhtml) pairs are pages after the TOC / タプルは目次の後の画像ページ
+    pages = [
+        page if isinstance(page, ImagePage) else ImagePage.from_xhtml(page[0], page[1], f"imgpage{i}")
+        for i, page in enumerate(image_pages)
+    ]
+
+    # register() is idempotent, so already registered hrefs keep their ids;
+    # chapters and image pages are registered in reading order
+    # register() は既存 href をそのまま返す。章と画像ページは読み順に登録する
+    for idx, entry in _with_image_pages(sorted(chapter_filenames.items()), pages):
+        if idx is None:
+            registry.register(entry.filename, "application/xhtml+xml", entry.item_id, role="image-page")
+        else:
+            registry.register(entry, "application/xhtml+xml", f"chap{idx}", role="chapter")
+    registry.register("toc.xhtml", "application/xhtml+xml", "toc", properties="nav", role="nav")
+
+    # 画像ファイル (metadata の images セクション)
+    if own_registry:
+        hrefs = metadata_image_hrefs(meta)
+        for img in meta.get("images", []):
+            register_metadata_image(registry, img, None, hrefs.get(img.get("file")))
+
+    registry.register("style.css", "text/css", "style", role="style")
+
+    manifest_items = registry.manifest_lines()
+
+    # series (belongs-to-collection) metadata for multi-volume books
+    # 分冊時のシリーズ情報
+    series_meta = ""
+    series = meta.get("series")
+    if series:
+        series_meta = f'''
+    <meta property="belongs-to-collection" id="series">{escape(str(series["title"]))}</meta>
+    <meta refines="#series" property="collection-type">series</meta>
+    <meta refines="#series" property="group-position">{series["position"]}</meta>'''
+
     spine_items = []
     spine_items.append('    <itemref idref="toc" />')
-    for i, (fname, _) in enumerate(image_pages):
-        spine_items.append(f'    <itemref idref="imgpage{i}" />')
-    for idx in sorted(chapter_filenames.keys()):
-        spine_items.append(f'    <itemref idref="chap{idx}" />')
+    fixed = {page.filename for page in pages if page.fixed}
+    # chapters (and their split parts) and image pages in registration order
+    for item in registry.by_role("image-page", "chapter"):
+        # fixed-layout pages in an otherwise reflowable book / 固定レイアウトの画像ページ
+        props = ' properties="rendition:layout-pre-paginated"' if item.href in fixed else ""
+        spine_items.append(f'    <itemref idref="{item.item_id}"{props} />')
 
     opf = f'''<?xml version="1.0" encoding="utf-8"?>
 <package xmlns="http://www.idpf.org/2007/opf"
@@ -159,7 +432,7 @@ def build_opf(meta, chapter_filenames, image_pages):
     <dc:title>{title}</dc:title>
     <dc:language>ja</dc:language>
     <dc:creator>{author}</dc:creator>
-    <dc:date>{now}</dc:date>
+    <dc:date>{now}</dc:date>{series_meta}
 
     <meta property="rendition:layout">reflowable</meta>
     <meta property="rendition:orientation">auto</meta>
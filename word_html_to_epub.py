@@ -1,127 +1,300 @@
 """Thin CLI wrapper that uses the word2epub package."""
+import argparse
+import os
 import sys
-from word2epub import (
-    load_metadata,
-    detect_encoding,
-    load_html_and_split_chapters,
-    remove_duplicate_title_span,
-    remove_orphan_en_spans,
-    clean_word_garbage,
-    clean_span_and_ruby,
-    generate_all_chapter_xhtml,
-    build_toc_xhtml,
-    build_image_xhtml,
-    build_opf,
-    create_epub,
-)
-
-
-def main():
-    if not (3 <= len(sys.argv) <= 4):
-        print("Usage: python word_html_to_epub.py input.html output.epub [metadata.yaml]")
-        return
+# Only light modules are imported at load time so that --help and usage
+# errors stay fast; bs4/chardet/yaml are imported by the functions that need them.
+# --help や引数エラーを速く返すため、重いモジュールは使う関数内で import する
+from word2epub import __version__
 
-    input_html = sys.argv[1]
-    output_epub = sys.argv[2]
-    metadata_path = None
 
-    # If user provided metadata path, use it. Otherwise auto-detect.
-    if len(sys.argv) == 4:
-        metadata_path = sys.argv[3]
-    else:
-        # Search candidates: same dir as input, then cwd
-        import os
-
-        input_dir = os.path.dirname(os.path.abspath(input_html))
-        candidates = [
-            os.path.join(input_dir, "metadata.yaml"),
-            os.path.join(os.getcwd(), "metadata.yaml"),
-        ]
-        for p in candidates:
-            if os.path.exists(p):
-                metadata_path = p
-                break
-
-    if metadata_path is None:
-        print("Warning: metadata file not found; proceeding with defaults.")
-        meta = {}
-    else:
-        print("Using metadata:", metadata_path)
-        meta = load_metadata(metadata_path)
-        # remember metadata file directory so image paths in metadata
-        # can be resolved relative to the metadata file
-        import os
-
-        meta_dir = os.path.dirname(os.path.abspath(metadata_path))
-        meta["_meta_dir"] = meta_dir
-    if meta:
-        print("Detected encoding:", detect_encoding(input_html)[0])
-        print("Metadata loaded:", meta)
-    else:
-        print("Detected encoding:", detect_encoding(input_html)[0])
-
-    chapters = load_html_and_split_chapters(input_html)
-
-    for chap in chapters:
-        remove_duplicate_title_span(chap)
-        remove_orphan_en_spans(chap)
-        clean_word_garbage(chap)
-        clean_span_and_ruby(chap)
-
-        # 章タイトル内の簡易変換
-        first = chap["nodes"][0]
-        if getattr(first, "name", None) == "p" and "CHAPTER" in first.get("class", []):
-            for span in first.find_all("span"):
-                style = span.get("style", "")
-                if (
-                    "font-size" in style
-                    or "font-family" in style
-                    or "mso-" in style
-                ):
-                    span.unwrap()
-                elif "italic" in style:
-                    em = first.new_tag("em")
-                    em.string = span.get_text()
-                    span.replace_with(em)
-                elif "bold" in style:
-                    strong = first.new_tag("strong")
-                    strong.string = span.get_text()
-                    span.replace_with(strong)
-
-    print(f"Found {len(chapters)} chapters.")
-    for chap in chapters:
-        print(chap["index"], chap["title"])
-
-    chapter_files = generate_all_chapter_xhtml(chapters)
-    chapter_filenames = {idx: filename for idx, (filename, _) in chapter_files.items()}
-
-    toc_xhtml = build_toc_xhtml(chapters, chapter_filenames)
-
-    image_pages = []
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="word_html_to_epub.py",
+        description="Convert Word HTML (saved from Word) or a .docx into EPUB3.",
+    )
+    parser.add_argument("input_html", help="Word HTML file (input.html) or Word document (input.docx)")
+    parser.add_argument("output_epub", nargs="?", help="EPUB file to write (output.epub)")
+    parser.add_argument("metadata", nargs="?", help="metadata.yaml (auto-detected when omitted)")
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="bit-identical output: stable identifier, SOURCE_DATE_EPOCH timestamps, fixed ZIP metadata "
+        "(also enabled when SOURCE_DATE_EPOCH is set)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="reuse EPUBs built from identical inputs, and the parsed chapters of an unchanged HTML file "
+        "(default: $WORD2EPUB_CACHE_DIR; disabled when unset)",
+    )
+    parser.add_argument("--cache-max-size", help="cache size limit, e.g. 500M or 2G (default: 1G)")
+    parser.add_argument(
+        "--output-format",
+        choices=("zip", "dir"),
+        default="zip",
+        help="'zip' writes an .epub file, 'dir' an unpacked EPUB directory (only changed files are rewritten)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and rebuild when the HTML, metadata or images change",
+    )
+    parser.add_argument(
+        "--poll",
+        dest="poll_interval",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="with --watch, poll for changes every SECONDS instead of using inotify",
+    )
+    parser.add_argument(
+        "--max-part-size",
+        default=None,
+        metavar="SIZE",
+        help="split chapters larger than SIZE into several XHTML files at paragraph boundaries "
+        "(default: 256K; 0 disables)",
+    )
+    parser.add_argument(
+        "--list-chapters",
+        action="store_true",
+        help="print the chapter count and titles from the chapter index and exit (no full parse)",
+    )
+    parser.add_argument(
+        "--chapter",
+        dest="chapters",
+        type=int,
+        action="append",
+        metavar="N",
+        help="build only chapter N (repeatable); only that slice of the HTML is parsed",
+    )
+    parser.add_argument(
+        "--split-chapters",
+        type=int,
+        default=None,
+        metavar="N",
+        help="split into volumes of at most N chapters (output-01.epub, output-02.epub, ...)",
+    )
+    parser.add_argument(
+        "--split-size",
+        default=None,
+        metavar="SIZE",
+        help="split into volumes of at most SIZE bytes of chapter XHTML, e.g. 5M",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="processes used to build volumes (and parse --chapter slices) in parallel (default: CPU count)",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="check the book (well-formed XHTML, manifest/spine, referenced files) before writing it; "
+        "exit with status 1 on errors",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=("default", "size"),
+        default="default",
+        help="'size' minifies XHTML/CSS, drops unused CSS rules and compresses the EPUB (prints sizes per member)",
+    )
+    parser.add_argument(
+        "--style-classes",
+        action="store_true",
+        help="replace repeated inline style attributes with generated CSS classes in the stylesheet",
+    )
+    args = parser.parse_args(argv)
+    if args.output_epub is None and not args.list_chapters:
+        parser.error("the following arguments are required: output_epub")
+    return args
+
+
+def cache_inputs(input_html, metadata_path, meta):
+    """Return every file the build reads: the HTML, its pictures, metadata.yaml and its images."""
+    from word2epub.epub_writer import resolve_metadata_image_path
+    from word2epub.word_images import companion_files
+
+    paths = [input_html] + companion_files(input_html)
+    if metadata_path:
+        paths.append(metadata_path)
     for img in meta.get("images", []):
-        if img.get("type") == "insert_after_toc":
-            image_filename = img["file"]
-            image_xhtml = build_image_xhtml(image_filename)
-            image_pages.append(("image.xhtml", image_xhtml))
-
-    opf_content = build_opf(meta, chapter_filenames, image_pages)
-
-    style_css = """
-@charset "UTF-8";
-body {
-  writing-mode: vertical-rl;
-  -epub-writing-mode: vertical-rl;
-  line-height: 1.8;
-  font-family: "YuMincho", serif;
-}
-p {
-  margin: 0 0 1em 0;
-}
-"""
-
-    create_epub(output_epub, chapter_files, toc_xhtml, opf_content, style_css, image_pages, meta)
-
-    print(f"EPUB created: {output_epub}")
+        if img.get("file"):
+            paths.append(resolve_metadata_image_path(meta, img["file"]))
+    return paths
+
+
+def cache_key_extra(meta, part_bytes, style_classes=False, validate=False):
+    """Versions and options that change the output besides the input files.
+
+    `validate` is part of the key so that a --validate run is only served
+    a book that was stored by a --validate run, i.e. one that passed.
+    """
+    import hashlib
+
+    from word2epub.convert import STYLE_CSS
+
+    return {
+        "tool": "word_html_to_epub",
+        "version": __version__,
+        "template": hashlib.sha256(STYLE_CSS.encode("utf-8")).hexdigest(),
+        "reproducible": bool(meta.get("_reproducible")),
+        "max_part_bytes": part_bytes,
+        "style_classes": style_classes,
+        "profile": meta.get("_profile", "default"),
+        "validate": validate,
+    }
+
+
+def splitting(args):
+    return bool(args.split_chapters or args.split_size)
+
+
+def load_chapters_for(args):
+    """Parse the whole HTML, or with --chapter only the requested slices."""
+    from word2epub.chapter_index import load_chapters
+    from word2epub.convert import load_and_clean_chapters
+    from word2epub.docx import is_docx, load_docx_chapters
+
+    if args.chapters and is_docx(args.input_html):
+        return load_docx_chapters(args.input_html, args.chapters)
+    if args.chapters:
+        chapters = load_chapters(args.input_html, args.chapters, args.jobs)
+        print(f"Loaded chapters {', '.join(str(c.index) for c in chapters)} from the chapter index.")
+        return chapters
+    from word2epub.cache import open_parse_cache
+
+    return load_and_clean_chapters(args.input_html, open_parse_cache(args.cache_dir))
+
+
+def list_chapters(input_html):
+    from word2epub.chapter_index import load_chapter_index
+    from word2epub.docx import docx_chapter_titles, is_docx
+
+    if is_docx(input_html):
+        titles = docx_chapter_titles(input_html)
+    else:
+        titles = [(entry["index"], entry["title"]) for entry in load_chapter_index(input_html)]
+    print(f"{len(titles)} chapters")
+    for index, title in titles:
+        print(index, title)
+
+
+def max_part_bytes(args):
+    from word2epub.cache import parse_size
+    from word2epub.chapter_split import DEFAULT_MAX_PART_BYTES
+
+    if args.max_part_size is None:
+        return DEFAULT_MAX_PART_BYTES
+    return parse_size(args.max_part_size)
+
+
+def build(args, meta, chapters):
+    """Write the book, split into volumes when --split-chapters/--split-size is given."""
+    from word2epub.cache import parse_size
+    from word2epub.convert import write_book
+    from word2epub.volumes import write_volumes
+
+    if splitting(args):
+        max_bytes = parse_size(args.split_size) if args.split_size else None
+        write_volumes(
+            args.output_epub, meta, chapters, args.split_chapters, max_bytes, args.output_format, args.jobs,
+            max_part_bytes(args), args.validate, args.style_classes,
+        )
+        return
+    write_book(
+        args.output_epub, meta, chapters, args.output_format, max_part_bytes=max_part_bytes(args),
+        validate=args.validate, style_classes=args.style_classes,
+    )
+
+
+def watch_and_rebuild(args, metadata_path, meta, chapters):
+    """Rebuild `args.output_epub` whenever the HTML, metadata or images change.
+
+    Only the changed inputs are reloaded: a metadata or image edit reuses the
+    already parsed and cleaned chapters; only an edit of the HTML re-parses it.
+    """
+    from word2epub.convert import load_book_metadata
+    from word2epub.watch import DEFAULT_POLL_INTERVAL, watch
+    from word2epub.word_images import companion_files
+
+    input_html = os.path.abspath(args.input_html)
+    abs_metadata = os.path.abspath(metadata_path) if metadata_path else None
+    state = {"meta": meta, "chapters": chapters}
+
+    def rebuild(changed):
+        if abs_metadata in changed:
+            state["meta"] = load_book_metadata(metadata_path, meta["_reproducible"])
+            state["meta"]["_profile"] = meta["_profile"]
+        # pictures are chosen and deduplicated while parsing / 画像は解析時に選別される
+        if input_html in changed or changed & set(companion_files(input_html)):
+            state["chapters"] = load_chapters_for(args)
+        build(args, state["meta"], state["chapters"])
+        return cache_inputs(args.input_html, metadata_path, state["meta"])
+
+    watch(
+        cache_inputs(args.input_html, metadata_path, meta),
+        rebuild,
+        poll_interval=args.poll_interval or DEFAULT_POLL_INTERVAL,
+        force_polling=args.poll_interval is not None,
+    )
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.list_chapters:
+        list_chapters(args.input_html)
+        return
+
+    from word2epub.cache import fingerprint_inputs, format_stats, open_cache
+    from word2epub.convert import find_metadata, load_book_metadata
+    from word2epub.reproducible import reproducible_requested
+    from word2epub.validate import EPUBValidationError
+
+    input_html = args.input_html
+    output_epub = args.output_epub
+    metadata_path = find_metadata(input_html, args.metadata)
+    meta = load_book_metadata(metadata_path, reproducible_requested(args.reproducible))
+    meta["_profile"] = args.profile
+
+    # content-addressed output cache / 入力が同じなら前回の EPUB を再利用する
+    cache = None
+    if not args.watch and args.output_format == "zip" and not splitting(args) and not args.chapters:
+        cache = open_cache(args.cache_dir, args.cache_max_size)
+    cache_key = None
+    if cache is not None:
+        cache_key = fingerprint_inputs(
+            cache_inputs(input_html, metadata_path, meta),
+            root=os.path.dirname(os.path.abspath(input_html)),
+            extra=cache_key_extra(meta, max_part_bytes(args), args.style_classes, args.validate),
+        )
+        if cache.fetch(cache_key, output_epub):
+            print(f"EPUB restored from cache: {output_epub}")
+            print("Cache:", format_stats(cache.stats()))
+            return
+    # only what metadata.yaml set, not the private build options (_reproducible, ...)
+    # metadata.yaml の内容だけを表示し、内部用の _ 付きキーは出さない
+    user_meta = {key: value for key, value in meta.items() if not key.startswith("_")}
+    if user_meta:
+        print("Metadata loaded:", user_meta)
+
+    chapters = load_chapters_for(args)
+    try:
+        build(args, meta, chapters)
+    except EPUBValidationError as e:
+        # report the findings; nothing was written / 検査エラー時は出力せずに終了する
+        print(e)
+        sys.exit(1)
+    except FileExistsError as e:
+        # --output-format dir into a folder it did not create / 既存フォルダへの出力を拒否
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if cache is not None:
+        cache.store(cache_key, output_epub)
+        print("Cache:", format_stats(cache.stats()))
+
+    if args.watch:
+        watch_and_rebuild(args, metadata_path, meta, chapters)
 
 
 if __name__ == "__main__":
@@ -15,14 +15,21 @@ import shutil
 import tempfile
 import zipfile
 import uuid
-from datetime import datetime, timezone
+import argparse
+import json
+from datetime import datetime
 import re
+from typing import BinaryIO
 
-try:
-    import yaml
-except Exception:
-    print("PyYAML が必要です。pip install pyyaml を実行してください。")
-    raise
+from word2epub import __version__
+from word2epub.cache import CACHE_DIR_ENV, fingerprint_inputs, format_stats, hash_file, hash_tree, open_cache, parse_size
+from word2epub.chapter_split import DEFAULT_MAX_PART_BYTES, part_name, split_html
+from word2epub.imagesize import add_image_sizes, image_size, size_attributes
+from word2epub.manifest import AssetRegistry
+from word2epub.output import DirectoryOutput, MemoryOutput, OutputBackend, RecordingOutput, ZipOutput, is_stream
+from word2epub.reproducible import book_identifier, build_datetime, reproducible_requested
+from word2epub.staging import break_link, stage_file, stage_tree, take_stats
+from word2epub.templating import configure_bytecode_cache, render_template
 
 
 TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "TEMPLATE", "book-template")
@@ -58,6 +65,227 @@ NS_DC = "http://purl.org/dc/elements/1.1/"
 DEFAULT_TITLE = "作品名未設定"
 
 
+def resolve_source_path(path: str, meta_dir: str) -> str:
+    """Resolve a path from metadata relative to the metadata directory."""
+    return path if os.path.isabs(path) else os.path.join(meta_dir, path)
+
+
+class DependencyGraph:
+    """Source files a yaml2epub build reads, resolved from metadata.yaml.
+
+    Each node is a dict with keys ``path`` (absolute), ``roles`` (e.g.
+    ``["chapter"]``), ``exists``, ``size`` and ``mtime``; ``sha256`` is filled
+    in by :meth:`compute_hashes`. Edges go from metadata.yaml to every file it
+    references, so the graph is returned as a flat, ordered node list.
+    """
+
+    def __init__(self, meta_path: str) -> None:
+        self.meta_path = os.path.abspath(meta_path)
+        self.nodes: list[dict] = []
+        self._by_path: dict[str, dict] = {}
+
+    def add(self, role: str, path: str) -> dict:
+        """Add (or extend the roles of) the node for `path` and return it."""
+        path = os.path.abspath(path)
+        node = self._by_path.get(path)
+        if node is not None:
+            if role not in node["roles"]:
+                node["roles"].append(role)
+            return node
+        try:
+            st = os.stat(path)
+            exists, size, mtime = True, st.st_size, st.st_mtime
+        except OSError:
+            exists, size, mtime = False, None, None
+        node = {"path": path, "roles": [role], "exists": exists, "size": size, "mtime": mtime, "sha256": None}
+        self.nodes.append(node)
+        self._by_path[path] = node
+        return node
+
+    @property
+    def missing(self) -> list[dict]:
+        return [n for n in self.nodes if not n["exists"]]
+
+    def paths(self, include_template: bool = True) -> list[str]:
+        return [n["path"] for n in self.nodes if include_template or "template" not in n["roles"]]
+
+    def compute_hashes(self) -> "DependencyGraph":
+        """Fill in the sha256 of every existing node (once)."""
+        for n in self.nodes:
+            if n["exists"] and n["sha256"] is None:
+                n["sha256"] = hash_file(n["path"])
+        return self
+
+    def to_dict(self) -> dict:
+        return {"metadata": self.meta_path, "nodes": self.nodes, "missing": [n["path"] for n in self.missing]}
+
+    def format_text(self) -> str:
+        """One line per file: roles, size, mtime, sha256 and path (tab separated)."""
+        lines = []
+        for n in self.nodes:
+            if not n["exists"]:
+                lines.append(f"{','.join(n['roles'])}\tMISSING\t-\t-\t{n['path']}")
+                continue
+            mtime = datetime.fromtimestamp(n["mtime"]).strftime("%Y-%m-%dT%H:%M:%S")
+            lines.append(f"{','.join(n['roles'])}\t{n['size']}\t{mtime}\t{n['sha256'] or '-'}\t{n['path']}")
+        return "\n".join(lines)
+
+    def format_make(self, target: str) -> str:
+        """Make/ninja depfile rule: `target: dep dep ...`."""
+        deps = " \\\n  ".join(p.replace(" ", "\\ ") for p in self.paths())
+        return f"{target.replace(' ', '\\ ')}: \\\n  {deps}\n"
+
+
+def resolve_dependencies(meta_path: str, meta: dict | None = None, include_template: bool = True) -> DependencyGraph:
+    """Resolve every source file a build of `meta_path` will read.
+
+    Mirrors the path resolution of `_process_images`, `_insert_document_section`,
+    `insert_colophon`, `insert_advertisement`, stylesheet copying and
+    `generate_chapter_xhtmls` without producing anything, so missing inputs
+    can be reported before the build starts.
+
+    Args:
+        meta_path (str): Path to metadata.yaml.
+        meta (dict | None): Already loaded metadata (loaded from `meta_path` when None).
+        include_template (bool): Also list the files of `TEMPLATE_DIR`.
+
+    Returns:
+        DependencyGraph: Graph of all source files (without hashes).
+    """
+    if meta is None:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = _yaml().safe_load(f) or {}
+    meta_dir = os.path.dirname(os.path.abspath(meta_path))
+    graph = DependencyGraph(meta_path)
+    graph.add("metadata", meta_path)
+
+    images = meta.get("image", {}) or {}
+    for key in ("cover", "backcover"):
+        if images.get(key):
+            graph.add(key, resolve_source_path(images[key], meta_dir))
+
+    for style in meta.get("stylesheets") or []:
+        if style:
+            css_path = resolve_source_path(style, meta_dir)
+            graph.add("stylesheet", css_path)
+            for font_path, _ in _stylesheet_fonts(css_path):
+                graph.add("font", font_path)
+
+    docs = meta.get("documents", {}) or {}
+    for section in ("frontmatter", "backmatter"):
+        spec = docs.get(section)
+        if not spec:
+            continue
+        text = spec.get("text") if isinstance(spec, dict) else spec
+        if text:
+            graph.add(section, resolve_source_path(text, meta_dir))
+        img_spec = spec.get("image") if isinstance(spec, dict) else None
+        for image in (img_spec if isinstance(img_spec, list) else [img_spec] if img_spec else []):
+            graph.add(f"{section}-image", resolve_source_path(image, meta_dir))
+
+    for d in docs.get("contents", []) or []:
+        chapter = d.get("chapter") if isinstance(d, dict) else d
+        if chapter:
+            graph.add("chapter", resolve_source_path(chapter, meta_dir))
+
+    colophon = meta.get("colophon")
+    text = colophon.get("text") if isinstance(colophon, dict) else None
+    if text:
+        graph.add("colophon", resolve_source_path(text, meta_dir))
+
+    adv = meta.get("advertisement")
+    text = adv.get("text") if isinstance(adv, dict) else adv
+    if text and text != "NONE":
+        graph.add("advertisement", resolve_source_path(text, meta_dir))
+
+    if include_template and os.path.isdir(TEMPLATE_DIR):
+        for base, dirs, files in os.walk(TEMPLATE_DIR):
+            dirs.sort()
+            for fn in sorted(files):
+                graph.add("template", os.path.join(base, fn))
+
+    return graph
+
+
+def _stylesheet_fonts(css_path: str) -> list[tuple[str, str]]:
+    """Return (source path, href relative to the OPF) of the fonts a stylesheet's @font-face rules use.
+
+    The stylesheet is copied to ``item/style/``; fonts whose URL would point
+    outside ``item/`` are skipped with a warning.
+    """
+    from word2epub.fonts import font_faces
+
+    try:
+        css = read_text_file(css_path)
+    except (OSError, UnicodeDecodeError):
+        return []
+    fonts = []
+    for url, href in font_faces(css, f"style/{os.path.basename(css_path)}"):
+        if href.startswith("../"):
+            print(f"font outside the package, skipped: {url} ({css_path})")
+            continue
+        # URLs are written for the packaged layout; the source font is looked
+        # up relative to the stylesheet, or by its file name next to it
+        # URL は EPUB 内の配置で書かれるため、CSS からの相対パス・同じフォルダの順に探す
+        path = url.split("#", 1)[0].split("?", 1)[0]
+        css_dir = os.path.dirname(css_path)
+        candidates = [os.path.normpath(os.path.join(css_dir, path)), os.path.join(css_dir, os.path.basename(path))]
+        fonts.append((next((c for c in candidates if os.path.exists(c)), candidates[0]), href))
+    return fonts
+
+
+def _yaml():
+    """Import PyYAML on first use, so --help and usage errors do not pay for it.
+
+    初回使用時に PyYAML を import する（--help などの起動を速くするため）
+    """
+    try:
+        import yaml
+    except Exception:
+        print("PyYAML が必要です。pip install pyyaml を実行してください。")
+        raise
+    return yaml
+
+
+def _is_reproducible(meta: dict | None) -> bool:
+    """Return True when the build runs in reproducible mode (set by `main`)."""
+    return bool(isinstance(meta, dict) and meta.get("_reproducible"))
+
+
+def _max_part_bytes(meta: dict | None) -> int | None:
+    """Chapter size budget for splitting (set by `main` from --max-part-size)."""
+    if isinstance(meta, dict) and "_max_part_bytes" in meta:
+        return meta["_max_part_bytes"]
+    return DEFAULT_MAX_PART_BYTES
+
+
+def _profile(meta: dict | None) -> str:
+    """Output profile chosen with --profile ("default" or "size", set by `main`)."""
+    if isinstance(meta, dict) and meta.get("_profile"):
+        return meta["_profile"]
+    return "default"
+
+
+def _subset_fonts(meta: dict | None) -> bool:
+    """False when --no-subset-fonts was given (set by `main`)."""
+    return not (isinstance(meta, dict) and meta.get("_subset_fonts") is False)
+
+
+def _now_ymd(meta: dict | None) -> str:
+    """Expand NOW_YMD: local date, or the SOURCE_DATE_EPOCH date in reproducible mode."""
+    if _is_reproducible(meta):
+        return build_datetime(True).strftime("%Y-%m-%d")
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _uses_now_ymd(meta: dict | None) -> bool:
+    """True when the colophon's created_at is NOW_YMD (the build date goes into the book)."""
+    if not isinstance(meta, dict):
+        return False
+    colophon = meta.get("colophon")
+    return meta.get("created_at") == "NOW_YMD" or (isinstance(colophon, dict) and colophon.get("created_at") == "NOW_YMD")
+
+
 def read_text_file(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
@@ -65,6 +293,8 @@ def read_text_file(path: str) -> str:
 
 def write_text_file(path: str, text: str) -> None:
     os.makedirs(os.path.dirname(path), exist_ok=True)
+    # staged files may be hardlinks to the template / ステージ済みファイルはテンプレートと共有され得る
+    break_link(path)
     with open(path, "w", encoding="utf-8") as f:
         f.write(text)
 
@@ -103,22 +333,29 @@ def add_stylesheets_to_xhtml(xhtml_dir: str, styles: list[str]) -> None:
                 s = read_text_file(p)
             except Exception:
                 continue
-            # build link tags for missing styles
-            links = []
-            for fn in styles:
-                href = f'../style/{fn}'
-                if href not in s:
-                    links.append(f'<link rel="stylesheet" type="text/css" href="{href}"/>' )
-            if not links:
-                continue
-            # insert before </head>
-            if "</head>" in s:
-                s = s.replace("</head>", "\n" + "\n".join(links) + "\n</head>")
-                write_text_file(p, s)
+            new = _add_stylesheet_links(s, styles)
+            if new != s:
+                write_text_file(p, new)
     except Exception:
         pass
 
 
+def _add_stylesheet_links(s: str, styles: list[str]) -> str:
+    """Return xhtml `s` with <link> tags for `styles` (basenames) that it does not reference yet."""
+    # build link tags for missing styles
+    links = []
+    for fn in styles:
+        href = f'../style/{fn}'
+        if href not in s:
+            links.append(f'<link rel="stylesheet" type="text/css" href="{href}"/>' )
+    if not links:
+        return s
+    # insert before </head>
+    if "</head>" in s:
+        s = s.replace("</head>", "\n" + "\n".join(links) + "\n</head>")
+    return s
+
+
 def _apply_body_template(template: str | None, body_html: str, body_class: str | None, direction: str | None) -> str:
     """テンプレートの <body ...> 開始タグに class/style を付与し、body 内に body_html を挿入して返す。
     body_class が None の場合はデフォルトで 'p-text' を付与する。
@@ -181,6 +418,7 @@ def _insert_document_section(
     label_default: str = "document",
     template_filename: str = "p-fmatter-001.xhtml",
     br_convert: bool = False,
+    registry: AssetRegistry | None = None,
 ) -> None:
     """Insert a document section (frontmatter, backmatter, etc.).
 
@@ -194,6 +432,7 @@ def _insert_document_section(
         output_filename (str): Output XHTML filename (e.g., "p-fmatter-001.xhtml").
         label_default (str): Default label for the section if not specified.
         template_filename (str): Template XHTML filename to use as base.
+        registry (AssetRegistry | None): Registry that copied images are registered into.
     """
     if not spec:
         return
@@ -210,7 +449,7 @@ def _insert_document_section(
     # resolve paths
     text_path = None
     if text:
-        text_path = text if os.path.isabs(text) else os.path.join(meta_dir, text)
+        text_path = resolve_source_path(text, meta_dir)
 
     # prepare body
     body_html = ""
@@ -225,7 +464,7 @@ def _insert_document_section(
         if text_path.lower().endswith((".yaml", ".yml")):
             with open(text_path, "r", encoding="utf-8") as f:
                 try:
-                    data = yaml.safe_load(f) or {}
+                    data = _yaml().safe_load(f) or {}
                 except Exception:
                     data = {}
             # allow YAML to override direction/body_class
@@ -265,10 +504,15 @@ def _insert_document_section(
     # add any images if present - collect in order before prepending
     image_tags = []
     for image in images:
-        img_path = image if os.path.isabs(image) else os.path.join(meta_dir, image)
+        img_path = resolve_source_path(image, meta_dir)
         if os.path.exists(img_path):
-            shutil.copy2(img_path, os.path.join(image_dir, os.path.basename(img_path)))
-            img_tag = f'<p><img class="fit" src="../image/{os.path.basename(img_path)}" alt=""/></p>'
+            stage_file(img_path, os.path.join(image_dir, os.path.basename(img_path)), reference=True)
+            if registry is not None:
+                registry.register(f"image/{os.path.basename(img_path)}", role="image", source=img_path)
+            # intrinsic size from the file header, so readers can lay out the page early
+            # 画像ヘッダから読んだサイズを付け、デコード前にレイアウトできるようにする
+            size = size_attributes(image_size(img_path))
+            img_tag = f'<p><img class="fit" src="../image/{os.path.basename(img_path)}" alt=""{size}/></p>'
             image_tags.append(img_tag)
     # prepend all images in original order
     if image_tags:
@@ -287,7 +531,8 @@ def _insert_document_section(
         write_text_file(target, new)
 
 
-def insert_frontmatter(xhtml_dir: str, spec: dict | None, meta_dir: str, image_dir: str, br_convert: bool = False) -> None:
+def insert_frontmatter(xhtml_dir: str, spec: dict | None, meta_dir: str, image_dir: str, br_convert: bool = False,
+                       registry: AssetRegistry | None = None) -> None:
     """Insert frontmatter content into the EPUB.
 
     Args:
@@ -296,6 +541,7 @@ def insert_frontmatter(xhtml_dir: str, spec: dict | None, meta_dir: str, image_d
         meta_dir (str): Directory containing metadata files.
         image_dir (str): Directory to store images.
         br_convert (bool): Replace single line breaks in contents with <br/>.
+        registry (AssetRegistry | None): Registry that copied images are registered into.
     """
     _insert_document_section(
         xhtml_dir,
@@ -306,10 +552,12 @@ def insert_frontmatter(xhtml_dir: str, spec: dict | None, meta_dir: str, image_d
         label_default="frontmatter",
         template_filename="p-fmatter-001.xhtml",
         br_convert=br_convert,
+        registry=registry,
     )
 
 
-def insert_backmatter(xhtml_dir: str, spec: dict | None, meta_dir: str, image_dir: str, br_convert: bool = False) -> None:
+def insert_backmatter(xhtml_dir: str, spec: dict | None, meta_dir: str, image_dir: str, br_convert: bool = False,
+                      registry: AssetRegistry | None = None) -> None:
     """Insert backmatter content into the EPUB.
 
     backmatter is written to ``p-bmatter-001.xhtml`` and is intended to be inserted after
@@ -321,6 +569,7 @@ def insert_backmatter(xhtml_dir: str, spec: dict | None, meta_dir: str, image_di
         meta_dir (str): Directory containing metadata files.
         image_dir (str): Directory to store images.
         br_convert (bool): Replace single line breaks in contents with <br/>.
+        registry (AssetRegistry | None): Registry that copied images are registered into.
     """
     _insert_document_section(
         xhtml_dir,
@@ -331,6 +580,7 @@ def insert_backmatter(xhtml_dir: str, spec: dict | None, meta_dir: str, image_di
         label_default="backmatter",
         template_filename="p-fmatter-001.xhtml",
         br_convert=br_convert,
+        registry=registry,
     )
 
 
@@ -355,17 +605,16 @@ def insert_colophon(xhtml_dir: str, colophon_spec: dict | None, meta_dir: str, m
     text = colophon_spec.get("text") if isinstance(colophon_spec, dict) else None
     text_path = None
     if text:
-        text_path = text if os.path.isabs(text) else os.path.join(meta_dir, text)
+        text_path = resolve_source_path(text, meta_dir)
 
     body_html = ""
     direction = None
     body_class = None
     if text_path and os.path.exists(text_path):
         if text_path.lower().endswith((".yaml", ".yml")):
-            # read and render template (Jinja2 if available)
+            # read and render template (Jinja2 if available, compiled once per process)
             with open(text_path, "r", encoding="utf-8") as f:
                 raw = f.read()
-            rendered = None
             # build render context: top-level meta keys + colophon keys (flattened)
             render_context = {}
             if isinstance(meta, dict):
@@ -375,22 +624,10 @@ def insert_colophon(xhtml_dir: str, colophon_spec: dict | None, meta_dir: str, m
                     render_context.update(c)
             # expand NOW_YMD to current date if present
             if render_context.get("created_at") == "NOW_YMD":
-                render_context["created_at"] = datetime.now().strftime("%Y-%m-%d")
+                render_context["created_at"] = _now_ymd(meta)
+            rendered = render_template(raw, render_context)
             try:
-                from jinja2 import Environment
-
-                env = Environment()
-                rendered = env.from_string(raw).render(**render_context)
-            except Exception:
-                # fallback simple replacement for {{ key }}
-                rendered = raw
-                try:
-                    for k, v in (render_context.items() if isinstance(render_context, dict) else []):
-                        rendered = rendered.replace("{{ " + k + " }}", str(v))
-                except Exception:
-                    pass
-            try:
-                data = yaml.safe_load(rendered) or {}
+                data = _yaml().safe_load(rendered) or {}
             except Exception:
                 data = {}
 
@@ -419,7 +656,7 @@ def insert_colophon(xhtml_dir: str, colophon_spec: dict | None, meta_dir: str, m
     created_at = colophon_spec.get("created_at") if isinstance(colophon_spec, dict) else None
     copyright_text = colophon_spec.get("copyright") if isinstance(colophon_spec, dict) else None
     if created_at == "NOW_YMD":
-        created_at = datetime.now().strftime("%Y-%m-%d")
+        created_at = _now_ymd(meta)
     if not body_html:
         if version:
             extras.append(f"版数: {version}")
@@ -463,12 +700,12 @@ def insert_advertisement(xhtml_dir: str, adv_spec: dict | None, meta_dir: str, m
     direction = None
     body_class = None
     if text:
-        text_path = text if os.path.isabs(text) else os.path.join(meta_dir, text)
+        text_path = resolve_source_path(text, meta_dir)
         if os.path.exists(text_path):
             if text_path.lower().endswith((".yaml", ".yml")):
                 with open(text_path, "r", encoding="utf-8") as f:
                     try:
-                        data = yaml.safe_load(f) or {}
+                        data = _yaml().safe_load(f) or {}
                     except Exception:
                         data = {}
                 # allow direction/body_class in advertisement yaml
@@ -548,21 +785,58 @@ def _replace_title_in_string(s: str, title: str) -> str:
     return s[: gt + 1] + title + s[end:]
 
 
-def generate_chapter_xhtmls(xhtml_dir: str, chapters: list[str], br_convert: bool = False) -> list[dict]:
+def _write_chapter_page(target_path: str, template: str | None, body_html: str, label: str,
+                        body_class: str | None, direction: str | None) -> None:
+    """Write one chapter page (or part of a chapter) from the template or a minimal fallback."""
+    if template:
+        new = _apply_body_template(template, body_html, body_class, direction)
+        # set the <title> to the page title/label
+        new = _replace_title_in_string(new, label)
+        write_text_file(target_path, new)
+    else:
+        # fallback: generate simple xhtml with attributes
+        style_value = ""
+        if direction:
+            if direction.lower().startswith("v"):
+                style_value = ' style="writing-mode: vertical-rl; -epub-writing-mode: vertical-rl;"'
+            else:
+                style_value = ' style="writing-mode: horizontal-tb; -epub-writing-mode: horizontal-tb;"'
+        cls = body_class or "p-text"
+        content = f"<html><head><title>{label}</title></head><body class=\"{cls}\"{style_value}>{body_html}</body></html>"
+        write_text_file(target_path, content)
+
+
+def generate_chapter_xhtmls(xhtml_dir: str, chapters: list[str], br_convert: bool = False,
+                            only: set[int] | None = None, template: str | None = None,
+                            max_part_bytes: int | None = DEFAULT_MAX_PART_BYTES) -> list[dict]:
     """Generate xhtml files for arbitrary number of chapters.
 
-    Returns list of dicts: {"id": "p-001", "href": "xhtml/p-001.xhtml", "label": "title"}
+    Args:
+        xhtml_dir (str): Directory containing XHTML files.
+        chapters (list[str]): Chapter source paths.
+        br_convert (bool): Replace single line breaks in contents with <br/>.
+        only (set[int] | None): 1-based chapter numbers to (re)generate; others are skipped
+            and omitted from the result. All chapters when None.
+        template (str | None): Page template; read from ``p-001.xhtml`` in `xhtml_dir` when None.
+        max_part_bytes (int | None): Chapters whose body is larger than this are split at
+            paragraph boundaries into ``p-001.xhtml``, ``p-001-02.xhtml``, ... (None/0 disables).
+            The first part keeps the page id, so ``toc-NNN`` anchors stay in it.
+
+    Returns list of dicts: {"id": "p-001", "href": "xhtml/p-001.xhtml", "label": "title",
+    "parts": [{"id": "p-001-02", "href": "xhtml/p-001-02.xhtml"}, ...]}
     """
     os.makedirs(xhtml_dir, exist_ok=True)
     # choose a template to base pages on (prefer p-001.xhtml)
-    template_path = os.path.join(xhtml_dir, "p-001.xhtml")
-    template = read_text_file(template_path) if os.path.exists(template_path) else None
+    if template is None:
+        template_path = os.path.join(xhtml_dir, "p-001.xhtml")
+        template = read_text_file(template_path) if os.path.exists(template_path) else None
 
     created = []
     for i, chap in enumerate(chapters, start=1):
+        if only is not None and i not in only:
+            continue
         page_id = f"p-{i:03d}"
         filename = f"{page_id}.xhtml"
-        target_path = os.path.join(xhtml_dir, filename)
 
         label = filename
         body_html = ""
@@ -573,7 +847,7 @@ def generate_chapter_xhtmls(xhtml_dir: str, chapters: list[str], br_convert: boo
             if chap.lower().endswith((".yaml", ".yml")):
                 with open(chap, "r", encoding="utf-8") as f:
                     try:
-                        data = yaml.safe_load(f) or {}
+                        data = _yaml().safe_load(f) or {}
                     except Exception:
                         data = {}
                 label = data.get("page_title", os.path.splitext(os.path.basename(chap))[0])
@@ -608,28 +882,25 @@ def generate_chapter_xhtmls(xhtml_dir: str, chapters: list[str], br_convert: boo
         else:
             body_html = f"<p>Missing file: {chap}</p>"
 
-        if template:
-            new = _apply_body_template(template, body_html, body_class, direction)
-            # set the <title> to the page title/label
-            new = _replace_title_in_string(new, label)
-            write_text_file(target_path, new)
-        else:
-            # fallback: generate simple xhtml with attributes
-            style_value = ""
-            if direction:
-                if direction.lower().startswith("v"):
-                    style_value = ' style="writing-mode: vertical-rl; -epub-writing-mode: vertical-rl;"'
-                else:
-                    style_value = ' style="writing-mode: horizontal-tb; -epub-writing-mode: horizontal-tb;"'
-            cls = body_class or "p-text"
-            content = f"<html><head><title>{label}</title></head><body class=\"{cls}\"{style_value}>{body_html}</body></html>"
-            write_text_file(target_path, content)
+        # split oversized chapters / 大きすぎる章は段落単位で分割する
+        parts = []
+        for n, part_html in enumerate(split_html(body_html, max_part_bytes), start=1):
+            part_id = part_name(page_id, n)
+            _write_chapter_page(os.path.join(xhtml_dir, f"{part_id}.xhtml"), template, part_html,
+                                label, body_class, direction)
+            if n > 1:
+                parts.append({"id": part_id, "href": f"xhtml/{part_id}.xhtml"})
 
-        created.append({"id": page_id, "href": f"xhtml/{filename}", "label": label})
+        created.append({"id": page_id, "href": f"xhtml/{filename}", "label": label, "parts": parts})
 
     return created
 
-def update_opf_dynamic(opf_path: str, meta: dict, chapters_info: list[dict], include_frontmatter: bool, include_caution: bool, include_backmatter: bool = False, include_advertisement: bool = True) -> None:
+def update_opf_dynamic(opf_path: str, meta: dict, chapters_info: list[dict], include_frontmatter: bool, include_caution: bool, include_backmatter: bool = False, include_advertisement: bool = True, registry: AssetRegistry | None = None) -> None:
+    """Rebuild metadata, manifest and spine of the OPF file.
+
+    When `registry` is given, style and image entries are taken from the assets
+    registered by the producers instead of scanning ``item/style`` and ``item/image``.
+    """
     import xml.etree.ElementTree as ET
 
     ns = {
@@ -657,13 +928,14 @@ def update_opf_dynamic(opf_path: str, meta: dict, chapters_info: list[dict], inc
         if "publisher" in meta:
             pub.text = meta["publisher"]
 
-    # identifier
+    # identifier (stable in reproducible mode)
+    reproducible = _is_reproducible(meta)
     for ident in root.findall(".//{http://purl.org/dc/elements/1.1/}identifier"):
         if ident.get("id") == "unique-id":
-            ident.text = f"urn:uuid:{uuid.uuid4()}"
+            ident.text = book_identifier(meta, reproducible)
 
     # modified
-    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    now = build_datetime(reproducible).strftime("%Y-%m-%dT%H:%M:%SZ")
     for meta_el in root.findall(".//{http://www.idpf.org/2007/opf}meta"):
         if meta_el.get("property") == "dcterms:modified":
             meta_el.text = now
@@ -710,35 +982,47 @@ def update_opf_dynamic(opf_path: str, meta: dict, chapters_info: list[dict], inc
             style_added_hrefs.add(href)
             if it.get("id"):
                 used_style_ids.add(it.get("id"))
-    # also scan the actual style folder on disk and add any css files not present in manifest
-    style_folder = os.path.join(os.path.dirname(opf_path), "style")
-    if os.path.isdir(style_folder):
-        files = sorted(os.listdir(style_folder))
-        for fn in files:
-            if not fn.lower().endswith(".css"):
-                continue
-            href = f"style/{fn}"
-            if href in style_added_hrefs:
-                continue
+    # add stylesheets that are not present in the template manifest: registered
+    # ones when a registry is available, otherwise scan the style folder on disk
+    # registry があれば登録済みの CSS、無ければ style フォルダを走査して追加する
+    if registry is not None:
+        files = [it.href.split("/", 1)[1] for it in registry.by_media_type("text/css")]
+    else:
+        style_folder = os.path.join(os.path.dirname(opf_path), "style")
+        files = sorted(os.listdir(style_folder)) if os.path.isdir(style_folder) else []
+    for fn in files:
+        if not fn.lower().endswith(".css"):
+            continue
+        href = f"style/{fn}"
+        if href in style_added_hrefs:
+            continue
+        if registry is not None:
+            item_id = registry.get(href).item_id
+        else:
             base = os.path.splitext(fn)[0]
             item_id = re.sub("[^0-9A-Za-z_-]", "-", base)
             if not item_id:
                 item_id = f"style-{uuid.uuid4().hex[:8]}"
-            # ensure unique id
-            orig_id = item_id
-            i = 1
-            while item_id in used_style_ids:
-                item_id = f"{orig_id}-{i}"
-                i += 1
-            used_style_ids.add(item_id)
-            el = make_item(item_id, href, "text/css")
-            new_manifest.append(el)
-
-    # images: scan output image directory and add any images present
+        # ensure unique id
+        orig_id = item_id
+        i = 1
+        while item_id in used_style_ids:
+            item_id = f"{orig_id}-{i}"
+            i += 1
+        used_style_ids.add(item_id)
+        el = make_item(item_id, href, "text/css")
+        new_manifest.append(el)
+
+    # images: registered images carry their real media type, id and properties
+    # 画像: 登録済みの画像は実際の MIME タイプ・id・properties を持つ
     new_manifest.append(ET.Comment(" image "))
     image_folder = os.path.join(os.path.dirname(opf_path), "image")
     img_id_map = {}
-    if os.path.isdir(image_folder):
+    if registry is not None:
+        for it in registry.by_media_type("image/"):
+            img_id_map[it.href] = it.item_id
+            new_manifest.append(make_item(it.item_id, it.href, it.media_type, it.properties))
+    elif os.path.isdir(image_folder):
         files = sorted(os.listdir(image_folder))
         cnt = 1
         used_ids = set()
@@ -778,6 +1062,12 @@ def update_opf_dynamic(opf_path: str, meta: dict, chapters_info: list[dict], inc
             new_manifest.append(el)
             cnt += 1
 
+    # fonts copied for @font-face rules / @font-face 用のフォント
+    if registry is not None and registry.by_role("font"):
+        new_manifest.append(ET.Comment(" font "))
+        for it in registry.by_role("font"):
+            new_manifest.append(make_item(it.item_id, it.href, it.media_type, it.properties))
+
     # xhtml
     new_manifest.append(ET.Comment(" xhtml "))
     # keep cover only if file exists
@@ -796,6 +1086,8 @@ def update_opf_dynamic(opf_path: str, meta: dict, chapters_info: list[dict], inc
 
     for ch in chapters_info:
         add_xhtml_if_exists(ch["id"], ch["href"])
+        for part in ch.get("parts", []):
+            add_xhtml_if_exists(part["id"], part["href"])
 
     if include_backmatter:
         add_xhtml_if_exists("p-bmatter-001", "xhtml/p-bmatter-001.xhtml")
@@ -837,6 +1129,8 @@ def update_opf_dynamic(opf_path: str, meta: dict, chapters_info: list[dict], inc
     add_itemref("p-toc")
     for ch in chapters_info:
         add_itemref(ch["id"])
+        for part in ch.get("parts", []):
+            add_itemref(part["id"])
     if include_backmatter:
         add_itemref("p-bmatter-001")
     add_itemref("p-colophon")
@@ -844,6 +1138,7 @@ def update_opf_dynamic(opf_path: str, meta: dict, chapters_info: list[dict], inc
         add_itemref("p-ad-001")
     add_itemref("p-backcover")
 
+    break_link(opf_path)
     tree.write(opf_path, encoding="utf-8", xml_declaration=True)
 
 
@@ -859,14 +1154,15 @@ def update_opf_basic(opf_path: str, meta: dict) -> None:
         s = s.replace("<dc:creator id=\"creator02\">著作者名２</dc:creator>", f"<dc:creator id=\"creator02\">{meta['creator02']}</dc:creator>")
     if "publisher" in meta:
         s = s.replace("<dc:publisher id=\"publisher\">出版社名</dc:publisher>", f"<dc:publisher id=\"publisher\">{meta['publisher']}</dc:publisher>")
-    # identifier
-    uid = f"urn:uuid:{uuid.uuid4()}"
+    # identifier (stable in reproducible mode)
+    reproducible = _is_reproducible(meta)
+    uid = book_identifier(meta, reproducible)
     s = s.replace(
         s[s.find("<dc:identifier id=\"unique-id\">") : s.find("</dc:identifier>") + len("</dc:identifier>")],
         f"<dc:identifier id=\"unique-id\">{uid}</dc:identifier>",
     )
     # modified
-    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    now = build_datetime(reproducible).strftime("%Y-%m-%dT%H:%M:%SZ")
     if "<meta property=\"dcterms:modified\">" in s:
         start = s.find("<meta property=\"dcterms:modified\">")
         end = s.find("</meta>", start) + len("</meta>")
@@ -963,12 +1259,43 @@ def update_navigation(nav_path: str, chapters_info: list[dict]) -> None:
                 write_text_file(toc_path, s2)
 
 
-def make_epub_from_template(tmpdir: str, out_epub: str) -> None:
-    # create EPUB (mimetype first, uncompressed)
-    template_item = os.path.join(tmpdir, "item")
-    root = os.path.join(tmpdir)
-    mimetype_path = os.path.join(root, "mimetype")
-    # build list of files
+def make_epub_from_template(tmpdir: str, out_epub: str | BinaryIO | OutputBackend | None,
+                            reproducible: bool = False, profile: str = "default",
+                            subset_fonts: bool = True) -> bytes | None:
+    """Package the staged book in `tmpdir` into `out_epub`.
+
+    Members are written in sorted order; with `reproducible` their timestamps
+    and permissions are fixed as well, so identical trees give identical files.
+
+    Args:
+        tmpdir (str): Staging directory.
+        out_epub (str | BinaryIO | OutputBackend | None): EPUB path; a writable
+            binary stream (non-seekable streams get a streaming ZIP with data
+            descriptors; the stream is left open); an output backend such as
+            a DirectoryOutput (left open for the caller); or None to return
+            the EPUB as bytes.
+        reproducible (bool): Fixed ZIP timestamps/permissions.
+        profile (str): "size" minifies XHTML/CSS on the way out (see word2epub.minify).
+        subset_fonts (bool): Cut embedded fonts down to the characters of the book
+            (see word2epub.fonts).
+
+    Returns:
+        bytes | None: The EPUB when `out_epub` is None.
+    """
+    if isinstance(out_epub, OutputBackend):
+        _add_tree_to_output(tmpdir, out_epub, profile, subset_fonts)
+        return None
+
+    if out_epub is None:
+        out = MemoryOutput(reproducible, compression=zipfile.ZIP_DEFLATED)
+        _add_tree_to_output(tmpdir, out, profile, subset_fonts)
+        return out.getvalue()
+
+    if is_stream(out_epub):
+        with ZipOutput(out_epub, reproducible, compression=zipfile.ZIP_DEFLATED) as out:
+            _add_tree_to_output(tmpdir, out, profile, subset_fonts)
+        return None
+
     # try to remove existing output file first (may fail if file is locked by another process)
     try:
         if os.path.exists(out_epub):
@@ -978,19 +1305,75 @@ def make_epub_from_template(tmpdir: str, out_epub: str) -> None:
         pass
 
     try:
-        with zipfile.ZipFile(out_epub, "w", compression=zipfile.ZIP_DEFLATED) as z:
-            # mimetype must be stored and first
-            z.writestr("mimetype", read_text_file(mimetype_path), compress_type=zipfile.ZIP_STORED)
-            for base, dirs, files in os.walk(root):
-                for fn in files:
-                    path = os.path.join(base, fn)
-                    arcname = os.path.relpath(path, root)
-                    if arcname == "mimetype":
-                        continue
-                    z.write(path, arcname)
+        with ZipOutput(out_epub, reproducible, compression=zipfile.ZIP_DEFLATED) as out:
+            _add_tree_to_output(tmpdir, out, profile, subset_fonts)
     except PermissionError as e:
         # often caused by the destination file being opened by another program
         raise PermissionError(f"could not write EPUB '{out_epub}'; please close it if open and retry") from e
+    return None
+
+
+def _add_tree_to_output(root: str, out: OutputBackend, profile: str = "default", subset_fonts: bool = False) -> None:
+    """Add all files below `root` to `out` (mimetype first, then in sorted order).
+
+    With `profile` "size", XHTML/CSS are minified and unused CSS rules dropped.
+    With `subset_fonts`, embedded fonts are subset to the text of the XHTML
+    members while they are written.
+    """
+    if profile == "size":
+        from word2epub.minify import SizeProfileOutput
+
+        with SizeProfileOutput(out) as small:
+            _add_tree_to_output(root, small, subset_fonts=subset_fonts)
+        print(small.report())
+        return
+    if subset_fonts and _has_fonts(root):
+        from word2epub.fonts import FontSubsetOutput
+
+        with FontSubsetOutput(out) as subset:
+            _add_tree_to_output(root, subset)
+        print(subset.report())
+        return
+    # mimetype must be stored and first
+    out.add("mimetype", read_text_file(os.path.join(root, "mimetype")))
+    for base, dirs, files in os.walk(root):
+        # walk in a stable order so member order does not depend on the filesystem
+        # ファイルシステムに依存しないよう走査順を固定する
+        dirs.sort()
+        for fn in sorted(files):
+            path = os.path.join(base, fn)
+            arcname = os.path.relpath(path, root).replace(os.sep, "/")
+            if arcname == "mimetype":
+                continue
+            out.add_file(arcname, path)
+
+
+def _has_fonts(root: str) -> bool:
+    from word2epub.fonts import FONT_EXTENSIONS
+
+    return any(fn.lower().endswith(FONT_EXTENSIONS) for _, _, files in os.walk(root) for fn in files)
+
+
+def _cache_key(graph: DependencyGraph, meta: dict) -> str:
+    """Fingerprint of all inputs in the dependency graph, tool version and options."""
+    meta_dir = os.path.dirname(os.path.abspath(graph.meta_path))
+    inputs = [n["path"] for n in graph.nodes if "template" not in n["roles"]]
+    extra = {
+        "tool": "yaml2epub",
+        "version": __version__,
+        "template": hash_tree(TEMPLATE_DIR),
+        "reproducible": _is_reproducible(meta),
+        "max_part_bytes": _max_part_bytes(meta),
+        "profile": _profile(meta),
+        "subset_fonts": _subset_fonts(meta),
+        # only books that passed --validate are stored under a validated key
+        # 検査済みのビルドだけが validate 付きのキーで保存される
+        "validate": bool(meta.get("_validate")),
+        # a cached book must not carry the date of an earlier day
+        # NOW_YMD は展開後の日付をキーに含め、日付が変われば作り直す
+        "now_ymd": _now_ymd(meta) if _uses_now_ymd(meta) else None,
+    }
+    return fingerprint_inputs(inputs, root=meta_dir, extra=extra)
 
 
 def _setup_temporary_directory(tmpdir: str) -> None:
@@ -999,12 +1382,8 @@ def _setup_temporary_directory(tmpdir: str) -> None:
     Args:
         tmpdir (str): Temporary directory path.
     """
-    # Copy template to tmpdir
-    try:
-        shutil.copytree(TEMPLATE_DIR, os.path.join(tmpdir), dirs_exist_ok=True)
-    except Exception:
-        # older Python copytree fallback
-        shutil.copytree(TEMPLATE_DIR, tmpdir)
+    # Stage the template in tmpdir (hardlinked/cloned when possible, see word2epub.staging)
+    stage_tree(TEMPLATE_DIR, tmpdir)
 
     # Remove template-provided images so only user-supplied images are included
     template_image_dir = os.path.join(tmpdir, IMAGE_DIR)
@@ -1021,13 +1400,20 @@ def _setup_temporary_directory(tmpdir: str) -> None:
                 pass
 
 
-def _process_images(tmpdir: str, meta: dict, meta_path: str) -> tuple[bool, bool]:
+def _add_cover_size(xhtml: str, src_path: str) -> str:
+    """Add the intrinsic width/height of `src_path` to the ``../image/`` ``<img>`` of a cover page."""
+    # the template's own width/height (if any) are kept / テンプレートに指定があればそのまま
+    return add_image_sizes(xhtml, lambda src: src_path if src.startswith("../image/") else None)
+
+
+def _process_images(tmpdir: str, meta: dict, meta_path: str, registry: AssetRegistry | None = None) -> tuple[bool, bool]:
     """Process images (cover and backcover) from metadata.
 
     Args:
         tmpdir (str): Temporary directory path.
         meta (dict): Metadata dictionary.
         meta_path (str): Path to metadata file.
+        registry (AssetRegistry | None): Registry that copied images are registered into.
 
     Returns:
         tuple[bool, bool]: (cover_provided, backcover_provided)
@@ -1047,16 +1433,22 @@ def _process_images(tmpdir: str, meta: dict, meta_path: str) -> tuple[bool, bool
 
     if "cover" in images:
         src = images["cover"]
-        src_path = src if os.path.isabs(src) else os.path.join(meta_dir, src)
+        src_path = resolve_source_path(src, meta_dir)
         if os.path.exists(src_path):
-            shutil.copy2(src_path, os.path.join(image_dir, os.path.basename(src_path)))
+            stage_file(src_path, os.path.join(image_dir, os.path.basename(src_path)), reference=True)
+            if registry is not None:
+                registry.register(f"image/{os.path.basename(src_path)}", item_id="cover",
+                                  properties="cover-image", role="cover", source=src_path)
             cover_provided = True
 
     if "backcover" in images:
         src = images["backcover"]
-        src_path = src if os.path.isabs(src) else os.path.join(meta_dir, src)
+        src_path = resolve_source_path(src, meta_dir)
         if os.path.exists(src_path):
-            shutil.copy2(src_path, os.path.join(image_dir, os.path.basename(src_path)))
+            stage_file(src_path, os.path.join(image_dir, os.path.basename(src_path)), reference=True)
+            if registry is not None:
+                registry.register(f"image/{os.path.basename(src_path)}", item_id="backcover",
+                                  role="backcover", source=src_path)
             backcover_provided = True
 
     # In some workflows the XHTML for the back cover is generated later (see
@@ -1068,7 +1460,7 @@ def _process_images(tmpdir: str, meta: dict, meta_path: str) -> tuple[bool, bool
     if backcover_provided:
         try:
             if os.path.exists(cover_file) and not os.path.exists(back_file):
-                shutil.copy2(cover_file, back_file)
+                stage_file(cover_file, back_file)
         except Exception:
             # best effort; failure here is non-fatal
             pass
@@ -1089,12 +1481,14 @@ def _process_images(tmpdir: str, meta: dict, meta_path: str) -> tuple[bool, bool
             if cover_fname and os.path.exists(os.path.join(image_dir, cover_fname)) and os.path.exists(cover_file):
                 s = read_text_file(cover_file)
                 s = re.sub(r'src="\.\./image/[^\"]+"', f'src="../image/{cover_fname}"', s)
+                s = _add_cover_size(s, resolve_source_path(images["cover"], meta_dir))
                 write_text_file(cover_file, s)
         if backcover_provided:
             back_fname = os.path.basename(images.get("backcover"))
             if back_fname and os.path.exists(os.path.join(image_dir, back_fname)) and os.path.exists(back_file):
                 s = read_text_file(back_file)
                 s = re.sub(r'src="\.\./image/[^\"]+"', f'src="../image/{back_fname}"', s)
+                s = _add_cover_size(s, resolve_source_path(images["backcover"], meta_dir))
                 write_text_file(back_file, s)
     except Exception:
         pass
@@ -1102,13 +1496,15 @@ def _process_images(tmpdir: str, meta: dict, meta_path: str) -> tuple[bool, bool
     return cover_provided, backcover_provided
 
 
-def _generate_document_content(tmpdir: str, meta: dict, meta_path: str) -> tuple[bool, bool, list[dict]]:
+def _generate_document_content(tmpdir: str, meta: dict, meta_path: str,
+                               registry: AssetRegistry | None = None) -> tuple[bool, bool, list[dict]]:
     """Generate document content (frontmatter, backmatter, etc.) and chapters.
 
     Args:
         tmpdir (str): Temporary directory path.
         meta (dict): Metadata dictionary.
         meta_path (str): Path to metadata file.
+        registry (AssetRegistry | None): Registry that copied images and stylesheets are registered into.
 
     Returns:
         tuple[bool, bool, list[dict]]: (include_advertisement, include_backmatter, chapters_info)
@@ -1132,7 +1528,7 @@ def _generate_document_content(tmpdir: str, meta: dict, meta_path: str) -> tuple
     back_src = os.path.join(xhtml_dir, XHTML_BACKCOVER)
     try:
         if os.path.exists(cover_src) and not os.path.exists(back_src):
-            shutil.copy2(cover_src, back_src)
+            stage_file(cover_src, back_src)
     except Exception:
         pass
 
@@ -1145,14 +1541,28 @@ def _generate_document_content(tmpdir: str, meta: dict, meta_path: str) -> tuple
         for s in styles_spec:
             if not s:
                 continue
-            src = s if os.path.isabs(s) else os.path.join(meta_dir, s)
+            src = resolve_source_path(s, meta_dir)
             if os.path.exists(src):
                 try:
                     dst = os.path.join(style_dir, os.path.basename(src))
-                    shutil.copy2(src, dst)
+                    stage_file(src, dst, reference=True)
                     copied_styles.append(os.path.basename(src))
+                    if registry is not None:
+                        registry.register(f"style/{os.path.basename(src)}", "text/css",
+                                          role="style", source=src)
                 except Exception:
                     pass
+                # fonts of @font-face rules are packed next to the stylesheet's URLs
+                # @font-face で参照されるフォントも CSS の URL どおりに同梱する
+                for font_src, href in _stylesheet_fonts(src):
+                    if not os.path.exists(font_src):
+                        print(f"font not found: {font_src}")
+                        continue
+                    dst = os.path.join(tmpdir, ITEM_DIR, *href.split("/"))
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    stage_file(font_src, dst, reference=True)
+                    if registry is not None:
+                        registry.register(href, role="font", source=font_src)
     # inject stylesheet links into xhtml files (if any copied)
     if copied_styles:
         add_stylesheets_to_xhtml(xhtml_dir, copied_styles)
@@ -1165,9 +1575,9 @@ def _generate_document_content(tmpdir: str, meta: dict, meta_path: str) -> tuple
     # br_convert flag from metadata controls paragraph breaks inside YAML contents
     br_flag = bool(meta.get("br_convert"))
 
-    insert_frontmatter(xhtml_dir, front, meta_dir, image_dir, br_convert=br_flag)
+    insert_frontmatter(xhtml_dir, front, meta_dir, image_dir, br_convert=br_flag, registry=registry)
     insert_caution(xhtml_dir, meta.get("caution"))
-    insert_backmatter(xhtml_dir, back, meta_dir, image_dir, br_convert=br_flag)
+    insert_backmatter(xhtml_dir, back, meta_dir, image_dir, br_convert=br_flag, registry=registry)
     insert_colophon(xhtml_dir, meta.get("colophon"), meta_dir, meta)
     insert_advertisement(xhtml_dir, meta.get("advertisement"), meta_dir, meta)
 
@@ -1178,18 +1588,15 @@ def _generate_document_content(tmpdir: str, meta: dict, meta_path: str) -> tuple
     include_backmatter = bool(back)
 
     # Inject chapters (support arbitrary number)
-    contents = docs.get("contents", []) or []
-    chapters = [d.get("chapter") if isinstance(d, dict) else d for d in contents]
-    chapters = [c for c in chapters if c]
-    # Resolve chapter paths relative to metadata file
-    chapters = [c if os.path.isabs(c) else os.path.join(meta_dir, c) for c in chapters]
+    chapters = _chapter_paths(meta, meta_dir)
     br_flag = bool(meta.get("br_convert"))
-    chapters_info = generate_chapter_xhtmls(xhtml_dir, chapters, br_flag)
+    chapters_info = generate_chapter_xhtmls(xhtml_dir, chapters, br_flag, max_part_bytes=_max_part_bytes(meta))
 
     # Remove unused p-XXX.xhtml files from template that were not generated
     try:
         existing = [n for n in os.listdir(xhtml_dir) if n.endswith(".xhtml")]
         keep = set([os.path.basename(ch["href"]) for ch in chapters_info])
+        keep.update(os.path.basename(part["href"]) for ch in chapters_info for part in ch.get("parts", []))
         keep.update((XHTML_COVER, XHTML_TITLEPAGE, XHTML_FRONTMATTER, XHTML_CAUTION, 
                      XHTML_TOC, XHTML_COLOPHON, XHTML_ADVERTISEMENT, XHTML_BACKCOVER))
         # Also keep backmatter if present
@@ -1208,9 +1615,20 @@ def _generate_document_content(tmpdir: str, meta: dict, meta_path: str) -> tuple
     return include_advertisement, include_backmatter, chapters_info
 
 
+def _chapter_paths(meta: dict, meta_dir: str) -> list[str]:
+    """Return chapter source paths from `documents.contents`, resolved against `meta_dir`."""
+    docs = meta.get("documents", {}) or {}
+    contents = docs.get("contents", []) or []
+    chapters = [d.get("chapter") if isinstance(d, dict) else d for d in contents]
+    chapters = [c for c in chapters if c]
+    # Resolve chapter paths relative to metadata file
+    return [resolve_source_path(c, meta_dir) for c in chapters]
+
+
 def _update_manifest_and_spine(tmpdir: str, meta: dict, chapters_info: list[dict], 
                                  include_frontmatter: bool, include_caution: bool,
-                                 include_backmatter: bool, include_advertisement: bool) -> None:
+                                 include_backmatter: bool, include_advertisement: bool,
+                                 registry: AssetRegistry | None = None) -> None:
     """Update OPF manifest/spine and navigation documents.
 
     Args:
@@ -1221,12 +1639,14 @@ def _update_manifest_and_spine(tmpdir: str, meta: dict, chapters_info: list[dict
         include_caution (bool): Whether caution is included.
         include_backmatter (bool): Whether backmatter is included.
         include_advertisement (bool): Whether advertisement is included.
+        registry (AssetRegistry | None): Assets registered while producing the book.
     """
     # Update OPF dynamically
     opf_path = os.path.join(tmpdir, OPF_FILE)
     if os.path.exists(opf_path):
         update_opf_dynamic(opf_path, meta, chapters_info, include_frontmatter, 
-                          include_caution, include_backmatter, include_advertisement)
+                          include_caution, include_backmatter, include_advertisement,
+                          registry=registry)
 
     # Update navigation
     nav_path = os.path.join(tmpdir, NAV_FILE)
@@ -1234,6 +1654,164 @@ def _update_manifest_and_spine(tmpdir: str, meta: dict, chapters_info: list[dict
         update_navigation(nav_path, chapters_info)
 
 
+def _validate_staged(tmpdir: str) -> None:
+    """Check the staged book before it is packed (raises EPUBValidationError on errors).
+
+    パッケージ前にステージングした本を検査する
+    """
+    from word2epub.validate import check_book
+
+    book = RecordingOutput()
+    _add_tree_to_output(tmpdir, book)
+    check_book(book.members)
+
+
+def _write_output(tmpdir: str, out_epub: str | BinaryIO, meta: dict, output_format: str = "zip") -> None:
+    """Write the staged book as an EPUB file or stream ("zip") or an unpacked directory ("dir")."""
+    if isinstance(meta, dict) and meta.get("_validate"):
+        _validate_staged(tmpdir)
+    if output_format == "dir":
+        with DirectoryOutput(out_epub) as out:
+            make_epub_from_template(tmpdir, out, profile=_profile(meta), subset_fonts=_subset_fonts(meta))
+        print(f"wrote {out_epub}/ ({out.summary()})")
+        return
+    make_epub_from_template(tmpdir, out_epub, _is_reproducible(meta), _profile(meta), _subset_fonts(meta))
+    if not is_stream(out_epub):
+        print(f"wrote {out_epub}")
+
+
+def build_book(tmpdir: str, meta: dict, meta_path: str, out_epub: str | BinaryIO,
+               output_format: str = "zip") -> tuple[AssetRegistry, list[dict]]:
+    """Stage the book described by `meta` in `tmpdir` and write `out_epub`.
+
+    Args:
+        tmpdir (str): Empty staging directory (kept by the caller).
+        meta (dict): Metadata dictionary.
+        meta_path (str): Path to metadata file.
+        out_epub (str | BinaryIO): EPUB file or writable binary stream (or, for
+            "dir", directory) to write.
+        output_format (str): "zip" for an .epub file, "dir" for an unpacked EPUB directory.
+
+    Returns:
+        tuple[AssetRegistry, list[dict]]: (registered assets, chapters_info)
+    """
+    take_stats()
+    _setup_temporary_directory(tmpdir)
+
+    # assets are registered as they are copied, so the manifest needs no rescan
+    registry = AssetRegistry()
+
+    # Process images
+    _process_images(tmpdir, meta, meta_path, registry)
+
+    # Generate document content and chapters
+    include_advertisement, include_backmatter, chapters_info = _generate_document_content(
+        tmpdir, meta, meta_path, registry
+    )
+
+    # Determine frontmatter and caution inclusion
+    docs = meta.get("documents", {}) or {}
+    include_frontmatter = bool(docs.get("frontmatter"))
+    include_caution = bool(meta.get("caution"))
+
+    # Update OPF manifest/spine and navigation
+    _update_manifest_and_spine(
+        tmpdir, meta, chapters_info,
+        include_frontmatter, include_caution,
+        include_backmatter, include_advertisement,
+        registry
+    )
+
+    # Build final EPUB
+    _write_output(tmpdir, out_epub, meta, output_format)
+    # how the inputs were staged (hardlink/reflink/symlink/copy) / 入力のステージング方法
+    print(take_stats().summary())
+    return registry, chapters_info
+
+
+def _watch_and_rebuild(meta_path: str, meta: dict, out_epub: str, graph: DependencyGraph,
+                       poll_interval: float | None = None, output_format: str = "zip") -> int:
+    """Build once, then rebuild `out_epub` whenever an input in `graph` changes.
+
+    The staging directory is kept between builds. When only chapter files
+    changed, just those pages are regenerated (plus the TOC if a title
+    changed) before re-zipping; any other change triggers a full rebuild.
+
+    Returns:
+        int: Exit code.
+    """
+    from word2epub.watch import DEFAULT_POLL_INTERVAL, watch
+
+    meta_dir = os.path.dirname(os.path.abspath(meta_path))
+    state: dict = {"meta": meta, "graph": graph, "tmpdir": tempfile.mkdtemp(prefix="yaml2epub_")}
+
+    def full_build() -> None:
+        shutil.rmtree(state["tmpdir"], ignore_errors=True)
+        state["tmpdir"] = tempfile.mkdtemp(prefix="yaml2epub_")
+        state["registry"], state["chapters_info"] = build_book(
+            state["tmpdir"], state["meta"], meta_path, out_epub, output_format
+        )
+
+    def rebuild_chapters(numbers: set[int]) -> None:
+        tmpdir = state["tmpdir"]
+        xhtml_dir = os.path.join(tmpdir, XHTML_DIR)
+        # the staged p-001.xhtml is already a chapter, so start again from the template
+        # 生成済みの p-001.xhtml ではなく元のテンプレートから作り直す
+        tpl = os.path.join(TEMPLATE_DIR, XHTML_DIR, "p-001.xhtml")
+        template = read_text_file(tpl) if os.path.exists(tpl) else None
+        if template:
+            styles = [os.path.basename(it.href) for it in state["registry"].by_role("style")]
+            template = _add_stylesheet_links(template, styles)
+        rebuilt = generate_chapter_xhtmls(
+            xhtml_dir, _chapter_paths(state["meta"], meta_dir), bool(state["meta"].get("br_convert")),
+            only=numbers, template=template, max_part_bytes=_max_part_bytes(state["meta"]),
+        )
+        by_id = {ch["id"]: ch for ch in rebuilt}
+        if any(by_id[ch["id"]].get("parts") != ch.get("parts") for ch in state["chapters_info"] if ch["id"] in by_id):
+            # the number of split parts changed, so manifest and spine change too
+            # 分割数が変わったときは OPF も作り直す
+            print("chapter split changed; full rebuild")
+            full_build()
+            return
+        labels_changed = any(by_id[ch["id"]]["label"] != ch["label"] for ch in state["chapters_info"] if ch["id"] in by_id)
+        state["chapters_info"] = [by_id.get(ch["id"], ch) for ch in state["chapters_info"]]
+        if labels_changed:
+            nav_path = os.path.join(tmpdir, NAV_FILE)
+            if os.path.exists(nav_path):
+                update_navigation(nav_path, state["chapters_info"])
+        print(f"regenerated chapters {', '.join(str(n) for n in sorted(numbers))}")
+        _write_output(tmpdir, out_epub, state["meta"], output_format)
+
+    def rebuild(changed: set[str]) -> list[str]:
+        chapter_numbers: dict[str, set[int]] = {}
+        for i, path in enumerate(_chapter_paths(state["meta"], meta_dir), start=1):
+            chapter_numbers.setdefault(os.path.abspath(path), set()).add(i)
+        if changed and all(p in chapter_numbers for p in changed):
+            rebuild_chapters(set().union(*(chapter_numbers[p] for p in changed)))
+        else:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                new_meta = _yaml().safe_load(f) or {}
+            new_meta["_reproducible"] = _is_reproducible(meta)
+            new_meta["_max_part_bytes"] = _max_part_bytes(meta)
+            new_meta["_validate"] = bool(meta.get("_validate"))
+            new_meta["_profile"] = _profile(meta)
+            new_meta["_subset_fonts"] = _subset_fonts(meta)
+            state["meta"] = new_meta
+            state["graph"] = resolve_dependencies(meta_path, new_meta)
+            for node in state["graph"].missing:
+                print(f"missing input ({','.join(node['roles'])}): {node['path']}")
+            full_build()
+        return state["graph"].paths()
+
+    try:
+        full_build()
+        watch(state["graph"].paths(), rebuild,
+              poll_interval=poll_interval or DEFAULT_POLL_INTERVAL, force_polling=poll_interval is not None)
+    finally:
+        shutil.rmtree(state["tmpdir"], ignore_errors=True)
+    return 0
+
+
 def main(argv: list[str]) -> int:
     """Main entry point for yaml2epub conversion.
 
@@ -1243,47 +1821,146 @@ def main(argv: list[str]) -> int:
     Returns:
         int: Exit code (0 for success, 1-2 for error).
     """
+    parser = argparse.ArgumentParser(prog="yaml2epub.py", description="YAML -> EPUB3 converter.")
+    parser.add_argument("metadata", help="metadata.yaml")
+    parser.add_argument("out_epub", nargs="?", default="out.epub", help="output EPUB (default: out.epub)")
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="bit-identical output: stable identifier, SOURCE_DATE_EPOCH timestamps, fixed ZIP metadata "
+        "(also enabled when SOURCE_DATE_EPOCH is set)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="reuse EPUBs built from identical inputs (default: $WORD2EPUB_CACHE_DIR; disabled when unset)",
+    )
+    parser.add_argument("--cache-max-size", help="cache size limit, e.g. 500M or 2G (default: 1G)")
+    parser.add_argument(
+        "--list-deps",
+        nargs="?",
+        const="text",
+        choices=("text", "json", "make"),
+        help="print every source file the build reads (with size, mtime, sha256) and exit; "
+        "'make' prints a depfile rule for out.epub",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=("zip", "dir"),
+        default="zip",
+        help="'zip' writes an .epub file, 'dir' an unpacked EPUB directory (only changed files are rewritten)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and rebuild when any input changes (only changed chapters when possible)",
+    )
+    parser.add_argument(
+        "--poll",
+        dest="poll_interval",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="with --watch, poll for changes every SECONDS instead of using inotify",
+    )
+    parser.add_argument(
+        "--max-part-size",
+        default=None,
+        metavar="SIZE",
+        help="split chapters larger than SIZE into several XHTML files at paragraph boundaries "
+        "(default: 256K; 0 disables)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=("default", "size"),
+        default="default",
+        help="'size' minifies XHTML/CSS and drops unused CSS rules (prints sizes per member)",
+    )
+    parser.add_argument(
+        "--no-subset-fonts",
+        action="store_true",
+        help="embed @font-face fonts whole instead of subsetting them to the characters of the book",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="check the staged book (well-formed XHTML, manifest/spine, referenced files) before packing it; "
+        "exit with status 1 on errors",
+    )
     if len(argv) < 2:
-        print("usage: yaml2epub.py metadata.yaml [out.epub]")
+        parser.print_usage()
         return 2
-    meta_path = argv[1]
-    out_epub = argv[2] if len(argv) >= 3 else "out.epub"
+    args = parser.parse_args(argv[1:])
+    meta_path = args.metadata
+    out_epub = args.out_epub
 
     if not os.path.exists(meta_path):
         print(f"metadata file not found: {meta_path}")
         return 1
 
     with open(meta_path, "r", encoding="utf-8") as f:
-        meta = yaml.safe_load(f) or {}
+        meta = _yaml().safe_load(f) or {}
+    meta["_reproducible"] = reproducible_requested(args.reproducible)
+    meta["_max_part_bytes"] = parse_size(args.max_part_size) if args.max_part_size else DEFAULT_MAX_PART_BYTES
+    meta["_validate"] = args.validate
+    meta["_profile"] = args.profile
+    meta["_subset_fonts"] = not args.no_subset_fonts
+
+    # resolve all inputs up front / ビルド前に全入力を解決して欠落を報告する
+    graph = resolve_dependencies(meta_path, meta)
+    if args.list_deps:
+        if args.list_deps == "make":
+            print(graph.format_make(out_epub), end="")
+        elif args.list_deps == "json":
+            print(json.dumps(graph.compute_hashes().to_dict(), ensure_ascii=False, indent=2))
+        else:
+            print(graph.compute_hashes().format_text())
+        return 1 if graph.missing else 0
+    for node in graph.missing:
+        print(f"missing input ({','.join(node['roles'])}): {node['path']}")
+
+    # compiled colophon templates and font subsets are kept next to the output cache
+    # 奥付テンプレートのコンパイル結果とフォントのサブセットも出力キャッシュと同じ場所に保存する
+    cache_dir = args.cache_dir or os.environ.get(CACHE_DIR_ENV)
+    if cache_dir:
+        configure_bytecode_cache(os.path.join(cache_dir, "jinja2"))
+        from word2epub.fonts import configure_subset_cache
+
+        configure_subset_cache(os.path.join(cache_dir, "fonts"))
+
+    # content-addressed output cache / 入力が同じなら前回の EPUB を再利用する
+    cache = None
+    if not args.watch and args.output_format == "zip":
+        cache = open_cache(args.cache_dir, args.cache_max_size)
+    cache_key = None
+    if cache is not None:
+        cache_key = _cache_key(graph, meta)
+        if cache.fetch(cache_key, out_epub):
+            print(f"wrote {out_epub} (from cache)")
+            print("cache:", format_stats(cache.stats()))
+            return 0
+
+    if args.watch:
+        return _watch_and_rebuild(meta_path, meta, out_epub, graph, args.poll_interval, args.output_format)
+
+    from word2epub.validate import EPUBValidationError
 
     # Set up temporary directory
     tmpdir = tempfile.mkdtemp(prefix="yaml2epub_")
     try:
-        _setup_temporary_directory(tmpdir)
-
-        # Process images
-        _process_images(tmpdir, meta, meta_path)
-
-        # Generate document content and chapters
-        include_advertisement, include_backmatter, chapters_info = _generate_document_content(
-            tmpdir, meta, meta_path
-        )
-
-        # Determine frontmatter and caution inclusion
-        docs = meta.get("documents", {}) or {}
-        include_frontmatter = bool(docs.get("frontmatter"))
-        include_caution = bool(meta.get("caution"))
-
-        # Update OPF manifest/spine and navigation
-        _update_manifest_and_spine(
-            tmpdir, meta, chapters_info,
-            include_frontmatter, include_caution,
-            include_backmatter, include_advertisement
-        )
-
-        # Build final EPUB
-        make_epub_from_template(tmpdir, out_epub)
-        print(f"wrote {out_epub}")
+        try:
+            build_book(tmpdir, meta, meta_path, out_epub, args.output_format)
+        except EPUBValidationError as e:
+            # nothing was written / 検査エラー時は出力しない
+            print(e)
+            return 1
+        except FileExistsError as e:
+            # --output-format dir into a folder it did not create / 既存フォルダへの出力を拒否
+            print(f"Error: {e}")
+            return 1
+
+        if cache is not None:
+            cache.store(cache_key, out_epub)
+            print("cache:", format_stats(cache.stats()))
 
     finally:
         # Clean up temporary directory